@@ -1,46 +1,73 @@
 """Auditing model
+
+Measures are given as a comma separated list, the model predicts the dataset
+once and all of them are computed from that prediction. Results are written
+on stdout as a json object with value, lower and upper bound of the
+bootstrap confidence interval of every measure, bounds are null without
+bootstrap. With number of rows given, the dataset is read, predicted and
+accumulated chunk by chunk, so memory of the audit does not grow with the
+size of the dataset. With group column given, measures are computed also for
+every value of the column from the same prediction, the result has overall
+measures under 'measures' and the slices under 'slices'.
 """
 
 import warnings
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
+import json
 import sys
 import pickle
 import pandas as pd
 import numpy as np
 
+import measures
+
 # name of the model
 model = sys.argv[1]
 # data hash
 hash = sys.argv[2]
 # target column name
 target = sys.argv[3]
-# measure
-measure = sys.argv[4]
-# timestamp
-date = sys.argv[5]
+# measures separated with commas
+names = sys.argv[4].split(',')
+# number of rows predicted at once, 0 predicts the whole dataset
+chunk_rows = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+# number of bootstrap replicates, 0 computes no confidence intervals
+replicates = int(sys.argv[6]) if len(sys.argv) > 6 else 0
+# confidence level of the intervals
+confidence = float(sys.argv[7]) if len(sys.argv) > 7 else 0.95
+# column whose values slice the dataset, empty for no slices
+group = sys.argv[8] if len(sys.argv) > 8 and sys.argv[8] else None
+# '1' if the group column is not a feature of the model
+drop_group = len(sys.argv) > 9 and sys.argv[9] == '1'
 
 # load model
 with open("flaskr/V/Models/" + model + "/model", 'rb') as fd:
     model = pickle.load(fd)
 
-# loading data
+# stdout is reserved for the result, everything printed by the model goes to stderr
+output = sys.stdout
+sys.stdout = sys.stderr
 
-data = pd.read_csv("flaskr/V/Datasets/" + hash, delimiter=',', header=0)
-y = data[target]
-X = data.drop(columns=target)
+# loading data
+path = "flaskr/V/Datasets/" + hash
+chunks = pd.read_csv(path, delimiter=',', header=0, chunksize=chunk_rows) if chunk_rows > 0 else \
+    [pd.read_csv(path, delimiter=',', header=0)]
 
-# making prediction
-pred = model.predict(X)
+# all measures from the same prediction
+accumulator = measures.Accumulator(names, replicates)
+slices = measures.Slices(names, replicates) if group is not None else None
+for data in chunks:
+    pred = model.predict(data.drop(columns=[target, group] if drop_group else target))
+    accumulator.update(data[target], pred)
+    if slices is not None:
+        slices.update(data[group], data[target], pred)
+result = accumulator.result(confidence)
 
-if measure == 'acc':
-    result = np.mean(pred == y)
-elif measure == 'mae':
-    result = np.mean(np.sum(np.abs(pred - y)))
-elif measure == 'mse':
-    result = np.mean(np.sum((pred - y) ** 2))
+if slices is not None:
+    result = {'measures': result, 'slices': slices.result(confidence)}
 
-# saving result
-with open("flaskr/tmp/" + date + ".txt", "w") as fd:
-    fd.write(str(result))
+# returning result on stdout
+output.write(json.dumps(result))
+output.flush()
@@ -0,0 +1,126 @@
+"""Extracts parameters of scikit-learn model for native inference on the server
+
+Supported are linear models, decision trees and random forests (extra trees
+included) with single output. Parameters are saved to npz file together with
+sample rows of the training dataset and predictions of the model on them,
+which the server uses to confirm that it reproduces the model exactly, see
+models/native.py. Nothing is saved for other models.
+"""
+
+import warnings
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import sys
+import numpy as np
+import pandas as pd
+
+import PREDICT
+
+
+def kind_of(model):
+    # name of the class decides, so that subclasses with changed behaviour are not taken
+    name = type(model).__name__
+    if name in ('LinearRegression', 'Ridge', 'Lasso', 'ElasticNet', 'Lars', 'LassoLars', 'BayesianRidge', 'ARDRegression',
+                'HuberRegressor', 'SGDRegressor'):
+        return 'linear_regressor'
+    if name in ('LogisticRegression', 'LogisticRegressionCV'):
+        return 'logistic'
+    if name in ('DecisionTreeClassifier', 'ExtraTreeClassifier'):
+        return 'tree_classifier'
+    if name in ('DecisionTreeRegressor', 'ExtraTreeRegressor'):
+        return 'tree_regressor'
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        return 'forest_classifier'
+    if name in ('RandomForestRegressor', 'ExtraTreesRegressor'):
+        return 'forest_regressor'
+    return None
+
+
+def linear_parameters(model):
+    return {'coef': np.asarray(model.coef_, dtype=np.float64),
+            'intercept': np.asarray(model.intercept_, dtype=np.float64)}
+
+
+def logistic_parameters(model):
+    parameters = linear_parameters(model)
+    # the same rule as LogisticRegression.predict_proba uses
+    multi_class = getattr(model, 'multi_class', 'auto')
+    ovr = multi_class in ('ovr', 'warn') or (multi_class != 'multinomial' and (
+            len(model.classes_) <= 2 or getattr(model, 'solver', None) == 'liblinear'))
+    parameters['ovr'] = np.array(ovr)
+    return parameters
+
+
+def trees_parameters(trees):
+    # trees are concatenated, children point to nodes of the whole array, leaves have -1
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        t = tree.tree_
+        if t.n_outputs != 1:
+            # multi-output trees are not supported
+            return None
+        roots.append(offset)
+        left.append(np.where(t.children_left >= 0, t.children_left + offset, -1))
+        right.append(np.where(t.children_right >= 0, t.children_right + offset, -1))
+        feature.append(t.feature)
+        threshold.append(t.threshold)
+        value.append(t.value[:, 0, :])
+        offset += t.node_count
+
+    return {'left': np.concatenate(left).astype(np.int64), 'right': np.concatenate(right).astype(np.int64),
+            'feature': np.concatenate(feature).astype(np.int64), 'threshold': np.concatenate(threshold),
+            'value': np.concatenate(value).astype(np.float64), 'roots': np.array(roots, dtype=np.int64)}
+
+
+def extract(model):
+    kind = kind_of(model)
+    if kind is None:
+        return None
+
+    if kind == 'linear_regressor':
+        parameters = linear_parameters(model)
+    elif kind == 'logistic':
+        parameters = logistic_parameters(model)
+    elif kind.startswith('tree'):
+        parameters = trees_parameters([model])
+    else:
+        parameters = trees_parameters(model.estimators_)
+
+    if parameters is None:
+        return None
+
+    parameters['kind'] = np.array(kind)
+    if hasattr(model, 'classes_'):
+        classes = np.asarray(model.classes_)
+        if classes.dtype.kind not in 'biuf':
+            # predictions of text labels are not written as numbers, they are left to the environment
+            return None
+        parameters['classes'] = classes
+    if hasattr(model, 'feature_names_in_'):
+        parameters['features'] = np.asarray(model.feature_names_in_).astype(str)
+
+    return parameters
+
+
+if __name__ == '__main__':
+    model_name = sys.argv[1]  # name of the model
+    hash = sys.argv[2]  # hash of the training dataset
+    target = sys.argv[3]  # name of the target column
+    rows = int(sys.argv[4])  # number of sample rows
+    path = sys.argv[5]  # path of the npz file
+
+    model = PREDICT.load_model(model_name)
+    parameters = extract(model)
+
+    if parameters is not None:
+        sample = pd.read_csv("flaskr/V/Datasets/" + hash, delimiter=',', header=0, nrows=rows).drop(columns=target)
+        parameters['sample'] = sample.to_numpy(dtype=np.float64)
+
+        # predictions of the model itself, the server compares its own with them
+        parameters['expected_exact'] = np.asarray(PREDICT.predict(model, sample, 'exact'))
+        if hasattr(model, 'predict_proba'):
+            parameters['expected_prob'] = np.asarray(PREDICT.predict(model, sample, 'prob'))
+
+        np.savez(path, **parameters)
@@ -0,0 +1,152 @@
+"""Resident worker serving models from one virtual environment.
+
+Worker is started once per environment and answers jobs read from stdin on
+stdout, messages are framed as described in protocol.py. Interpreter startup,
+imports and unpickling of the models are paid only once.
+"""
+
+import warnings
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import json
+import os
+import sys
+import traceback
+
+import numpy as np
+import pandas as pd
+
+import budget
+import protocol
+import PREDICT
+from cache import ModelCache
+
+# stdout is reserved for the protocol, everything printed by the models goes to stderr
+channel = sys.stdout.buffer
+sys.stdout = sys.stderr
+
+# already loaded models, keyed by the hash of the model
+models = ModelCache(int(os.environ.get('WELES_MODEL_CACHE_MB', '1024')) * 2 ** 20)
+
+
+def get_model(header):
+    # name of the model is used when its hash is unknown
+    return models.get(header.get('model_hash', header['model']), header['model'], PREDICT.load_model)
+
+
+def handle(header, payload):
+    """Runs single job.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job, field 'op' chooses the operation
+    payload : bytes
+        body of the job
+
+    Returns
+    -------
+    dict
+        header of the response
+    bytes
+        body of the response
+    """
+
+    op = header['op']
+
+    if op == 'ping':
+        return {'status': 'ok'}, b''
+    elif op == 'stats':
+        return {'status': 'ok'}, json.dumps(models.stats()).encode('utf-8')
+    elif op == 'predict':
+        # the same arguments as PREDICT.py gets in the command line, data is sent in the payload
+        model = get_model(header)
+        data = PREDICT.read_data(payload, header['is_hash'], header.get('hash'), header.get('target'),
+                                 header.get('format', 'csv'))
+        format = header.get('result_format', 'csv')
+        return {'status': 'ok', 'format': format}, PREDICT.format_result(PREDICT.predict(model, data, header['type']),
+                                                                         format)
+
+    elif op == 'predict_records':
+        # few records sent as JSON, frame is built directly without parsing csv
+        model = get_model(header)
+        records = json.loads(payload)
+        data = pd.DataFrame(records['rows'], columns=records['columns'])
+        pred = np.asarray(PREDICT.predict(model, data, header['type']))
+        return {'status': 'ok'}, json.dumps(pred.tolist()).encode('utf-8')
+
+    raise ValueError('unknown operation: ' + op)
+
+
+def stream(header):
+    """Predicts stored dataset chunk by chunk, every chunk of the prediction is sent as a separate message.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job, the same fields as for 'predict' and 'chunk_rows'
+    """
+
+    model = get_model(header)
+    for chunk in PREDICT.read_chunks(header['hash'], header['target'], int(header['chunk_rows'])):
+        protocol.write_message(channel, {'status': 'chunk'}, PREDICT.format_result(PREDICT.predict(model, chunk,
+                                                                                                  header['type'])))
+
+
+def predict_many(header, payload):
+    """Predicts the same data with several models, data is read only once and prediction of every model is sent as
+    a separate message.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job, the same fields as for 'predict', models are listed in 'jobs' as JSON list of
+        dictionaries with 'model', 'model_hash' and 'target'
+    payload : bytes
+        body of the job
+    """
+
+    if header['is_hash'] == '0':
+        data = PREDICT.read_data(payload, '0', format=header.get('format', 'csv'))
+    else:
+        # target columns of the models may differ, they are dropped for every model
+        data = PREDICT.read_data(None, '1', header['hash'], [])
+
+    format = header.get('result_format', 'csv')
+    for job in json.loads(header['jobs']):
+        model = models.get(job.get('model_hash', job['model']), job['model'], PREDICT.load_model)
+        x = data if header['is_hash'] == '0' else data.drop(columns=job['target'])
+        protocol.write_message(channel, {'status': 'chunk', 'model': job['model'], 'format': format},
+                               PREDICT.format_result(PREDICT.predict(model, x, header['type']), format))
+
+
+if __name__ == '__main__':
+    protocol.write_message(channel, {'status': 'ready', 'formats': ','.join(PREDICT.FORMATS),
+                                     'cache': json.dumps(models.stats())})
+
+    while True:
+        header, payload = protocol.read_message(sys.stdin.buffer)
+
+        if header is None:
+            # server closed the pipe
+            break
+
+        try:
+            budget.apply(header)
+
+            if header['op'] == 'predict_stream':
+                # chunks are sent during the job, the last message only ends it
+                stream(header)
+                response, body = {'status': 'ok'}, b''
+            elif header['op'] == 'predict_many':
+                predict_many(header, payload)
+                response, body = {'status': 'ok'}, b''
+            else:
+                response, body = handle(header, payload)
+        except Exception:
+            response, body = {'status': 'error'}, traceback.format_exc().encode('utf-8')
+
+        # counters of the cache are sent with every response, so the server does not have to ask busy worker
+        response['cache'] = json.dumps(models.stats())
+        protocol.write_message(channel, response, body)
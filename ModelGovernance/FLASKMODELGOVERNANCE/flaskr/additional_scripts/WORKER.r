@@ -0,0 +1,108 @@
+# Resident worker serving R models from one virtual environment.
+# Jobs are read from stdin and answered on stdout, messages are framed as described in protocol.r.
+
+source('../../../additional_scripts/protocol.r')
+source('../../../additional_scripts/PREDICT.r')
+
+# stdout is reserved for the protocol, everything printed by the models goes to stderr
+input = file('stdin', 'rb')
+channel = file('/dev/stdout', 'wb')
+sink(stderr())
+
+# already loaded models, keyed by the hash of the model, with their sizes and last use
+models = new.env()
+sizes = list()
+last_used = list()
+budget = as.numeric(Sys.getenv('WELES_MODEL_CACHE_MB', '1024')) * 2^20
+counters = list(hits = 0, misses = 0, evictions = 0)
+tick = 0
+
+# resident memory of this process in bytes, 0 if the system does not report it
+resident = function() {
+	status = tryCatch(readLines('/proc/self/status'), error = function(e) character(0))
+	line = grep('^VmRSS:', status, value = TRUE)
+	if(length(line) == 0) 0 else as.numeric(strsplit(trimws(sub('VmRSS:', '', line)), ' +')[[1]][1]) * 1024
+}
+
+get_model = function(header) {
+	name = header[['model']]
+	key = if(is.null(header[['model_hash']])) name else header[['model_hash']]
+	tick <<- tick + 1
+
+	if(exists(key, envir = models, inherits = FALSE)) {
+		counters$hits <<- counters$hits + 1
+		last_used[[key]] <<- tick
+		return(get(key, envir = models, inherits = FALSE))
+	}
+
+	counters$misses <<- counters$misses + 1
+	# size of the model is the growth of the resident memory, at least the size of its artifact
+	before = resident()
+	model = load_model(name)
+	size = max(resident() - before, file.info(paste0('../../../V/Models/', name, '/model'))$size)
+
+	if(size > budget) {
+		# model that does not fit is served without caching
+		return(model)
+	}
+
+	# evicting least recently used models
+	while(sum(unlist(sizes)) + size > budget) {
+		old = names(which.min(unlist(last_used)))
+		rm(list = old, envir = models)
+		sizes[[old]] <<- NULL
+		last_used[[old]] <<- NULL
+		counters$evictions <<- counters$evictions + 1
+	}
+
+	assign(key, model, envir = models)
+	sizes[[key]] <<- size
+	last_used[[key]] <<- tick
+
+	model
+}
+
+# counters of the cache in json
+stats = function() {
+	sprintf('{"hits": %d, "misses": %d, "evictions": %d, "models": %d, "used": %.0f, "budget": %.0f}',
+	        as.integer(counters$hits), as.integer(counters$misses), as.integer(counters$evictions),
+	        length(sizes), sum(unlist(sizes)), budget)
+}
+
+# running single job, returns header and body of the response
+handle = function(header, payload) {
+	op = header[['op']]
+
+	if(op == 'ping') {
+		return(list(header = list(status = 'ok'), payload = raw(0)))
+	} else if(op == 'stats') {
+		return(list(header = list(status = 'ok'), payload = charToRaw(stats())))
+	} else if(op == 'predict') {
+		# the same arguments as PREDICT.r gets in the command line, data is sent in the payload
+		model = get_model(header)
+		data = read_data(rawToChar(payload), header[['is_hash']], header[['hash']], header[['target']])
+		return(list(header = list(status = 'ok'), payload = format_result(predict_model(model, data, header[['type']]))))
+	}
+
+	stop(paste('unknown operation:', op))
+}
+
+write_message(channel, list(status = 'ready', cache = stats()))
+
+repeat {
+	message = read_message(input)
+
+	if(is.null(message)) {
+		# server closed the pipe
+		break
+	}
+
+	response = tryCatch(handle(message$header, message$payload), error = function(e) {
+		list(header = list(status = 'error'), payload = charToRaw(conditionMessage(e)))
+	})
+
+	# counters of the cache are sent with every response, so the server does not have to ask busy worker
+	response$header$cache = stats()
+
+	write_message(channel, response$header, response$payload)
+}
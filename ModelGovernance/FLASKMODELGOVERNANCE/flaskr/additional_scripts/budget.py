@@ -0,0 +1,72 @@
+"""Applies thread budget and limits of the job inside long-lived processes.
+
+Server sends fields 'threads' and 'cpus' with every job, see
+workers/scheduler.py. Thread pools of BLAS and OpenMP are limited with
+threadpoolctl if it is installed in the environment, otherwise the limit set
+in the environment variables at startup stays. Children forked by the zygote
+also receive 'timeout', 'memory_limit' and 'cpu_limit', see workers/limits.py.
+"""
+
+import math
+import os
+import signal
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+# cores given to the process at startup
+CORES = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+
+# limit applied by the last job, looking up thread pools is not free, so it is changed only when needed
+current = {'threads': None}
+
+
+def apply(header):
+    """Limits the process to the budget of the job.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job
+    """
+
+    # pinning to the cores of the job, or to all cores if it was not pinned
+    if CORES is not None:
+        cpus = header.get('cpus')
+        os.sched_setaffinity(0, [int(cpu) for cpu in cpus.split(',')] if cpus else CORES)
+
+    threads = header.get('threads')
+    if threadpool_limits is not None and threads is not None and threads != current['threads']:
+        threadpool_limits(int(threads))
+        current['threads'] = threads
+
+
+def limit(header):
+    """Limits the forked child to the timeout and resources of the job, it is killed when it exceeds them.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job
+    """
+
+    # default action of the alarm terminates the child
+    if header.get('timeout'):
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        signal.alarm(max(1, math.ceil(float(header['timeout']))))
+
+    if resource is None:
+        return
+    if header.get('memory_limit'):
+        memory = int(header['memory_limit']) * 2 ** 20
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if header.get('cpu_limit'):
+        cpu = int(header['cpu_limit'])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 5))
@@ -0,0 +1,142 @@
+"""Framing of the messages exchanged with resident workers.
+
+Every message is a single header line with tab separated key=value fields
+followed by exactly `length` bytes of payload. Values must not contain tabs
+nor new lines. Module uses only the standard library, so it can be imported
+both by the server and by the scripts run in virtual environments.
+"""
+
+
+def encode_header(header, length):
+    """Creates header line of the message.
+
+    Parameters
+    ----------
+    header : dict
+        fields of the header
+    length : int
+        length of the payload in bytes
+
+    Returns
+    -------
+    bytes
+        encoded header line
+    """
+
+    fields = [str(key) + '=' + str(value) for key, value in header.items() if value is not None]
+    fields.append('length=' + str(length))
+
+    return ('\t'.join(fields) + '\n').encode('utf-8')
+
+
+def decode_header(line):
+    """Parses header line of the message.
+
+    Parameters
+    ----------
+    line : bytes
+        header line
+
+    Returns
+    -------
+    dict
+        fields of the header
+    """
+
+    header = {}
+    for field in line.decode('utf-8').rstrip('\n').split('\t'):
+        if field:
+            key, value = field.split('=', 1)
+            header[key] = value
+
+    return header
+
+
+def write_message(stream, header, payload=b''):
+    """Writes message to the binary stream.
+
+    Parameters
+    ----------
+    stream : file object
+        binary stream opened for writing
+    header : dict
+        fields of the header
+    payload : bytes
+        body of the message
+    """
+
+    stream.write(encode_header(header, len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+
+def read_header(stream):
+    """Reads header line of the message, payload is left in the stream.
+
+    Parameters
+    ----------
+    stream : file object
+        binary stream opened for reading
+
+    Returns
+    -------
+    dict
+        fields of the header including 'length' or None if the stream was closed
+    """
+
+    line = stream.readline()
+    if not line:
+        return None
+
+    return decode_header(line)
+
+
+def read_payload(stream, header):
+    """Reads payload of the message whose header was read.
+
+    Parameters
+    ----------
+    stream : file object
+        binary stream opened for reading
+    header : dict
+        fields of the header, 'length' is removed
+
+    Returns
+    -------
+    bytes
+        body of the message
+    """
+
+    length = int(header.pop('length', 0))
+    chunks = []
+    while length > 0:
+        chunk = stream.read(length)
+        if not chunk:
+            raise EOFError('stream closed in the middle of the message')
+        chunks.append(chunk)
+        length -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def read_message(stream):
+    """Reads message from the binary stream.
+
+    Parameters
+    ----------
+    stream : file object
+        binary stream opened for reading
+
+    Returns
+    -------
+    dict
+        fields of the header or None if the stream was closed
+    bytes
+        body of the message
+    """
+
+    header = read_header(stream)
+    if header is None:
+        return None, None
+
+    return header, read_payload(stream, header)
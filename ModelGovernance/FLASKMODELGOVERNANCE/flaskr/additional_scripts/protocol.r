@@ -0,0 +1,39 @@
+# Framing of the messages exchanged with resident workers, R counterpart of protocol.py.
+# Every message is a header line with tab separated key=value fields followed by `length` bytes of payload.
+
+# reading message from the binary connection, NULL if the connection was closed
+read_message = function(con) {
+	line = readLines(con, n = 1, warn = FALSE)
+	if(length(line) == 0) {
+		return(NULL)
+	}
+
+	# parsing header
+	header = list()
+	for(field in strsplit(line, '\t', fixed = TRUE)[[1]]) {
+		field = strsplit(field, '=', fixed = TRUE)[[1]]
+		header[[field[1]]] = paste(field[-1], collapse = '=')
+	}
+
+	# reading payload
+	n = as.integer(header[['length']])
+	header[['length']] = NULL
+	payload = raw(0)
+	while(length(payload) < n) {
+		chunk = readBin(con, 'raw', n - length(payload))
+		if(length(chunk) == 0) {
+			stop('stream closed in the middle of the message')
+		}
+		payload = c(payload, chunk)
+	}
+
+	list(header = header, payload = payload)
+}
+
+# writing message to the binary connection
+write_message = function(con, header, payload = raw(0)) {
+	header[['length']] = length(payload)
+	line = paste0(paste0(names(header), '=', unlist(header), collapse = '\t'), '\n')
+	writeBin(c(charToRaw(line), payload), con)
+	flush(con)
+}
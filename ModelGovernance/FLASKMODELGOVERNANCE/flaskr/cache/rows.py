@@ -0,0 +1,177 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from flaskr.data import formats
+
+# number of predicted rows kept for every model, 0 turns the cache off
+ROW_CACHE_ROWS = int(os.environ.get('WELES_ROW_CACHE_ROWS', '0'))
+
+
+def enabled():
+    return ROW_CACHE_ROWS > 0
+
+
+class RowCache:
+    """Predictions of single rows of one model, least recently used ones are evicted.
+
+    Rows are identified by two 64-bit hashes of their values computed with different keys, so that a collision
+    would need both of them to collide, together with the kind of the cached prediction, its type and names of the
+    columns.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        # predictions of the rows, None for the missing ones
+        with self.lock:
+            result = []
+            for key in keys:
+                value = self.rows.get(key)
+                if value is not None:
+                    self.rows.move_to_end(key)
+                result.append(value)
+
+            missing = result.count(None)
+            self.hits += len(result) - missing
+            self.misses += missing
+            return result
+
+    def put_many(self, keys, values):
+        with self.lock:
+            for key, value in zip(keys, values):
+                self.rows[key] = value
+                self.rows.move_to_end(key)
+
+            while len(self.rows) > self.size:
+                self.rows.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'rows': len(self.rows)}
+
+
+# caches of the models
+caches = {}
+caches_lock = threading.Lock()
+
+
+def get_cache(model):
+    with caches_lock:
+        if model not in caches:
+            caches[model] = RowCache(ROW_CACHE_ROWS)
+        return caches[model]
+
+
+# keys of the two hashes of the rows
+HASH_KEYS = ('0123456789123456', 'weles-row-cache!')
+
+
+def predict_frame(model, type, frame, run, kind='records'):
+    """Makes a prediction of the rows which were not predicted before, the others are taken from the cache.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    type : str
+        type of the prediction
+    frame : pandas.DataFrame
+        data of the request
+    run : function
+        makes the prediction of the missing rows, gets them as data frame, returns prediction of every row
+    kind : str
+        kind of the values returned by run, values of different kinds are cached separately
+
+    Returns
+    -------
+    list
+        prediction of every row
+    """
+
+    # hashing all rows at once, names of the columns are a part of the key
+    prefix = (kind, type, tuple(frame.columns))
+    hashes = [pd.util.hash_pandas_object(frame, index=False, hash_key=key).tolist() for key in HASH_KEYS]
+    keys = [prefix + pair for pair in zip(*hashes)]
+
+    cache = get_cache(model)
+    values = cache.get_many(keys)
+    missing = [i for i, value in enumerate(values) if value is None]
+
+    if missing:
+        # rows repeated within the request are predicted once
+        first = {}
+        for i in missing:
+            first.setdefault(keys[i], i)
+
+        values_of_missing = run(frame.iloc[list(first.values())].reset_index(drop=True))
+        if len(values_of_missing) != len(first):
+            raise ValueError('prediction has ' + str(len(values_of_missing)) + ' rows, ' + str(len(first)) +
+                             ' were sent')
+        predicted = dict(zip(first, values_of_missing))
+
+        cache.put_many(list(predicted), list(predicted.values()))
+        for i in missing:
+            values[i] = predicted[keys[i]]
+
+    return values
+
+
+def predict(model, type, data, format, result_format, run):
+    """Makes a prediction of the encoded data, only the rows which were not predicted before go to the model.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    type : str
+        type of the prediction
+    data : bytes
+        data in the given format
+    format : str
+        format of the data
+    result_format : str
+        requested format of the prediction
+    run : function
+        makes the prediction of the missing rows, gets the data and its format, returns prediction in csv format
+
+    Returns
+    -------
+    bytes
+        prediction of all rows in the requested format
+    """
+
+    def run_frame(missing):
+        # arrow keeps the types of the columns, csv is used when it is not available
+        missing_format = 'arrow' if 'arrow' in formats.supported() else 'csv'
+        result = run(formats.write_frame(missing, missing_format), missing_format)
+        # lines of the prediction are cached as they were written by the model, so that the merged result has the
+        # same text as the one made without the cache
+        return [line if line.endswith(b'\n') else line + b'\n' for line in result.splitlines(keepends=True)]
+
+    lines = predict_frame(model, type, formats.read_frame(data, format), run_frame, kind='csv')
+    return formats.convert(b''.join(lines), 'csv', result_format, header=False)
+
+
+def stats():
+    """Returns counters of the row caches.
+
+    Returns
+    -------
+    dict
+        hits, misses and evictions of rows and number of cached rows for each model
+    """
+
+    with caches_lock:
+        items = list(caches.items())
+
+    return {model: cache.stats() for model, cache in items}
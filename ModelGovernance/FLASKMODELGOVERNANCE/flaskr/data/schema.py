@@ -0,0 +1,127 @@
+import csv
+import io
+import numbers
+import threading
+
+from flaskr.database import database
+from . import formats
+
+
+class SchemaError(ValueError):
+    """Raised when data does not match columns of the training dataset of the model."""
+
+
+# schemas of the models, they do not change once the model is uploaded
+schemas = {}
+schemas_lock = threading.Lock()
+
+
+def get_schema(model):
+    """Returns feature schema of the model.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+
+    Returns
+    -------
+    list
+        list of tuples with name of the feature and flag if it may be missing, in the order of the training dataset,
+        without the target column
+    """
+
+    with schemas_lock:
+        if model in schemas:
+            return schemas[model]
+
+    target = database.get_target(model)
+    schema = [(name, missing > 0) for name, missing in database.get_features(model) if name != target]
+
+    with schemas_lock:
+        schemas[model] = schema
+    return schema
+
+
+def validate(model, records):
+    """Checks records against the feature schema of the model.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    records : list
+        list of dictionaries mapping names of the features to their values
+
+    Returns
+    -------
+    list
+        names of the features
+    list
+        values of the records as lists, in the order of the features
+    """
+
+    schema = get_schema(model)
+    columns = [name for name, _ in schema]
+
+    if not isinstance(records, list) or not records:
+        raise SchemaError('records must be a non-empty list')
+
+    rows = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise SchemaError('record ' + str(i) + ' is not an object')
+
+        unknown = set(record) - set(columns)
+        if unknown:
+            raise SchemaError('record ' + str(i) + ' has unknown features: ' + ', '.join(sorted(unknown)))
+
+        row = []
+        for name, nullable in schema:
+            value = record.get(name)
+            if value is None and not nullable:
+                raise SchemaError('record ' + str(i) + ' is missing feature ' + name)
+            if value is not None and not isinstance(value, (numbers.Number, str)):
+                raise SchemaError('feature ' + name + ' of record ' + str(i) + ' is not a number or string')
+            row.append(value)
+        rows.append(row)
+
+    return columns, rows
+
+
+def align(model, data, format):
+    """Names columns of the data sent without the names of the model, they are matched by position.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    data : bytes
+        data in the given format, csv has a header row which is replaced
+    format : str
+        format of the data
+
+    Returns
+    -------
+    bytes
+        data in the same format with columns named as the features of the model
+    """
+
+    columns = [name for name, _ in get_schema(model)]
+
+    if format == 'csv':
+        # only the header row is replaced, rows are passed to the model untouched
+        header, newline, rows = data.partition(b'\n')
+        count = len(next(csv.reader([header.decode('utf-8').rstrip('\r')])))
+        if count != len(columns):
+            raise SchemaError('data has ' + str(count) + ' columns, model expects ' + str(len(columns)))
+
+        names = io.StringIO()
+        csv.writer(names, lineterminator='').writerow(columns)
+        return names.getvalue().encode('utf-8') + newline + rows
+
+    frame = formats.read_frame(data, format)
+    if len(frame.columns) != len(columns):
+        raise SchemaError('data has ' + str(len(frame.columns)) + ' columns, model expects ' + str(len(columns)))
+    frame.columns = columns
+    return formats.write_frame(frame, format)
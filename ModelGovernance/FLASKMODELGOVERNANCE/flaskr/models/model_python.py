@@ -1,13 +1,15 @@
 from flaskr.requirement import requirement
 from flaskr.database import database
 from flaskr.environment import environment
-from flaskr.data import data
+from flaskr.data import data, formats
+from flaskr.workers import limits, scheduler, worker, worker_python, zygote
 import subprocess
 import os
 import hashlib
+import json
 
 
-def predict(model, language_version, date, type, is_hash, hash, target):
+def predict(model, language_version, dataset, type, is_hash, hash, target, format='csv', result_format='csv'):
     """Function makes a prediction using model written in Python in its virtual evironment.
 
     Parameters
@@ -16,8 +18,8 @@ def predict(model, language_version, date, type, is_hash, hash, target):
         model in binary wrapped in FileStorage
     language_version : str
         version of the language
-    date : str
-        timestamp
+    dataset : bytes
+        dataset in the given format, None if hash was provided
     type : str
         type of the prediction
     is_hash : bool
@@ -26,26 +28,170 @@ def predict(model, language_version, date, type, is_hash, hash, target):
         hash of the dataset
     target : str
         name of the target column
+    format : str
+        format of the dataset, eg. 'csv' or 'arrow'
+    result_format : str
+        requested format of the prediction
 
     Returns
     -------
+    bytes
+        prediction in the requested format
     """
 
     # creating hash of requirements
     with open("flaskr/V/Models/" + model + "/requirements.txt", 'rb') as fd:
         m = requirement.create_hash_of_requirements(fd.read(), 'python', language_version)
 
+    if zygote.SHARE_MODELS:
+        # running prediction in the child of the zygote sharing loaded model
+        return zygote.predict(m.hexdigest(), model, dataset, type, is_hash, hash, target, format, result_format)
+
+    if worker.WORKERS_PER_ENVIRONMENT > 0:
+        # running prediction in the resident worker of the environment
+        return worker_python.predict(m.hexdigest(), model, dataset, type, is_hash, hash, target, format,
+                                     result_format)
+
     # running script "PREDICT.py" in the virtual environment
     if is_hash == 1:
         # case when dataset provided previously was hash
-        x = subprocess.run(
-            ["flaskr/VENV/python/ENV-" + m.hexdigest() + "/bin/python", "flaskr/additional_scripts/PREDICT.py", model,
-             date, type, str(is_hash), hash, target], stdout=subprocess.PIPE)
+        result = run_script(m.hexdigest(), "PREDICT.py", [model, type, str(is_hash), hash, target])
     else:
-        # case when dataset provided previously was csv
-        x = subprocess.run(
-            ["flaskr/VENV/python/ENV-" + m.hexdigest() + "/bin/python", "flaskr/additional_scripts/PREDICT.py", model,
-             date, type, str(is_hash)], stdout=subprocess.PIPE)
+        # case when dataset was sent in the request, it is passed on stdin in csv format
+        result = run_script(m.hexdigest(), "PREDICT.py", [model, type, str(is_hash)],
+                            formats.convert(dataset, format, 'csv'))
+
+    # script answers in csv format
+    return formats.convert(result, 'csv', result_format, header=False)
+
+
+def predict_stream(model, language_version, type, hash, target, chunk_rows):
+    """Predicts stored dataset chunk by chunk, so that memory used by the prediction does not depend on its size.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    language_version : str
+        version of the language
+    type : str
+        type of the prediction
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    chunk_rows : int
+        number of rows predicted at once
+
+    Yields
+    ------
+    bytes
+        parts of the prediction in csv format
+    """
+
+    # creating hash of requirements
+    with open("flaskr/V/Models/" + model + "/requirements.txt", 'rb') as fd:
+        m = requirement.create_hash_of_requirements(fd.read(), 'python', language_version)
+
+    if worker.WORKERS_PER_ENVIRONMENT > 0:
+        # streaming from the resident worker of the environment
+        yield from worker_python.predict_stream(m.hexdigest(), model, type, hash, target, chunk_rows)
+        return
+
+    # running script "PREDICT.py" in the virtual environment, its output is passed on as it comes
+    with scheduler.job() as job:
+        process = subprocess.Popen(["flaskr/VENV/python/ENV-" + m.hexdigest() + "/bin/python",
+                                    "flaskr/additional_scripts/PREDICT.py", model, type, '1', hash, target,
+                                    str(chunk_rows)], stdout=subprocess.PIPE, env=scheduler.environ(job),
+                                   preexec_fn=limits.preexec(job), start_new_session=True)
+
+        # timeout applies to every chunk, the whole dataset may take long
+        watchdog = limits.Watchdog(process.pid, limits.timeout_of('predict'))
+        finished = False
+        try:
+            watchdog.reset()
+            for block in iter(lambda: process.stdout.read1(2 ** 16), b''):
+                yield block
+                watchdog.reset()
+            finished = True
+        finally:
+            watchdog.cancel()
+            if not finished:
+                # leader is not reaped yet, so the id of the group can not belong to another one
+                limits.kill_group(process.pid)
+            # after the end of the output, exit status tells if the prediction is complete
+            process.wait()
+
+            if watchdog.fired:
+                limits.count('predict', 'timeouts')
+            elif not finished:
+                # client went away before the end of the stream
+                limits.count('predict', 'cancelled')
+
+        if watchdog.fired:
+            raise limits.ExecutionTimeout('chunk of the prediction was not made in ' +
+                                          str(limits.timeout_of('predict')) + ' seconds')
+
+        # error output of the script went to the log of the server
+        limits.check_exit('predict', process.returncode)
+
+
+# hashes of the environments of the models, requirements do not change once the model is uploaded
+environment_hashes = {}
+
+
+def environment_hash(model, language_version):
+    """Returns hash of the environment the model runs in.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    language_version : str
+        version of the language
+
+    Returns
+    -------
+    str
+        hash of the model's requirements
+    """
+
+    if model not in environment_hashes:
+        # creating hash of requirements
+        with open("flaskr/V/Models/" + model + "/requirements.txt", 'rb') as fd:
+            environment_hashes[model] = requirement.create_hash_of_requirements(fd.read(), 'python',
+                                                                                language_version).hexdigest()
+    return environment_hashes[model]
+
+
+def run_script(environment_hash, script, args, input=b''):
+    """Runs one of the additional scripts in the virtual environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    script : str
+        name of the script in additional_scripts
+    args : list
+        command line arguments of the script
+    input : bytes
+        standard input of the script
+
+    Returns
+    -------
+    bytes
+        standard output of the script
+    """
+
+    if zygote.USE_ZYGOTE:
+        # forking from already initialized interpreter
+        return zygote.run(environment_hash, script, args, input)
+
+    # running with timeout and resource limits of the operation of the script
+    return limits.run(
+        ["flaskr/VENV/python/ENV-" + environment_hash + "/bin/python", "flaskr/additional_scripts/" + script] + args,
+        limits.SCRIPT_OPERATIONS.get(script.split('.')[0]), input)
 
 
 def post_model(model, model_name, requirements, **kwargs):
@@ -97,14 +243,11 @@ def print_model(model, language_version):
         m = requirement.create_hash_of_requirements(fd.read(), 'python', language_version)
 
     # printing model in its environment
-    x = subprocess.run(
-        ["flaskr/VENV/python/ENV-" + m.hexdigest() + "/bin/python", "flaskr/additional_scripts/PRINTMODEL.py", model],
-        stdout=subprocess.PIPE)
+    return run_script(m.hexdigest(), "PRINTMODEL.py", [model])
 
-    return x.stdout
 
-
-def audit(model_name, dataset, is_hash, target, data_name, data_desc, measure, user, language_version, date):
+def audit(model_name, dataset, is_hash, target, data_name, data_desc, measures, user, language_version,
+          chunk_rows=0, replicates=0, confidence=0.95, group=None, drop_group=False):
     """Function to audit the Python model in the base
 
     Parameters
@@ -121,30 +264,38 @@ def audit(model_name, dataset, is_hash, target, data_name, data_desc, measure, u
         name of the dataset
     data_desc : str
         description of the dataset
-    measure : str
-        name of the measure used in auditting
+    measures : list
+        names of the measures used in auditting
     user : str
         user's name
     language_version : str
         version of the language
-    date : str
-        timestamp
+    chunk_rows : int
+        number of rows of the dataset predicted at once, 0 predicts the whole dataset
+    replicates : int
+        number of bootstrap replicates of the confidence intervals, 0 computes no intervals
+    confidence : float
+        confidence level of the intervals
+    group : str
+        name of the column whose values slice the dataset, None for no slices
+    drop_group : bool
+        flag if the group column is not a feature of the model
 
     Returns
     -------
-    bool
-        flag if audit has not exiested yet
+    dict
+        flag for every measure if audit has not exiested yet
     str
         hash of the dataset
     bool
         flag if dataset existed
     bool
         flag if alias for dataset was added
+    dict
+        value, lower and upper bound of the interval of every measure which has not existed yet
+    dict
+        number of rows and measures not audited on the slices yet of every value of the group column
     """
-    # creating hash of requirements
-    with open("flaskr/V/Models/" + model_name + "/requirements.txt", 'rb') as fd:
-        m = requirement.create_hash_of_requirements(fd.read(), 'python', language_version)
-
     # translating from str to bool
     if is_hash == '0':
         is_hash = False
@@ -154,13 +305,72 @@ def audit(model_name, dataset, is_hash, target, data_name, data_desc, measure, u
     # saving metadata about the dataset
     hash, exists, alias = data.save_data(dataset, data_name, data_desc, user, is_hash)
 
-    # check if audit has existed yet
-    check = database.check_audit(model_name, hash, measure)
+    # check which audits have existed yet
+    existing = database.existing_audits(model_name, hash, measures)
+    check = {measure: measure not in existing for measure in measures}
+
+    # measures not audited on the slices yet
+    sliced = []
+    if group is not None:
+        existing = database.existing_slice_audits(model_name, hash, group, measures)
+        sliced = [measure for measure in measures if measure not in existing]
+
+    result, slices = {}, {}
+    missing = [measure for measure in measures if check[measure] or measure in sliced]
+    if missing:
+        # all measures which have not existed yet are computed from one prediction
+        result, slices = run_audit(model_name, hash, target, missing, language_version, chunk_rows, replicates,
+                                   confidence, group if sliced else None, drop_group)
+        result = {measure: values for measure, values in result.items() if check[measure]}
+        for slice_audit in slices.values():
+            slice_audit['measures'] = {measure: values for measure, values in slice_audit['measures'].items()
+                                       if measure in sliced}
+
+    return check, hash, exists, alias, result, slices
+
+
+def run_audit(model_name, hash, target, measures, language_version, chunk_rows=0, replicates=0, confidence=0.95,
+              group=None, drop_group=False):
+    """Computes the measures of the model on the uploaded dataset from one prediction
+
+    Parameters
+    ----------
+    model_name : str
+        name of the model
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    measures : list
+        names of the measures
+    language_version : str
+        version of the language
+    chunk_rows : int
+        number of rows of the dataset predicted at once, measures are accumulated chunk by chunk, 0 predicts the
+        whole dataset
+    replicates : int
+        number of bootstrap replicates of the confidence intervals, the prediction is reweighted instead of made
+        again, 0 computes no intervals
+    confidence : float
+        confidence level of the intervals
+    group : str
+        name of the column whose values slice the dataset, measures of every slice are computed from the same
+        prediction, None for no slices
+    drop_group : bool
+        flag if the group column is not a feature of the model and is not passed to it
+
+    Returns
+    -------
+    dict
+        value, lower and upper bound of the interval of every measure, bounds are None without replicates
+    dict
+        number of rows and measures of every value of the group column, empty without group
+    """
 
-    if check:
-        # case when audit has not existed yet
-        x = subprocess.run(
-            ["flaskr/VENV/python/ENV-" + m.hexdigest() + "/bin/python", "flaskr/additional_scripts/AUDIT.py",
-             model_name, hash, target, measure, date], stdout=subprocess.PIPE)
+    result = json.loads(run_script(environment_hash(model_name, language_version), "AUDIT.py",
+                                   [model_name, hash, target, ','.join(measures), str(chunk_rows), str(replicates),
+                                    str(confidence), group or '', '1' if drop_group else '0']))
 
-    return check, hash, exists, alias
+    if group is None:
+        return result, {}
+    return result['measures'], result['slices']
@@ -1,11 +1,43 @@
-from . import model_python, model_r
+from . import model_python, model_r, native
 from flaskr.database import database
 from flaskr.environment import environment
 
 from flaskr import celery
 from datetime import datetime
-from flaskr.data import data
+from flaskr.data import data, formats, schema
+from flaskr.workers import admission, batcher, worker, worker_python, worker_r, zygote
+from flaskr.cache import predictions
+from flaskr.cache import rows as row_cache
 import hashlib
+import pandas as pd
+import os
+import csv
+import tempfile
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+
+# number of rows of the stored dataset predicted at once by streaming predictions
+STREAM_CHUNK_ROWS = int(os.environ.get('WELES_STREAM_CHUNK_ROWS', '100000'))
+
+# number of rows of the dataset predicted at once by audits of Python models, 0 predicts the whole dataset
+AUDIT_CHUNK_ROWS = int(os.environ.get('WELES_AUDIT_CHUNK_ROWS', '100000'))
+
+# measures which audits can compute, see additional_scripts/measures.py
+MEASURES = ('acc', 'mae', 'mse', 'r2', 'precision', 'recall', 'f1')
+
+# largest number of bootstrap replicates of an audit
+MAX_BOOTSTRAP = int(os.environ.get('WELES_MAX_BOOTSTRAP', '10000'))
+
+# number of audits of the batch audit running at once in the celery worker
+AUDIT_BATCH_WORKERS = int(os.environ.get('WELES_AUDIT_BATCH_WORKERS', str(os.cpu_count() or 1)))
+
+# uploaded models are warmed up by predicting few rows of the training dataset, '1' turns it on
+WARMUP = os.environ.get('WELES_WARMUP', '0') == '1'
+
+# number of rows of the training dataset predicted by the warm-up
+WARMUP_ROWS = int(os.environ.get('WELES_WARMUP_ROWS', '5'))
 
 
 def print_model(model, language, language_version):
@@ -17,10 +49,11 @@ def print_model(model, language, language_version):
     language_version - version of the language, string
     """
 
-    if language == 'python':
-        result = model_python.print_model(model, language_version)
-    elif language == 'r':
-        result = model_r.print_model(model, language_version)
+    with admission.admitted(model):
+        if language == 'python':
+            result = model_python.print_model(model, language_version)
+        elif language == 'r':
+            result = model_r.print_model(model, language_version)
 
     return result
 
@@ -253,12 +286,107 @@ def post_model_task(self, n, model_exists, model_name, model_desc, target, is_tr
                                   distribution, distribution_version, language, language_version, architecture,
                                   processor, user_name, tags, **kwargs)
 
+    if language == 'python' and native.ENABLED:
+        # predictions of supported models are made in the server, failure only leaves them to the environment
+        try:
+            native.extract(model_name, language_version, train_hash, target)
+        except Exception as error:
+            print("Error while extracting model", error)
+
+    # warming up the model, so that the first prediction does not start the environment
+    warmup = None
+    if WARMUP:
+        self.update_state(state='UPLOADING',
+                          meta={
+                              'current': n + 4, 'total': n + 5,
+                              'status': 'warming up',
+                              'language': language,
+                              'timestamp': t
+                          }
+                          )
+        try:
+            warmup = warm_up(model_name, train_hash)
+        except Exception as error:
+            print("Error while warming up model", error)
+
     # return metadata
     return {'total': n + 5, 'model_existed': model_exists, 'training_data_hash': train_hash,
-            'training_data_existed': exists, 'added_alias_for_data': alias}
+            'training_data_existed': exists, 'added_alias_for_data': alias, 'warmup': warmup}
+
+
+def start_serving(model, language, language_version):
+    """Starts the process which will serve predictions of the model, if it is not running yet.
+
+    Parameters
+    ----------
+    model : string
+        model's name
+    language : string
+        model's language
+    language_version : string
+        version of the language
+    """
+
+    if language == 'python':
+        if native.ENABLED and native.get_native(model) is not None:
+            # parameters are loaded, there is no process
+            return
 
+        environment_hash = model_python.environment_hash(model, language_version)
+        if zygote.SHARE_MODELS or (worker.WORKERS_PER_ENVIRONMENT == 0 and zygote.USE_ZYGOTE):
+            zygote.get_zygote(environment_hash).start()
+        elif worker.WORKERS_PER_ENVIRONMENT > 0:
+            worker_python.get_pool(environment_hash).start()
+    elif language == 'r' and worker.WORKERS_PER_ENVIRONMENT > 0:
+        worker_r.get_pool(model_r.environment_hash(model, language_version), language_version).start()
 
-def predict(model, language, language_version, date, type, is_hash, hash, target):
+
+def warm_up(model, train_hash):
+    """Starts the serving process of the model, loads the model and predicts few rows of its training dataset.
+
+    Parameters
+    ----------
+    model : string
+        model's name
+    train_hash : string
+        hash of the training dataset
+
+    Returns
+    -------
+    dict
+        time in milliseconds of every phase: reading the rows, starting the serving process, the first prediction
+        which imports packages and loads the model, and the next one made by the warm process
+    """
+
+    timings = {}
+    start = time.perf_counter()
+
+    def phase(name):
+        nonlocal start
+        now = time.perf_counter()
+        timings[name + '_ms'] = round((now - start) * 1000, 3)
+        start = now
+
+    language, language_version = database.get_lang(model)
+    target = database.get_target(model)
+    sample = pd.read_csv("flaskr/V/Datasets/" + train_hash, delimiter=',', header=0, nrows=WARMUP_ROWS)
+    sample = sample.drop(columns=target).to_csv(index=False).encode('utf-8')
+    phase('read_rows')
+
+    start_serving(model, language, language_version)
+    phase('start')
+
+    # bypassing batcher and cache of predictions, so that the model itself is called
+    run_prediction(model, language, language_version, sample, 'exact', 0, None, None, 'csv', 'csv')
+    phase('first_prediction')
+
+    run_prediction(model, language, language_version, sample, 'exact', 0, None, None, 'csv', 'csv')
+    phase('prediction')
+
+    return timings
+
+
+def predict(model, language, language_version, data, type, is_hash, hash, target, format='csv', result_format='csv'):
     """Wrapper for making predictions using models written in different languages.
 
     Parameters
@@ -267,8 +395,8 @@ def predict(model, language, language_version, date, type, is_hash, hash, target
         model's name
     language : string
         model's language
-    date : string
-        timestamp
+    data : bytes
+        data in the given format, None if hash was provided
     type : string
         type of the prediction
     is_hash : bool
@@ -277,19 +405,451 @@ def predict(model, language, language_version, date, type, is_hash, hash, target
         hash of the dataset if was provided
     target : string
         name of the target column
+    format : string
+        format of the data, eg. 'csv' or 'arrow'
+    result_format : string
+        requested format of the prediction
 
     Returns
     -------
+    bytes
+        prediction in the requested format
     """
 
+    if row_cache.enabled() and is_hash == 0:
+        # rows predicted before are taken from the cache, only the others go to the model
+        return row_cache.predict(model, type, data, format, result_format,
+                                 lambda missing, missing_format: predict_data(model, language, language_version,
+                                                                              missing, type, missing_format, 'csv'))
+
+    if is_hash == 0:
+        return predict_data(model, language, language_version, data, type, format, result_format)
+
+    if predictions.enabled():
+        # predictions of the uploaded datasets are cached, neither the model nor the dataset ever change
+        model_hash = worker.get_model_hash(model)
+        result = predictions.get(model_hash, hash, type)
+        if result is None:
+            # failed runs raise before anything is stored
+            result = run_prediction(model, language, language_version, data, type, is_hash, hash, target, format,
+                                    'csv')
+            predictions.put(model_hash, hash, type, result)
+        return formats.convert(result, 'csv', result_format, header=False)
+
+    return run_prediction(model, language, language_version, data, type, is_hash, hash, target, format, result_format)
+
+
+def predict_data(model, language, language_version, data, type, format, result_format):
+    """Makes a prediction of the data sent in the request, parameters are the same as of predict."""
+
+    if batcher.BATCH_WAIT_MS > 0:
+        # merging concurrent requests for the model into one call
+        return batcher.predict(model, type, data, format, result_format,
+                               lambda batch, batch_format: run_prediction(model, language, language_version, batch,
+                                                                          type, 0, None, None, batch_format,
+                                                                          'csv'))
+
+    return run_prediction(model, language, language_version, data, type, 0, None, None, format, result_format)
+
+
+def run_prediction(model, language, language_version, data, type, is_hash, hash, target, format, result_format):
+    """Makes a prediction using function of the model's language, parameters are the same as of predict."""
+
+    # running proper function
+    with admission.admitted(model):
+        if language == 'python':
+            if native.ENABLED:
+                result = native.predict(model, data, type, is_hash, hash, target, format, result_format)
+                if result is not None:
+                    return result
+            return model_python.predict(model, language_version, data, type, is_hash, hash, target, format,
+                                        result_format)
+        elif language == 'r':
+            return model_r.predict(model, language_version, data, type, is_hash, hash, target, format,
+                                   result_format)
+
+
+def predict_stream(model, language, language_version, type, hash, target):
+    """Wrapper for streaming predictions of stored datasets chunk by chunk.
+
+    Parameters
+    ----------
+    model : string
+        model's name
+    language : string
+        model's language
+    language_version : string
+        version of the language
+    type : string
+        type of the prediction
+    hash : string
+        hash of the dataset
+    target : string
+        name of the target column
+
+    Yields
+    ------
+    bytes
+        parts of the prediction in csv format
+    """
+
+    if predictions.enabled():
+        # cached prediction is sent at once
+        model_hash = worker.get_model_hash(model)
+        result = predictions.get(model_hash, hash, type)
+        if result is not None:
+            return (chunk for chunk in [result])
+
+    # slot is held until the stream is closed
+    admission.acquire(model)
+
     # running proper function
     if language == 'python':
-        model_python.predict(model, language_version, date, type, is_hash, hash, target)
+        chunks = model_python.predict_stream(model, language_version, type, hash, target, STREAM_CHUNK_ROWS)
     elif language == 'r':
-        model_r.predict(model, language_version, date, type, is_hash, hash, target)
+        chunks = model_r.predict_stream(model, language_version, type, hash, target, STREAM_CHUNK_ROWS)
+
+    if predictions.enabled():
+        chunks = cached_stream(chunks, model_hash, hash, type)
+
+    return admission.AdmittedIterator(chunks, model)
+
+
+def cached_stream(chunks, model_hash, hash, type):
+    """Passes the streamed prediction through and stores it in the cache of predictions once the stream finished.
+
+    Parameters
+    ----------
+    chunks : iterator
+        parts of the prediction in csv format
+    model_hash : string
+        hash of the model
+    hash : string
+        hash of the dataset
+    type : string
+        type of the prediction
+
+    Yields
+    ------
+    bytes
+        parts of the prediction
+    """
+
+    # predictions larger than the whole cache are not kept
+    kept = []
+    size = 0
+    try:
+        for chunk in chunks:
+            if kept is not None:
+                kept.append(chunk)
+                size += len(chunk)
+                if size > predictions.CACHE_MB * 2 ** 20:
+                    kept = None
+            yield chunk
+    finally:
+        # streams closed by the client kill the model process
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+    # failed runs and streams closed before the end raise before anything is stored
+    if kept is not None:
+        predictions.put(model_hash, hash, type, b''.join(kept))
+
+
+def predict_many(names, data, type, is_hash, hash, format='csv', result_format='csv', prepare_columns=False):
+    """Makes predictions of several models on the same data, models sharing environment run in one process.
+
+    Every model goes through the same caches and native predictions as in predict, only the others are sent to the
+    resident worker of their environment together.
+
+    Parameters
+    ----------
+    names : list
+        names of the models
+    data : bytes
+        data in the given format, None if hash was provided
+    type : string
+        type of the prediction
+    is_hash : int
+        flag if hash of the dataset was provided
+    hash : string
+        hash of the dataset if was provided
+    format : string
+        format of the data, eg. 'csv' or 'arrow'
+    result_format : string
+        requested format of the predictions
+    prepare_columns : bool
+        if columns of the data are in the order of the features, they are named for every model separately
+
+    Returns
+    -------
+    dict
+        prediction in the requested format for each model
+    """
+
+    # grouping models by their environments
+    groups = {}
+    for model in dict.fromkeys(names):
+        language, language_version = database.get_lang(model)
+        target = database.get_target(model) if is_hash == 1 else None
+        if language == 'python':
+            environment_hash = model_python.environment_hash(model, language_version)
+        else:
+            environment_hash = model_r.environment_hash(model, language_version)
+        model_data = schema.align(model, data, format) if prepare_columns and is_hash == 0 else data
+        groups.setdefault((language, language_version, environment_hash), []).append((model, target, model_data))
+
+    def run(group, jobs):
+        language, language_version, environment_hash = group
+        if language != 'python' or worker.WORKERS_PER_ENVIRONMENT == 0 or zygote.SHARE_MODELS:
+            # models of the environment run one after another
+            return {model: predict(model, language, language_version, model_data, type, is_hash, hash, target,
+                                   format, result_format) for model, target, model_data in jobs}
+
+        result = {}
+        # models left for the resident worker, grouped by their data
+        shared = {}
+        for model, target, model_data in jobs:
+            if is_hash == 1 and predictions.enabled():
+                cached = predictions.get(worker.get_model_hash(model), hash, type)
+                if cached is not None:
+                    result[model] = formats.convert(cached, 'csv', result_format, header=False)
+                    continue
+            natively = native.ENABLED and type in (native.get_native(model) or {}).get('types', ())
+            if natively or (is_hash == 0 and row_cache.enabled()):
+                # prediction is made in the server or only its missing rows go to the model
+                result[model] = predict(model, language, language_version, model_data, type, is_hash, hash, target,
+                                        format, result_format)
+                continue
+            shared.setdefault(model_data, []).append((model, target))
+
+        # cached predictions are stored in csv, the same as in predict
+        cache = is_hash == 1 and predictions.enabled()
+        for model_data, models_of_data in shared.items():
+            # data is sent to the resident worker and parsed there once for all models
+            with admission.admitted():
+                predicted = worker_python.predict_many(environment_hash, [model for model, _ in models_of_data],
+                                                       model_data, type, is_hash, hash,
+                                                       [target for _, target in models_of_data], format,
+                                                       'csv' if cache else result_format)
+            for model, prediction in predicted.items():
+                if cache:
+                    predictions.put(worker.get_model_hash(model), hash, type, prediction)
+                    prediction = formats.convert(prediction, 'csv', result_format, header=False)
+                result[model] = prediction
 
+        return result
 
-def audit(model_name, data, is_hash, target, data_name, data_desc, measure, user, date):
+    # environments run in parallel
+    result = {}
+    with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+        for predictions_of_group in executor.map(lambda item: run(*item), list(groups.items())):
+            result.update(predictions_of_group)
+
+    # models in the order of the request
+    return {model: result[model] for model in dict.fromkeys(names)}
+
+
+def predict_records(model, language, language_version, columns, rows, type):
+    """Makes a prediction of few records, already loaded model of the resident worker is used if available.
+
+    Parameters
+    ----------
+    model : string
+        model's name
+    language : string
+        model's language
+    language_version : string
+        version of the language
+    columns : list
+        names of the features
+    rows : list
+        values of the records as lists, in the order of the features
+    type : string
+        type of the prediction
+
+    Returns
+    -------
+    list
+        prediction of every record
+    """
+
+    if row_cache.enabled():
+        # records predicted before are taken from the cache, only the others go to the model
+        values = row_cache.predict_frame(model, type, pd.DataFrame(rows, columns=columns),
+                                         lambda missing: [tuple(value) if isinstance(value, list) else (value,)
+                                                          for value in run_records(model, language, language_version,
+                                                                                   columns, missing.values.tolist(),
+                                                                                   type)])
+        return [value[0] if len(value) == 1 else list(value) for value in values]
+
+    return run_records(model, language, language_version, columns, rows, type)
+
+
+def run_records(model, language, language_version, columns, rows, type):
+    """Makes a prediction of few records, parameters are the same as of predict_records."""
+
+    if language == 'python' and native.ENABLED:
+        with admission.admitted(model):
+            result = native.predict_frame(model, pd.DataFrame(rows, columns=columns), type)
+        if result is not None:
+            return result.tolist()
+
+    if language == 'python' and worker.WORKERS_PER_ENVIRONMENT > 0:
+        with admission.admitted(model):
+            return worker_python.predict_records(model_python.environment_hash(model, language_version), model,
+                                                 columns, rows, type)
+
+    # other models get the records as csv
+    data = io.StringIO()
+    writer = csv.writer(data)
+    writer.writerow(columns)
+    writer.writerows(rows)
+
+    result = predict_data(model, language, language_version, data.getvalue().encode('utf-8'), type, 'csv', 'csv')
+
+    # prediction has a line for every record, labels of the classes may be quoted and are not numbers
+    result = [[record_value(value) for value in line] for line in csv.reader(io.StringIO(result.decode('utf-8')))]
+    return [values[0] if len(values) == 1 else values for values in result if values]
+
+
+def record_value(value):
+    # numbers are sent as numbers, labels of the classes as strings
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def predict_async(model, language, language_version, data, type, is_hash, hash, target, format='csv'):
+    """Starts asynchronous prediction, parameters are the same as of predict.
+
+    Returns
+    -------
+    dict
+        id of the task
+    """
+
+    if is_hash == 1:
+        input = None
+    else:
+        # data sent in the request is handed over to the celery worker in a file of a unique name
+        descriptor, input = tempfile.mkstemp(prefix='prediction_input_', dir='flaskr/tmp')
+        with os.fdopen(descriptor, 'wb') as fd:
+            fd.write(data)
+
+    # asynchronous task for the prediction
+    try:
+        task = predict_task.delay(model, language, language_version, input, type, is_hash, hash, target, format)
+    except Exception:
+        # task was not queued, nobody would remove the input
+        if input is not None:
+            os.remove(input)
+        raise
+
+    # returning task's id
+    return {'task_id': task.id}
+
+
+@celery.task(bind=True)
+def predict_task(self, model, language, language_version, input, type, is_hash, hash, target, format):
+    """Asynchronous task for making prediction, uploaded datasets are predicted chunk by chunk to report progress
+
+    Parameters
+    ----------
+    model : string
+        model's name
+    language : string
+        model's language
+    language_version : string
+        version of the language
+    input : string
+        path to the file with data sent in the request, None if hash was provided
+    type : string
+        type of the prediction
+    is_hash : int
+        flag if hash of the dataset was provided
+    hash : string
+        hash of the dataset if was provided
+    target : string
+        name of the target column
+    format : string
+        format of the data in the file
+
+    Returns
+    -------
+    dict
+        number of predicted rows
+    """
+
+    result_path = "flaskr/tmp/prediction_" + self.request.id
+
+    if is_hash == 1:
+        # counting rows of the dataset without the header
+        total = -1
+        with open("flaskr/V/Datasets/" + hash, 'rb') as fd:
+            for block in iter(lambda: fd.read(2 ** 20), b''):
+                total += block.count(b'\n')
+
+        # init of the task's state
+        self.update_state(state='PREDICTING', meta={'current': 0, 'total': total})
+
+        current = 0
+        with open(result_path, 'wb') as fd, closing(predict_stream(model, language, language_version, type, hash,
+                                                                   target)) as chunks:
+            for chunk in chunks:
+                fd.write(chunk)
+                # every predicted row is a line of the result
+                current += chunk.count(b'\n')
+                self.update_state(state='PREDICTING', meta={'current': current, 'total': total})
+    else:
+        try:
+            with open(input, 'rb') as fd:
+                data = fd.read()
+        finally:
+            # input is removed even if the task fails
+            if os.path.exists(input):
+                os.remove(input)
+
+        total = len(formats.read_frame(data, format))
+
+        # init of the task's state
+        self.update_state(state='PREDICTING', meta={'current': 0, 'total': total})
+
+        result = predict(model, language, language_version, data, type, is_hash, hash, target, format, 'csv')
+        with open(result_path, 'wb') as fd:
+            fd.write(result)
+
+    return {'current': total, 'total': total}
+
+
+def pop_prediction_result(task_id):
+    """Returns result of asynchronous prediction and removes it.
+
+    Parameters
+    ----------
+    task_id : string
+        id of the task
+
+    Returns
+    -------
+    bytes
+        prediction in csv format, None if it was already fetched
+    """
+
+    try:
+        with open("flaskr/tmp/prediction_" + task_id, 'rb') as fd:
+            result = fd.read()
+    except FileNotFoundError:
+        return None
+
+    os.remove("flaskr/tmp/prediction_" + task_id)
+
+    return result
+
+
+def audit(model_name, data, is_hash, target, data_name, data_desc, measures, user, replicates=0, confidence=0.95,
+          group=None):
     """Wrapper function for making audits
 
     Parameters
@@ -306,32 +866,167 @@ def audit(model_name, data, is_hash, target, data_name, data_desc, measure, user
         name of the dataset
     data_desc : string
         dataset description
-    measure : string
-        measure to use
+    measures : list
+        measures to use, all of them are computed from one prediction
     user : string
         user's name
-    date : string
-        timestamp
+    replicates : int
+        number of bootstrap replicates of the confidence intervals, 0 computes no intervals
+    confidence : float
+        confidence level of the intervals
+    group : string
+        name of the column whose values slice the dataset, None for no slices
 
     Returns
     -------
-    bool
-        flag if audit has not existed yet
+    dict
+        flag for every measure if audit has not existed yet
     string
         data's hash
     bool
         flag if dataset already existed
     bool
         flag if alias for dataset was added
+    dict
+        value, lower and upper bound of the interval of every measure which has not existed yet
+    dict
+        number of rows and measures not audited on the slices yet of every value of the group column
     """
 
     # getting model's language
     language, language_version = database.get_lang(model_name)
 
+    # group column is passed to the model only if it is its feature
+    drop_group = group is not None and group not in [name for name, _ in schema.get_schema(model_name)]
+
     # running proper function
-    if language == 'python':
-        return model_python.audit(model_name, data, is_hash, target, data_name, data_desc, measure, user,
-                                  language_version, date)
-    elif language == 'r':
-        return model_r.audit(model_name, data, is_hash, target, data_name, data_desc, measure, user, language_version,
-                             date)
+    with admission.admitted(model_name):
+        if language == 'python':
+            return model_python.audit(model_name, data, is_hash, target, data_name, data_desc, measures, user,
+                                      language_version, AUDIT_CHUNK_ROWS, replicates, confidence, group, drop_group)
+        elif language == 'r':
+            return model_r.audit(model_name, data, is_hash, target, data_name, data_desc, measures, user,
+                                 language_version, AUDIT_CHUNK_ROWS, replicates, confidence, group, drop_group)
+
+
+def audit_batch(model_names, hashes, measures, target, user, replicates=0, confidence=0.95):
+    """Starts asynchronous audit of many models on many uploaded datasets
+
+    Parameters
+    ----------
+    model_names : list
+        names of the models
+    hashes : list
+        hashes of the uploaded datasets
+    measures : list
+        measures to use
+    target : string
+        name of the target column, None if target of every model is used
+    user : string
+        user's name
+    replicates : int
+        number of bootstrap replicates of the confidence intervals, 0 computes no intervals
+    confidence : float
+        confidence level of the intervals
+
+    Returns
+    -------
+    dict
+        id of the task
+    """
+
+    # asynchronous task for the audits
+    task = audit_batch_task.delay(model_names, hashes, measures, target, user, replicates, confidence)
+
+    # returning task's id
+    return {'task_id': task.id}
+
+
+@celery.task(bind=True)
+def audit_batch_task(self, model_names, hashes, measures, target, user, replicates=0, confidence=0.95):
+    """Asynchronous task auditing every model on every dataset, audits which already exist are skipped
+
+    Audits run on a bounded pool of AUDIT_BATCH_WORKERS, jobs are ordered by the environment of the model, so that
+    the ones running at once mostly share it. Every job predicts the dataset once for all its measures.
+
+    Parameters
+    ----------
+    model_names : list
+        names of the models
+    hashes : list
+        hashes of the uploaded datasets
+    measures : list
+        measures to use
+    target : string
+        name of the target column, None if target of every model is used
+    user : string
+        user's name
+    replicates : int
+        number of bootstrap replicates of the confidence intervals, 0 computes no intervals
+    confidence : float
+        confidence level of the intervals
+
+    Returns
+    -------
+    dict
+        numbers of audited, skipped and all pairs of model and dataset, results of audits and failed pairs
+    """
+
+    model_names = list(dict.fromkeys(model_names))
+    hashes = list(dict.fromkeys(hashes))
+
+    # audits which already exist, checked with one query
+    existing = database.existing_audits_of_many(model_names, hashes, measures)
+
+    # pairs of model and dataset with measures still to compute, grouped by environments
+    groups = {}
+    skipped = 0
+    for model in model_names:
+        language, language_version = database.get_lang(model)
+        module = model_python if language == 'python' else model_r
+        model_target = target if target is not None else database.get_target(model)
+        environment_hash = module.environment_hash(model, language_version)
+        for hash in hashes:
+            missing = [measure for measure in measures if (model, hash, measure) not in existing]
+            if missing:
+                groups.setdefault((language, language_version, environment_hash), []).append(
+                    (module, model, hash, model_target, missing, language_version))
+            else:
+                skipped += 1
+
+    jobs = [job for group in groups.values() for job in group]
+    total = len(jobs)
+    results = {}
+    failed = []
+    audits = []
+
+    # init of the task's state
+    self.update_state(state='AUDITING', meta={'current': 0, 'total': total, 'skipped': skipped, 'failed': 0,
+                                              'status': 'auditing'})
+
+    def run(job):
+        module, model, hash, model_target, missing, language_version = job
+        return module.run_audit(model, hash, model_target, missing, language_version, AUDIT_CHUNK_ROWS, replicates,
+                                confidence)[0]
+
+    with ThreadPoolExecutor(max_workers=max(min(AUDIT_BATCH_WORKERS, total), 1)) as executor:
+        futures = {executor.submit(run, job): job for job in jobs}
+        for current, future in enumerate(as_completed(futures), 1):
+            _, model, hash, _, missing, _ = futures[future]
+            try:
+                values = future.result()
+            except Exception as error:
+                # failed pair does not stop the others
+                failed.append({'model': model, 'hash': hash, 'error': str(error)})
+            else:
+                results.setdefault(model, {})[hash] = values
+                audits.extend((model, hash, measure) + tuple(values[measure]) for measure in missing)
+
+            self.update_state(state='AUDITING', meta={'current': current, 'total': total, 'skipped': skipped,
+                                                      'failed': len(failed), 'status': 'auditing'})
+
+    # all results are inserted at once
+    if audits:
+        database.insert_audits_of_many(audits, user, confidence)
+
+    return {'current': total, 'total': total, 'skipped': skipped, 'failed': failed, 'results': results}
@@ -0,0 +1,288 @@
+from io import BytesIO
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from flaskr.data import formats
+from . import model_python
+
+try:
+    from scipy.special import expit
+except ImportError:
+    # logistic function of scikit-learn comes from scipy, numpy one may differ in the last bits and fail the check
+    def expit(x):
+        return 1 / (1 + np.exp(-x))
+
+# predictions of supported scikit-learn models are made in the server with numpy, '1' turns it on
+ENABLED = os.environ.get('WELES_NATIVE', '0') == '1'
+
+# number of rows of the training dataset the extracted model is checked on
+SAMPLE_ROWS = int(os.environ.get('WELES_NATIVE_SAMPLE_ROWS', '1000'))
+
+# number of tree nodes visited at once, bounds memory of the traversal
+TRAVERSAL_NODES = 2 ** 22
+
+
+def path_of(model):
+    return "flaskr/V/Models/" + model + "/native.npz"
+
+
+def extract(model, language_version, train_hash, target):
+    """Extracts parameters of the model in its environment and checks that they reproduce its predictions.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    language_version : str
+        version of the language
+    train_hash : str
+        hash of the training dataset, its first rows are predicted by both the model and the server
+    target : str
+        name of the target column
+
+    Returns
+    -------
+    list
+        types of the predictions served natively, empty if the model is not supported
+    """
+
+    path = path_of(model)
+    candidate = "flaskr/V/Models/" + model + "/native-candidate.npz"
+    model_python.run_script(model_python.environment_hash(model, language_version), "EXTRACT.py",
+                            [model, train_hash, target, str(SAMPLE_ROWS), candidate])
+
+    if not os.path.exists(candidate):
+        # model is not supported
+        return []
+
+    try:
+        with np.load(candidate) as fd:
+            parameters = dict(fd)
+
+        sample = parameters.pop('sample')
+        expected = {type: parameters.pop('expected_' + type) for type in ('exact', 'prob')
+                    if 'expected_' + type in parameters}
+
+        # older versions of scikit-learn normalize probabilities of the trees, newer ones store them normalized
+        types = []
+        for normalize in (False, True):
+            parameters['normalize'] = np.array(normalize)
+
+            # prediction type is served only if the server gives exactly the same numbers as the environment
+            checked = []
+            for type, values in expected.items():
+                result = predict_array(parameters, sample, type)
+                if result is not None and result.shape == values.shape and np.array_equal(result, values):
+                    checked.append(type)
+
+            if len(checked) > len(types):
+                types, best = checked, normalize
+        parameters['normalize'] = np.array(types and best)
+
+        if types:
+            parameters['types'] = np.array(types)
+            # server never loads partially written parameters
+            temporary = "flaskr/V/Models/" + model + "/native-" + str(os.getpid()) + ".npz"
+            with open(temporary, 'wb') as fd:
+                np.savez(fd, **parameters)
+            os.replace(temporary, path)
+    finally:
+        os.remove(candidate)
+
+    return types
+
+
+# extracted parameters of the models, they do not change once they are written
+natives = {}
+natives_lock = threading.Lock()
+
+
+def get_native(model):
+    with natives_lock:
+        if model in natives:
+            return natives[model]
+
+    # missing parameters are not remembered, the model is inserted into the database before they are extracted
+    if not os.path.exists(path_of(model)):
+        return None
+
+    with np.load(path_of(model)) as fd:
+        parameters = dict(fd)
+
+    with natives_lock:
+        natives[model] = parameters
+    return parameters
+
+
+def traverse(parameters, X):
+    # leaf of every tree for every row, only paths which did not reach a leaf yet descend further
+    left, right, feature, threshold = parameters['left'], parameters['right'], parameters['feature'], \
+                                      parameters['threshold']
+    trees = len(parameters['roots'])
+    nodes = np.repeat(parameters['roots'], X.shape[0])
+    rows = np.tile(np.arange(X.shape[0]), trees)
+
+    active = np.flatnonzero(left[nodes] != -1)
+    while active.size:
+        current = nodes[active]
+        following = np.where(X[rows[active], feature[current]] <= threshold[current], left[current], right[current])
+        nodes[active] = following
+        active = active[left[following] != -1]
+
+    return nodes.reshape(trees, X.shape[0])
+
+
+def predict_trees(parameters, X, classifier):
+    # trees compare features as float32, as scikit-learn does
+    X = X.astype(np.float32)
+    trees = len(parameters['roots'])
+    value = parameters['value']
+    normalize = bool(parameters.get('normalize', False))
+
+    chunk = max(1, TRAVERSAL_NODES // trees)
+    result = []
+    for start in range(0, X.shape[0], chunk):
+        leaves = traverse(parameters, X[start:start + chunk])
+        # trees are summed one by one in their order, so that rounding is the same as in scikit-learn
+        total = np.zeros((leaves.shape[1], value.shape[1]) if classifier else leaves.shape[1])
+        for tree in range(trees):
+            if classifier:
+                proba = value[leaves[tree]]
+                if normalize:
+                    normalizer = proba.sum(axis=1)[:, np.newaxis]
+                    normalizer[normalizer == 0.0] = 1.0
+                    proba /= normalizer
+                total += proba
+            else:
+                total += value[leaves[tree], 0]
+        if str(parameters['kind']).startswith('forest'):
+            total /= trees
+        result.append(total)
+
+    return np.concatenate(result)
+
+
+def predict_array(parameters, X, type):
+    """Makes a prediction with extracted parameters the same way as scikit-learn does.
+
+    Parameters
+    ----------
+    parameters : dict
+        extracted parameters of the model
+    X : numpy.ndarray
+        features as float64
+    type : str
+        type of the prediction
+
+    Returns
+    -------
+    numpy.ndarray
+        prediction, None if the type is not supported by the model
+    """
+
+    kind = str(parameters['kind'])
+
+    if kind == 'linear_regressor':
+        if type != 'exact':
+            return None
+        result = X @ parameters['coef'].T + parameters['intercept']
+        return result.ravel() if result.ndim == 2 and result.shape[1] == 1 else result
+
+    if kind == 'logistic':
+        scores = X @ parameters['coef'].T + parameters['intercept']
+        if scores.shape[1] == 1:
+            scores = scores.ravel()
+        if type == 'exact':
+            indices = (scores > 0).astype(int) if scores.ndim == 1 else scores.argmax(axis=1)
+            return parameters['classes'].take(indices)
+        if parameters['ovr']:
+            proba = expit(scores)
+            if proba.ndim == 1:
+                return np.vstack([1 - proba, proba]).T
+            return proba / proba.sum(axis=1).reshape((proba.shape[0], -1))
+        if scores.ndim == 1:
+            scores = np.c_[-scores, scores]
+        scores = scores - np.max(scores, axis=1).reshape((-1, 1))
+        np.exp(scores, scores)
+        return scores / np.sum(scores, axis=1).reshape((-1, 1))
+
+    classifier = kind.endswith('classifier')
+    if not classifier and type != 'exact':
+        return None
+    result = predict_trees(parameters, X, classifier)
+    if classifier and type == 'exact':
+        return parameters['classes'].take(np.argmax(result, axis=1))
+    return result
+
+
+def predict_frame(model, frame, type):
+    """Makes a prediction in the server if the model was extracted and checked for the type.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    frame : pandas.DataFrame
+        features
+    type : str
+        type of the prediction
+
+    Returns
+    -------
+    numpy.ndarray
+        prediction, None if it has to be made in the environment of the model
+    """
+
+    parameters = get_native(model)
+    if parameters is None or type not in parameters['types']:
+        return None
+
+    # names are checked by scikit-learn, mismatch is left to it to report
+    if 'features' in parameters and list(frame.columns) != list(parameters['features']):
+        return None
+
+    try:
+        X = frame.to_numpy(dtype=np.float64)
+    except (ValueError, TypeError):
+        # text features are encoded by the model
+        return None
+
+    if np.isnan(X).any():
+        # missing values are handled differently by versions of scikit-learn
+        return None
+
+    return predict_array(parameters, X, type)
+
+
+def predict(model, data, type, is_hash, hash, target, format='csv', result_format='csv'):
+    """Makes a prediction in the server, parameters are the same as of model_python.predict.
+
+    Returns
+    -------
+    bytes
+        prediction in the requested format, None if it has to be made in the environment of the model
+    """
+
+    parameters = get_native(model)
+    if parameters is None or type not in parameters['types']:
+        return None
+
+    if is_hash == 1:
+        frame = pd.read_csv("flaskr/V/Datasets/" + hash, delimiter=',', header=0).drop(columns=target)
+    else:
+        frame = formats.read_frame(data, format)
+
+    pred = predict_frame(model, frame, type)
+    if pred is None:
+        return None
+
+    if result_format == 'csv':
+        # the same formatting as of PREDICT.py
+        result = BytesIO()
+        np.savetxt(result, pred, delimiter=',')
+        return result.getvalue()
+
+    return formats.write_frame(pd.DataFrame(pred), result_format, header=False)
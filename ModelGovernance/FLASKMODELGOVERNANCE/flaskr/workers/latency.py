@@ -0,0 +1,43 @@
+import collections
+import threading
+
+
+class Latency:
+    """Latencies of the most recent requests of an endpoint.
+
+    Parameters
+    ----------
+    size : int
+        number of the kept latencies
+    """
+
+    def __init__(self, size=10000):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def stats(self):
+        """Returns percentiles of the kept latencies.
+
+        Returns
+        -------
+        dict
+            number of all requests, p50 and p99 latencies in milliseconds
+        """
+
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+
+        if not samples:
+            return {'count': count, 'p50_ms': None, 'p99_ms': None}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+        return {'count': count, 'p50_ms': percentile(0.5), 'p99_ms': percentile(0.99)}
@@ -0,0 +1,158 @@
+import contextlib
+import os
+import threading
+
+# cores available to the server
+CORES = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+
+# number of threads of every job, 0 divides the cores between the running jobs
+THREADS_PER_JOB = int(os.environ.get('WELES_THREADS_PER_JOB', '0'))
+
+# jobs are pinned to the least loaded cores, '1' turns it on
+CPU_AFFINITY = os.environ.get('WELES_CPU_AFFINITY', '0') == '1'
+
+# variables read by OpenMP, MKL, OpenBLAS, Accelerate, numexpr and R's parallel
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                    'NUMEXPR_NUM_THREADS', 'MC_CORES']
+
+
+class Job:
+    """Thread budget of one running job.
+
+    Parameters
+    ----------
+    threads : int
+        number of threads the job may use
+    cpus : list
+        cores the job is pinned to, None if it is not pinned
+    """
+
+    def __init__(self, threads, cpus=None):
+        self.threads = threads
+        self.cpus = cpus
+
+
+lock = threading.Lock()
+running = 0
+# number of jobs pinned to each core
+load = {cpu: 0 for cpu in CORES}
+
+
+def acquire():
+    """Assigns thread budget to a new job, based on the cores and jobs already running.
+
+    Returns
+    -------
+    Job
+        budget of the job
+    """
+
+    global running
+
+    with lock:
+        running += 1
+        if THREADS_PER_JOB > 0:
+            threads = min(THREADS_PER_JOB, len(CORES))
+        else:
+            threads = max(1, len(CORES) // running)
+
+        cpus = None
+        if CPU_AFFINITY:
+            cpus = sorted(CORES, key=lambda cpu: load[cpu])[:threads]
+            for cpu in cpus:
+                load[cpu] += 1
+
+    return Job(threads, cpus)
+
+
+def release(job):
+    global running
+
+    with lock:
+        running -= 1
+        for cpu in job.cpus or []:
+            load[cpu] -= 1
+
+
+@contextlib.contextmanager
+def job():
+    # budget is held while in the block
+    j = acquire()
+    try:
+        yield j
+    finally:
+        release(j)
+
+
+def static_job(processes):
+    """Budget of long-lived processes sharing the cores, it is not held.
+
+    Parameters
+    ----------
+    processes : int
+        number of the processes started for one environment
+
+    Returns
+    -------
+    Job
+        budget of the process
+    """
+
+    return Job(THREADS_PER_JOB or max(1, len(CORES) // max(1, processes)))
+
+
+def environ(j):
+    """Environment of the process of the job.
+
+    Parameters
+    ----------
+    j : Job
+        budget of the job
+
+    Returns
+    -------
+    dict
+        environment variables with thread counts set to the budget
+    """
+
+    env = dict(os.environ)
+    for name in THREAD_VARIABLES:
+        env[name] = str(j.threads)
+    return env
+
+
+def preexec(j):
+    # pinning the process of the job to its cores
+    if j.cpus is None:
+        return None
+    return lambda: os.sched_setaffinity(0, j.cpus)
+
+
+def header(j):
+    """Fields of the job sent to the resident workers, they limit their thread pools per job.
+
+    Parameters
+    ----------
+    j : Job
+        budget of the job
+
+    Returns
+    -------
+    dict
+        'threads' and 'cpus' fields
+    """
+
+    return {'threads': j.threads, 'cpus': None if j.cpus is None else ','.join(str(cpu) for cpu in j.cpus)}
+
+
+def stats():
+    """Returns state of the scheduler.
+
+    Returns
+    -------
+    dict
+        number of cores, running jobs and jobs pinned to each core
+    """
+
+    with lock:
+        return {'cores': len(CORES), 'running': running, 'load': dict(load) if CPU_AFFINITY else None}
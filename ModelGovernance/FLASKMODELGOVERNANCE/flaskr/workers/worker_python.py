@@ -0,0 +1,166 @@
+import json
+
+from flaskr.data import formats
+from . import worker
+
+
+def get_pool(environment_hash):
+    """Returns pool of resident Python workers for the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+
+    Returns
+    -------
+    Pool
+        pool of the workers
+    """
+
+    return worker.get_pool('python-' + environment_hash,
+                           ["flaskr/VENV/python/ENV-" + environment_hash + "/bin/python",
+                            "flaskr/additional_scripts/WORKER.py"])
+
+
+def predict(environment_hash, model, data, type, is_hash, hash, target, format='csv', result_format='csv'):
+    """Makes a prediction in the resident worker of the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    model : str
+        name of the model
+    data : bytes
+        data in the given format, None if hash was provided
+    type : str
+        type of the prediction
+    is_hash : int
+        flag if dataset provided previously was hash
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    format : str
+        format of the data, eg. 'csv' or 'arrow'
+    result_format : str
+        requested format of the prediction
+
+    Returns
+    -------
+    bytes
+        prediction in the requested format
+    """
+
+    response, body = get_pool(environment_hash).request({'op': 'predict', 'model': model,
+                                                         'model_hash': worker.get_model_hash(model), 'type': type,
+                                                         'is_hash': is_hash, 'hash': hash, 'target': target,
+                                                         'format': format, 'result_format': result_format},
+                                                        data or b'')
+
+    # environment without the requested format answers in csv
+    return formats.convert(body, response.get('format', 'csv'), result_format, header=False)
+
+
+def predict_stream(environment_hash, model, type, hash, target, chunk_rows):
+    """Predicts stored dataset chunk by chunk in the resident worker of the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    model : str
+        name of the model
+    type : str
+        type of the prediction
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    chunk_rows : int
+        number of rows predicted at once
+
+    Yields
+    ------
+    bytes
+        prediction of the chunk in csv format
+    """
+
+    for _, body in get_pool(environment_hash).stream({'op': 'predict_stream', 'model': model,
+                                                      'model_hash': worker.get_model_hash(model), 'type': type,
+                                                      'hash': hash, 'target': target, 'chunk_rows': chunk_rows}):
+        yield body
+
+
+def predict_many(environment_hash, models, data, type, is_hash, hash, targets, format='csv', result_format='csv'):
+    """Makes predictions of several models of the environment in one resident worker, data is sent and parsed once.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    models : list
+        names of the models
+    data : bytes
+        data in the given format, None if hash was provided
+    type : str
+        type of the prediction
+    is_hash : int
+        flag if dataset provided previously was hash
+    hash : str
+        hash of the dataset
+    targets : list
+        names of the target columns of the models
+    format : str
+        format of the data, eg. 'csv' or 'arrow'
+    result_format : str
+        requested format of the predictions
+
+    Returns
+    -------
+    dict
+        predictions in the requested format for each model
+    """
+
+    jobs = [{'model': model, 'model_hash': worker.get_model_hash(model), 'target': target}
+            for model, target in zip(models, targets)]
+
+    result = {}
+    for response, body in get_pool(environment_hash).stream({'op': 'predict_many', 'jobs': json.dumps(jobs),
+                                                             'type': type, 'is_hash': is_hash, 'hash': hash,
+                                                             'format': format, 'result_format': result_format},
+                                                            data or b''):
+        # environment without the requested format answers in csv
+        result[response['model']] = formats.convert(body, response.get('format', 'csv'), result_format,
+                                                    header=False)
+
+    return result
+
+
+def predict_records(environment_hash, model, columns, rows, type):
+    """Makes a prediction of few records in the resident worker of the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    model : str
+        name of the model
+    columns : list
+        names of the features
+    rows : list
+        values of the records as lists
+    type : str
+        type of the prediction
+
+    Returns
+    -------
+    list
+        prediction of every record
+    """
+
+    return json.loads(get_pool(environment_hash).request({'op': 'predict_records', 'model': model,
+                                                         'model_hash': worker.get_model_hash(model), 'type': type},
+                                                        json.dumps({'columns': columns,
+                                                                    'rows': rows}).encode('utf-8'))[1])
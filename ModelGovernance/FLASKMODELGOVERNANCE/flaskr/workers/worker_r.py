@@ -0,0 +1,70 @@
+from flaskr.data import formats
+from . import worker
+
+
+def get_pool(environment_hash, language_version):
+    """Returns pool of resident R workers for the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    language_version : str
+        version of the R interpreter
+
+    Returns
+    -------
+    Pool
+        pool of the workers
+    """
+
+    # workers run inside the packrat environment, so that its libraries are used
+    return worker.get_pool('r-' + environment_hash,
+                           ['../../../interpreters/r/R-' + language_version + '/bin/Rscript',
+                            '../../../additional_scripts/WORKER.r'],
+                           cwd='flaskr/VENV/r/ENV-' + environment_hash)
+
+
+def predict(environment_hash, language_version, model, data, type, is_hash, hash, target, format='csv',
+            result_format='csv'):
+    """Makes a prediction in the resident worker of the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    language_version : str
+        version of the R interpreter
+    model : str
+        name of the model
+    data : bytes
+        data in the given format, None if hash was provided
+    type : str
+        type of the prediction
+    is_hash : int
+        flag if dataset provided previously was hash
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    format : str
+        format of the data, eg. 'csv' or 'arrow'
+    result_format : str
+        requested format of the prediction
+
+    Returns
+    -------
+    bytes
+        prediction in the requested format
+    """
+
+    response, body = get_pool(environment_hash, language_version).request({'op': 'predict', 'model': model,
+                                                                           'model_hash': worker.get_model_hash(model),
+                                                                           'type': type, 'is_hash': is_hash,
+                                                                           'hash': hash, 'target': target,
+                                                                           'format': format,
+                                                                           'result_format': result_format},
+                                                                          data or b'')
+
+    # R workers answer in csv
+    return formats.convert(body, response.get('format', 'csv'), result_format, header=False)
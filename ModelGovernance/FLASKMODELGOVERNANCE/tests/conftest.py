@@ -0,0 +1,7 @@
+import os
+import sys
+
+# flaskr is imported as a package, scripts of the environments import their modules directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'flaskr', 'additional_scripts'))
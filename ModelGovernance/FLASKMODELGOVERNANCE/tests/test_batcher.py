@@ -0,0 +1,87 @@
+import io
+import threading
+
+import numpy as np
+import pytest
+
+from flaskr.workers import batcher
+
+
+def run_model(calls):
+    # model writing its prediction as PREDICT.py does
+    def run(data, format):
+        frame = batcher.formats.read_frame(data, format)
+        calls.append(len(frame))
+        output = io.BytesIO()
+        np.savetxt(output, frame['a'].to_numpy() / 3)
+        return output.getvalue()
+    return run
+
+
+def requests(count):
+    return [('a\n' + ''.join(str(10 * i + j) + '\n' for j in range(i + 1))).encode('utf-8') for i in range(count)]
+
+
+def predict_concurrently(data, run):
+    results = [None] * len(data)
+
+    def predict(i):
+        results[i] = batcher.predict('m', 'exact', data[i], 'csv', 'csv', run)
+
+    threads = [threading.Thread(target=predict, args=(i,)) for i in range(len(data))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.fixture(autouse=True)
+def batching(monkeypatch):
+    monkeypatch.setattr(batcher, 'BATCH_WAIT_MS', 2000)
+    monkeypatch.setattr(batcher, 'BATCH_MAX_ROWS', 10)
+    monkeypatch.setattr(batcher, 'pending', {})
+
+
+def test_requests_get_their_own_rows():
+    data = requests(4)
+    calls = []
+    results = predict_concurrently(data, run_model(calls))
+
+    # 1 + 2 + 3 + 4 rows are merged into one batch of BATCH_MAX_ROWS
+    assert calls == [10]
+    # every request gets the same bytes as its own prediction
+    assert results == [run_model([])(request, 'csv') for request in data]
+
+
+def test_full_batches_are_split():
+    data = requests(6)
+    calls = []
+    results = predict_concurrently(data, run_model(calls))
+
+    assert sum(calls) == 21 and max(calls) <= 10 + 6
+    assert results == [run_model([])(request, 'csv') for request in data]
+
+
+def test_error_reaches_every_request():
+    data = requests(3)
+
+    def run(data, format):
+        # one row is missing
+        return b'1\n' * (len(batcher.formats.read_frame(data, format)) - 1)
+
+    errors = []
+
+    def predict(request):
+        try:
+            batcher.predict('m', 'exact', request, 'csv', 'csv', run)
+        except ValueError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=predict, args=(request,)) for request in data]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
@@ -0,0 +1,57 @@
+import io
+
+import protocol
+
+
+def round_trip(header, payload):
+    stream = io.BytesIO()
+    protocol.write_message(stream, header, payload)
+    stream.seek(0)
+    return protocol.read_message(stream)
+
+
+def test_round_trip():
+    assert round_trip({'op': 'predict', 'model': 'm', 'type': 'exact'}, b'x\n1\n') == \
+           ({'op': 'predict', 'model': 'm', 'type': 'exact'}, b'x\n1\n')
+
+
+def test_empty_body():
+    assert round_trip({'status': 'ok'}, b'') == ({'status': 'ok'}, b'')
+
+
+def test_large_body():
+    payload = bytes(range(256)) * (2 ** 15) + b'\n\t=end'
+    assert round_trip({'op': 'run'}, payload) == ({'op': 'run'}, payload)
+
+
+def test_none_fields_are_skipped():
+    assert round_trip({'hash': None, 'target': 'y'}, b'') == ({'target': 'y'}, b'')
+
+
+def test_messages_follow_each_other():
+    stream = io.BytesIO()
+    protocol.write_message(stream, {'n': 1}, b'first\n')
+    protocol.write_message(stream, {'n': 2})
+    protocol.write_message(stream, {'n': 3}, b'third')
+    stream.seek(0)
+
+    assert protocol.read_message(stream) == ({'n': '1'}, b'first\n')
+    assert protocol.read_message(stream) == ({'n': '2'}, b'')
+    assert protocol.read_message(stream) == ({'n': '3'}, b'third')
+    assert protocol.read_message(stream) == (None, None)
+
+
+def test_payload_is_left_in_the_stream():
+    stream = io.BytesIO()
+    protocol.write_message(stream, {'op': 'predict'}, b'data')
+    stream.seek(0)
+
+    header = protocol.read_header(stream)
+    assert header == {'op': 'predict', 'length': '4'}
+    assert protocol.read_payload(stream, header) == b'data'
+    assert 'length' not in header
+
+
+def test_closed_stream():
+    assert protocol.read_header(io.BytesIO()) is None
+    assert protocol.read_message(io.BytesIO()) == (None, None)
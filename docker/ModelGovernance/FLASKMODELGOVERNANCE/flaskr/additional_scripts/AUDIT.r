@@ -7,10 +7,16 @@ model = args[1]
 hash = args[2]
 # target column name
 target = args[3]
-# measure used in auditing
-measure = args[4]
-# timestamp
-date = args[5]
+# measures used in auditing, separated with commas
+measures = strsplit(args[4], ',')[[1]]
+# number of bootstrap replicates, 0 computes no confidence intervals, number of rows of chunks (args[5]) is ignored
+replicates = if (length(args) > 5) as.integer(args[6]) else 0
+# confidence level of the intervals
+confidence = if (length(args) > 6) as.numeric(args[7]) else 0.95
+# column whose values slice the dataset, empty for no slices
+group = if (length(args) > 7 && args[8] != '') args[8] else NA
+# '1' if the group column is not a feature of the model
+drop_group = length(args) > 8 && args[9] == '1'
 
 # reading model
 model = readRDS(paste0('../../../V/Models/', model, '/model'))
@@ -18,10 +24,13 @@ model = readRDS(paste0('../../../V/Models/', model, '/model'))
 # reading data
 data = read.csv(paste0('../../../V/Datasets/', hash), header=T)
 
-# dropping target column
-X = data[-which(colnames(data) == target)]
+# dropping target column, and group column if it is not a feature
+X = data[!(colnames(data) %in% c(target, if (drop_group) group))]
 y = data[[target]]
 
+# stdout is reserved for the result, everything printed by the model goes to stderr
+sink(stderr())
+
 # making prediction
 if(class(model)[1] == 'WrappedModel') {
 	# case when model is mlr model
@@ -35,13 +44,131 @@ if(class(model)[1] == 'WrappedModel') {
 	pred = parsnip::predict(model, X)
 }
 
-if (measure == 'acc') {
-	result = mean(pred == y)
-} else if (measure == 'mae') {
-	result = mean(sum(abs(pred - y)))
-} else if (measure == 'mse') {
-	result = mean(sum((pred - y)^2))
+# number of weights of rows and replicates drawn at once, bounds memory of the bootstrap
+block_weights = 2^22
+
+# weighted sum of the vector for every column of weights
+weighted = function(W, x) as.vector(crossprod(W, as.numeric(x)))
+
+# running sums of the measures of one audit, first element is the point estimate, the others are replicates
+new_state = function() {
+	size = 1 + replicates
+	list(rows = numeric(size), correct = numeric(size), absolute = numeric(size), squared = numeric(size),
+		mean = numeric(size), deviations = numeric(size), tp = matrix(0, size, 0), predicted = matrix(0, size, 0),
+		actual = matrix(0, size, 0))
+}
+
+# counts of new classes start with zeros, columns are ordered as the classes
+add_classes = function(counts, classes) {
+	missing = setdiff(classes, colnames(counts))
+	cbind(counts, matrix(0, nrow(counts), length(missing), dimnames = list(NULL, missing)))[, classes, drop = FALSE]
+}
+
+# adds block of rows weighted with columns of W, only sums needed by the measures are computed
+accumulate = function(state, W, y, pred) {
+	rows = colSums(W)
+	if ('acc' %in% measures) state$correct = state$correct + weighted(W, pred == y)
+	if ('mae' %in% measures) state$absolute = state$absolute + weighted(W, abs(pred - y))
+	if (any(c('mse', 'r2') %in% measures)) state$squared = state$squared + weighted(W, (pred - y)^2)
+	if ('r2' %in% measures) {
+		# merging weighted statistics of the block with the previous ones
+		mean = ifelse(rows > 0, weighted(W, y) / rows, 0)
+		deviations = colSums(W * outer(as.numeric(y), mean, '-')^2)
+		total = state$rows + rows
+		delta = mean - state$mean
+		state$deviations = state$deviations + deviations + ifelse(total > 0, delta^2 * state$rows * rows / total, 0)
+		state$mean = state$mean + ifelse(total > 0, delta * rows / total, 0)
+	}
+	if (any(c('precision', 'recall', 'f1') %in% measures)) {
+		classes = union(colnames(state$tp), union(as.character(y), as.character(pred)))
+		actual = outer(as.character(y), classes, '==')
+		predicted = outer(as.character(pred), classes, '==')
+		state$tp = add_classes(state$tp, classes) + crossprod(W, actual & predicted)
+		state$predicted = add_classes(state$predicted, classes) + crossprod(W, predicted)
+		state$actual = add_classes(state$actual, classes) + crossprod(W, actual)
+	}
+	state$rows = state$rows + rows
+	state
+}
+
+# classification measures other than accuracy are averaged over the classes present in the replicate
+per_class = function(state) {
+	precision = ifelse(state$predicted > 0, state$tp / state$predicted, 0)
+	recall = ifelse(state$actual > 0, state$tp / state$actual, 0)
+	f1 = ifelse(precision + recall > 0, 2 * precision * recall / (precision + recall), 0)
+	present = (state$predicted + state$actual) > 0
+	average = function(x) rowSums(x * present) / rowSums(present)
+	list(precision = average(precision), recall = average(recall), f1 = average(f1))
+}
+
+# values of the measure of the point estimate and of every replicate, mae and mse of the slices are means
+measure = function(name, state, means) {
+	if (name == 'acc') {
+		state$correct / state$rows
+	} else if (name == 'mae') {
+		if (means) state$absolute / state$rows else state$absolute
+	} else if (name == 'mse') {
+		if (means) state$squared / state$rows else state$squared
+	} else if (name == 'r2') {
+		1 - state$squared / state$deviations
+	} else {
+		per_class(state)[[name]]
+	}
+}
+
+# non-finite values are written the way Python reads them
+json_number = function(x) {
+	ifelse(is.na(x) & !is.nan(x), 'null', ifelse(is.nan(x), 'NaN', ifelse(is.infinite(x),
+		ifelse(x > 0, 'Infinity', '-Infinity'), sprintf('%.17g', x))))
+}
+
+# all measures from the same prediction, with bounds of the percentile intervals of the replicates
+audit = function(state, means = FALSE) {
+	result = sapply(measures, function(name) {
+		values = measure(name, state, means)
+		bounds = if (replicates > 0) quantile(values[-1], c((1 - confidence) / 2, (1 + confidence) / 2),
+			na.rm = TRUE, names = FALSE) else c(NA, NA)
+		paste0('"', name, '": [', paste0(json_number(c(values[1], bounds)), collapse = ', '), ']')
+	})
+	paste0('{', paste0(result, collapse = ', '), '}')
+}
+
+if (!is.na(group)) {
+	# rows of every value of the group column are audited with their weights, missing values are under ''
+	groups = as.character(data[[group]])
+	groups[is.na(groups)] = ''
+	values = unique(groups)
+	slices = lapply(values, function(value) new_state())
+}
+
+# weights of the rows are columns of W, the first one is the point estimate, the others are Poisson bootstrap
+# replicates, so that replicates are weighted sums and the dataset is not resampled nor predicted again, weights are
+# drawn for blocks of rows, so that they fit in memory
+set.seed(0)
+state = new_state()
+block = max(1, floor(block_weights / (1 + replicates)))
+for (first in seq(1, by = block, length.out = ceiling(length(y) / block))) {
+	rows = first:min(first + block - 1, length(y))
+	W = cbind(1, matrix(rpois(length(rows) * replicates, 1), nrow = length(rows)))
+	state = accumulate(state, W, y[rows], pred[rows])
+	if (!is.na(group)) {
+		for (i in unique(match(groups[rows], values))) {
+			inside = which(groups[rows] == values[i])
+			slices[[i]] = accumulate(slices[[i]], W[inside, , drop = FALSE], y[rows][inside], pred[rows][inside])
+		}
+	}
+}
+
+result = audit(state)
+
+if (!is.na(group)) {
+	slices = sapply(seq_along(values), function(i) {
+		paste0('"', gsub('(["\\\\])', '\\\\\\1', values[i]), '": {"rows": ', sprintf('%d', as.integer(slices[[i]]$rows[1])),
+			', "measures": ', audit(slices[[i]], means = TRUE), '}')
+	})
+	result = paste0('{"measures": ', result, ', "slices": {', paste0(slices, collapse = ', '), '}}')
 }
 
-# writting result
-write.table(result, paste0('../../../tmp/', date, '.txt'), row.names=FALSE, col.names=FALSE)
+# returning result on stdout as json object
+sink()
+cat(result)
@@ -7,41 +7,105 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 
 import sys
 import pickle
+from io import BytesIO
 import pandas as pd
 import numpy as np
 
-model = sys.argv[1]  # name fo the model
-date = sys.argv[2]  # timestamp
-type = sys.argv[3]  # type of prediction
-is_hash = sys.argv[4]  # False if hash was not provided
-
-# load model
-with open("flaskr/V/Models/" + model + "/model", 'rb') as fd:
-    model = pickle.load(fd)
-
-# loading data
-if is_hash == '0':
-    # case when hash was not provided
-    # reading data
-    data = pd.read_csv("flaskr/tmp/" + date + ".csv", delimiter=',', header=0)
-else:
-    # case when hash was not provided
-    # reading hash
-    hash = sys.argv[5]
-    # reading target column name
-    target = sys.argv[6]
-
-    # reading data
-    data = pd.read_csv("flaskr/V/Datasets/" + hash, delimiter=',', header=0)
-    # dropping target column
-    data = data.drop(columns=target)
-
-# making prediction
-if type == 'prob':
-    pred = model.predict_proba(data)
-elif type == 'exact':
-    pred = model.predict(data)
-
-# saving result
-with open("flaskr/tmp/" + date + ".txt", "wb") as fd:
-    np.savetxt(fd, pred, delimiter=',')
+try:
+    import pyarrow as pa
+except ImportError:
+    # environment without pyarrow exchanges data only in csv
+    pa = None
+
+# formats of the data understood by the script
+FORMATS = ['csv'] if pa is None else ['csv', 'arrow']
+
+
+def load_model(model):
+    # load model
+    with open("flaskr/V/Models/" + model + "/model", 'rb') as fd:
+        return pickle.load(fd)
+
+
+def read_data(data, is_hash, hash=None, target=None, format='csv'):
+    # loading data
+    if is_hash == '0' and format == 'arrow':
+        # case when hash was not provided and data was sent as arrow stream
+        data = pa.ipc.open_stream(data).read_pandas()
+    elif is_hash == '0':
+        # case when hash was not provided
+        # parsing data sent in csv format
+        data = pd.read_csv(BytesIO(data), delimiter=',', header=0)
+    else:
+        # case when hash was provided
+        # reading data
+        data = pd.read_csv("flaskr/V/Datasets/" + hash, delimiter=',', header=0)
+        # dropping target column
+        data = data.drop(columns=target)
+
+    return data
+
+
+def read_chunks(hash, target, chunk_rows):
+    # reading stored dataset in chunks of rows, so that only one of them is kept in memory
+    for data in pd.read_csv("flaskr/V/Datasets/" + hash, delimiter=',', header=0, chunksize=chunk_rows):
+        # dropping target column
+        yield data.drop(columns=target)
+
+
+def predict(model, data, type):
+    # making prediction
+    if type == 'prob':
+        pred = model.predict_proba(data)
+    elif type == 'exact':
+        pred = model.predict(data)
+
+    return pred
+
+
+def format_result(pred, format='csv'):
+    result = BytesIO()
+
+    if format == 'arrow':
+        # formatting result as arrow stream with columns '0', '1', ...
+        table = pa.Table.from_pandas(pd.DataFrame(pred).rename(columns=str), preserve_index=False)
+        with pa.ipc.new_stream(result, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        # formatting result as csv
+        np.savetxt(result, pred, delimiter=',')
+
+    return result.getvalue()
+
+
+if __name__ == '__main__':
+    model = sys.argv[1]  # name fo the model
+    type = sys.argv[2]  # type of prediction
+    is_hash = sys.argv[3]  # False if hash was not provided
+
+    if is_hash == '0':
+        hash = None
+        target = None
+    else:
+        # reading hash
+        hash = sys.argv[4]
+        # reading target column name
+        target = sys.argv[5]
+
+    # number of rows predicted at once, whole dataset if not given
+    chunk_rows = int(sys.argv[6]) if len(sys.argv) > 6 else None
+
+    # data comes from stdin and result goes to stdout, everything printed by the model goes to stderr
+    data = sys.stdin.buffer.read() if is_hash == '0' else None
+    output = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    if chunk_rows is None:
+        output.write(format_result(predict(load_model(model), read_data(data, is_hash, hash, target), type)))
+    else:
+        # streaming prediction of the stored dataset chunk by chunk
+        model = load_model(model)
+        for chunk in read_chunks(hash, target, chunk_rows):
+            output.write(format_result(predict(model, chunk, type)))
+            output.flush()
+    output.flush()
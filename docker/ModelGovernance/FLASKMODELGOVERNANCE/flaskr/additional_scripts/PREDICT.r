@@ -1,47 +1,75 @@
-# command line arguments
-args = commandArgs(trailingOnly=TRUE)
-
-# model name
-model = args[1]
-# timestamp
-date = args[2]
-# type of the prediction
-type = args[3]
-# flag if hash was provided
-is_hash = args[4]
-
 # reading model
-model = readRDS(paste0('../../../V/Models/', model, '/model'))
-
-if(is_hash == '1') {
-	# case when hash was provided
-	# hash
-	hash = args[5]
-	# target column
-	target = args[6]
-	# reading data
-	data = read.csv(paste0('../../../V/Datasets/', hash), header=T)
-	# droping target
-	data = data[-which(colnames(data) == target)]
-} else {
-	# case when hash was not provided
-	# reading the data
-	data = read.csv(paste0('../../../tmp/', date, '.csv'), header=T)
+load_model = function(model) {
+	readRDS(paste0('../../../V/Models/', model, '/model'))
+}
+
+# reading data, data is a csv text when hash was not provided
+read_data = function(data, is_hash, hash = NA, target = NA) {
+	if(is_hash == '1') {
+		# case when hash was provided
+		# reading data
+		data = read.csv(paste0('../../../V/Datasets/', hash), header=T)
+		# droping target
+		data = data[-which(colnames(data) == target)]
+	} else {
+		# case when hash was not provided
+		# parsing the data
+		data = read.csv(text = data, header=T)
+	}
+
+	data
 }
 
 # making predictions
-if(class(model)[1] == 'WrappedModel') {
-	# case when model is mlr model
-	library(mlr)
-	result = predict(model, newdata = data)$data$response
-} else if(class(model)[1] == 'train' && class(model)[2] == 'train.formula') {
-	# case when model is caret model
-	result = predict(model, data)
-} else if(class(model)[2] == 'model_fit') {
-	# case when model is parsnip model
-	result = parsnip::predict(model, data)
+predict_model = function(model, data, type) {
+	if(class(model)[1] == 'WrappedModel') {
+		# case when model is mlr model
+		library(mlr)
+		result = predict(model, newdata = data)$data$response
+	} else if(class(model)[1] == 'train' && class(model)[2] == 'train.formula') {
+		# case when model is caret model
+		result = predict(model, data)
+	} else if(class(model)[2] == 'model_fit') {
+		# case when model is parsnip model
+		result = parsnip::predict(model, data)
+	}
+
+	result
 }
 
-# writting result
-write.table(result, paste0('../../../tmp/', date, '.txt'), sep=',', col.names=F, row.names = F)
+# formatting result as csv
+format_result = function(result) {
+	con = rawConnection(raw(0), 'wb')
+	write.table(result, con, sep=',', col.names=F, row.names = F)
+	value = rawConnectionValue(con)
+	close(con)
+	value
+}
 
+if(sys.nframe() == 0) {
+	# command line arguments
+	args = commandArgs(trailingOnly=TRUE)
+
+	# model name
+	model = args[1]
+	# type of the prediction
+	type = args[2]
+	# flag if hash was provided
+	is_hash = args[3]
+
+	# hash and target column
+	hash = args[4]
+	target = args[5]
+
+	# data comes from stdin and result goes to stdout, everything printed by the model goes to stderr
+	data = NA
+	if(is_hash == '0') {
+		data = paste(readLines(file('stdin')), collapse = '\n')
+	}
+	sink(stderr())
+
+	result = format_result(predict_model(load_model(model), read_data(data, is_hash, hash, target), type))
+	output = file('/dev/stdout', 'wb')
+	writeBin(result, output)
+	close(output)
+}
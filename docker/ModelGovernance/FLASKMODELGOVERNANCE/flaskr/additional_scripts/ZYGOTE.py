@@ -0,0 +1,341 @@
+"""Fork server of one virtual environment.
+
+Zygote imports the heavy packages once and forks a child for every job sent
+to its unix socket, so one-shot scripts (PREDICT.py, AUDIT.py, PRINTMODEL.py)
+start from an already initialized interpreter. Zygote reads only the header
+of the job and forks, the child reads the payload, so a large upload does
+not hold up other jobs. Models of 'predict' jobs are loaded by the zygote in
+a background thread, so the zygote keeps answering pings and reading
+headers, but no child is forked while a load is running: the child would
+inherit locks held by the loading thread (imports, malloc) without the
+thread releasing them. Jobs accepted meanwhile wait and are forked when the
+loads finish, so all children share one copy of the models (copy-on-write).
+Zygote exits when its stdin is closed by the server.
+"""
+
+import warnings
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import errno
+import gc
+import importlib
+import io
+import json
+import os
+import runpy
+import select
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+import budget
+import protocol
+import PREDICT
+from cache import ModelCache
+
+# packages imported before forking, the ones missing in the environment are skipped
+PRELOAD = ['pickle', 'numpy', 'pandas', 'scipy', 'sklearn', 'sklearn.ensemble', 'sklearn.linear_model',
+           'sklearn.tree', 'sklearn.svm', 'sklearn.neighbors', 'sklearn.pipeline', 'sklearn.preprocessing']
+
+for name in PRELOAD:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+
+# seconds a client may take to send the header of the job, the loop waits for it
+HEADER_TIMEOUT = 5
+
+
+def run(header, payload):
+    """Runs script in the current process, returns what it printed.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job, 'script' is the name of the script in additional_scripts,
+        'arg0', 'arg1', ... are its command line arguments
+    payload : bytes
+        standard input of the script
+
+    Returns
+    -------
+    bytes
+        standard output of the script
+    """
+
+    args = []
+    while 'arg' + str(len(args)) in header:
+        args.append(header['arg' + str(len(args))])
+
+    script = "flaskr/additional_scripts/" + header['script']
+    sys.argv = [script] + args
+    sys.stdin = io.TextIOWrapper(io.BytesIO(payload))
+    # wrapper is kept referenced, scripts may replace sys.stdout and its collection would close the buffer
+    output = io.BytesIO()
+    stdout = io.TextIOWrapper(output, write_through=True)
+    sys.stdout = stdout
+
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as error:
+        if error.code not in (None, 0):
+            raise RuntimeError('script exited with ' + str(error.code))
+
+    return output.getvalue()
+
+
+# models loaded in the zygote, forked children share them copy-on-write
+models = ModelCache(int(os.environ.get('WELES_MODEL_CACHE_MB', '1024')) * 2 ** 20)
+
+
+def get_model(header):
+    # name of the model is used when its hash is unknown
+    return models.get(header.get('model_hash', header['model']), header['model'], PREDICT.load_model)
+
+
+def freeze():
+    if hasattr(gc, 'freeze'):
+        # moving loaded objects out of reach of the garbage collector, so that children do not copy their pages
+        gc.freeze()
+
+
+# threads loading the models by their keys, and the models loaded but not cached yet
+loading = {}
+loaded = []
+loaded_lock = threading.Lock()
+
+# jobs accepted while a model was loading, they are forked when no thread is running
+waiting = []
+
+
+def preload(header, notify):
+    """Starts loading the model of the job in a background thread, if it is not cached nor being loaded.
+
+    Parameters
+    ----------
+    header : dict
+        header of the 'predict' job
+    notify : int
+        file descriptor written to when the model is loaded, the loop then adds it to the cache
+    """
+
+    key = header.get('model_hash', header['model'])
+    if models.touch(key) or key in loading:
+        return
+
+    def load():
+        # children are forked only by the main thread, the cache is changed only there
+        try:
+            model, size = models.load(header['model'], PREDICT.load_model)
+        except Exception:
+            traceback.print_exc()
+            model, size = None, None
+        with loaded_lock:
+            loaded.append((key, model, size))
+        os.write(notify, b'.')
+
+    loading[key] = threading.Thread(target=load, daemon=True)
+    loading[key].start()
+
+
+def cache_loaded():
+    # runs in the main thread when a background load finished
+    with loaded_lock:
+        finished = loaded[:]
+        del loaded[:]
+
+    for key, model, size in finished:
+        # thread is finishing after it notified the loop, it must be gone before the next fork
+        loading.pop(key).join()
+        if model is not None:
+            models.put(key, model, size)
+
+    freeze()
+
+
+def fork(connection, stream, header, server, pipe):
+    """Forks the child serving the job, the zygote closes its ends of the connection.
+
+    Parameters
+    ----------
+    connection : socket.socket
+        connection of the job
+    stream : file object
+        binary stream of the connection, header of the job was read from it
+    header : dict
+        header of the job
+    server : socket.socket
+        listening socket of the zygote, closed in the child
+    pipe : tuple
+        descriptors of the pipe waking up the loop, closed in the child
+    """
+
+    if os.fork() == 0:
+        server.close()
+        for fd in pipe:
+            os.close(fd)
+        # connections of the other waiting jobs belong to their own children
+        for other, other_stream, _ in waiting:
+            if other is not connection:
+                other_stream.close()
+                other.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        connection.settimeout(None)
+        try:
+            serve(stream, header)
+        finally:
+            os._exit(0)
+
+    stream.close()
+    connection.close()
+
+
+def listen(path):
+    """Binds the socket of the zygote, the socket is shared by all processes of the server.
+
+    Parameters
+    ----------
+    path : str
+        path of the unix socket
+
+    Returns
+    -------
+    socket.socket
+        listening socket, None if a zygote of another process already listens on the path
+    """
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+    except OSError as error:
+        if error.errno != errno.EADDRINUSE:
+            raise
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            # removing socket left by dead zygote
+            os.remove(path)
+            server.bind(path)
+        else:
+            server.close()
+            return None
+        finally:
+            probe.close()
+
+    server.listen(64)
+    return server
+
+
+def serve(stream, header):
+    # runs in the forked child, payload is read here
+    try:
+        payload = protocol.read_payload(stream, header)
+        budget.apply(header)
+        budget.limit(header)
+
+        if header['op'] == 'run':
+            response, body = {'status': 'ok'}, run(header, payload)
+        elif header['op'] == 'predict':
+            # model is already loaded by the zygote, unless it did not fit in the cache or failed to load
+            model = get_model(header)
+            data = PREDICT.read_data(payload, header['is_hash'], header.get('hash'), header.get('target'),
+                                     header.get('format', 'csv'))
+            format = header.get('result_format', 'csv')
+            response, body = {'status': 'ok', 'format': format}, PREDICT.format_result(
+                PREDICT.predict(model, data, header['type']), format)
+        else:
+            raise ValueError('unknown operation: ' + header['op'])
+    except Exception:
+        response, body = {'status': 'error'}, traceback.format_exc().encode('utf-8')
+    protocol.write_message(stream, response, body)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+
+    server = listen(path)
+    if server is None:
+        protocol.write_message(sys.stdout.buffer, {'status': 'running'})
+        sys.exit(0)
+
+    # socket may be replaced after this zygote dies, only the one it bound is removed
+    inode = os.stat(path).st_ino
+
+    # children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    # background loads wake up the loop
+    wakeup, notify = os.pipe()
+
+    # preloaded packages are not collected by children
+    freeze()
+
+    protocol.write_message(sys.stdout.buffer, {'status': 'ready'})
+
+    # server reads only the first message from the pipe, everything printed later by the models goes to stderr,
+    # so that a full pipe does not block the children
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    while True:
+        readable, _, _ = select.select([server, sys.stdin, wakeup], [], [])
+
+        if sys.stdin in readable and not sys.stdin.buffer.read1(1):
+            # server closed the pipe
+            break
+
+        if wakeup in readable:
+            os.read(wakeup, 4096)
+            cache_loaded()
+
+            if not loading:
+                for job in waiting:
+                    fork(*job, server, (wakeup, notify))
+                del waiting[:]
+
+        if server in readable:
+            connection, _ = server.accept()
+            connection.settimeout(HEADER_TIMEOUT)
+            stream = connection.makefile('rwb')
+
+            try:
+                header = protocol.read_header(stream)
+
+                if header is None:
+                    # client disconnected
+                    pass
+                elif header['op'] == 'ping':
+                    # formats of the data understood by the children
+                    protocol.write_message(stream, {'status': 'ok', 'formats': ','.join(PREDICT.FORMATS)})
+                elif header['op'] == 'stats':
+                    # counters of the models shared by the zygote
+                    protocol.write_message(stream, {'status': 'ok'}, json.dumps(models.stats()).encode('utf-8'))
+                else:
+                    if header['op'] == 'predict':
+                        preload(header, notify)
+
+                    if loading:
+                        # connection is kept open until the loads finish
+                        waiting.append((connection, stream, header))
+                        continue
+
+                    fork(connection, stream, header, server, (wakeup, notify))
+                    continue
+            except Exception:
+                protocol.write_message(stream, {'status': 'error'}, traceback.format_exc().encode('utf-8'))
+
+            stream.close()
+            connection.close()
+
+    server.close()
+    try:
+        if os.stat(path).st_ino == inode:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
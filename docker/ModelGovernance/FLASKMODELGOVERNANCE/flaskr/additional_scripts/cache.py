@@ -0,0 +1,129 @@
+"""Memory-budgeted LRU cache of loaded models used by resident workers.
+
+Size of the model in memory is the growth of the resident memory of the
+process while the model is loaded, unpickled forests and graphs are often
+several times larger than their artifacts. Memory freed by evicted models
+may be reused by the next one, so the size is never taken smaller than the
+artifact in flaskr/V/Models. Module uses only the standard library.
+"""
+
+import os
+from collections import OrderedDict
+
+
+def resident():
+    """Returns resident memory of this process.
+
+    Returns
+    -------
+    int
+        bytes, 0 if the system does not report it
+    """
+
+    try:
+        with open('/proc/self/status') as fd:
+            for line in fd:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class ModelCache:
+    """Least recently used models are evicted when the budget is exceeded.
+
+    Parameters
+    ----------
+    budget : int
+        memory budget in bytes
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.models = OrderedDict()
+        self.sizes = {}
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, name, loader):
+        """Returns the model, loads it if it is not in the cache.
+
+        Parameters
+        ----------
+        key : str
+            hash of the model
+        name : str
+            name of the model in the base
+        loader : function
+            function loading the model by its name
+
+        Returns
+        -------
+        object
+            loaded model
+        """
+
+        if self.touch(key):
+            return self.models[key]
+
+        model, size = self.load(name, loader)
+        self.put(key, model, size)
+
+        return model
+
+    def touch(self, key):
+        # counts the lookup, True if the model is cached
+        if key in self.models:
+            self.hits += 1
+            self.models.move_to_end(key)
+            return True
+
+        self.misses += 1
+        return False
+
+    @staticmethod
+    def load(name, loader):
+        """Loads the model and measures its size, does not change the cache, so it may run in another thread.
+
+        Parameters
+        ----------
+        name : str
+            name of the model in the base
+        loader : function
+            function loading the model by its name
+
+        Returns
+        -------
+        object
+            loaded model
+        int
+            size of the model in bytes
+        """
+
+        before = resident()
+        model = loader(name)
+        size = max(resident() - before, os.path.getsize("flaskr/V/Models/" + name + "/model"))
+
+        return model, size
+
+    def put(self, key, model, size):
+        if size > self.budget:
+            # model that does not fit is served without caching
+            return
+
+        # evicting least recently used models
+        while self.used + size > self.budget:
+            old, _ = self.models.popitem(last=False)
+            self.used -= self.sizes.pop(old)
+            self.evictions += 1
+
+        self.models[key] = model
+        self.sizes[key] = size
+        self.used += size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'models': len(self.models),
+                'used': self.used, 'budget': self.budget}
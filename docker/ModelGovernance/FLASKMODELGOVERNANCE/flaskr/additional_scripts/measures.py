@@ -0,0 +1,272 @@
+"""Measures of the audits computed from one prediction of the model
+
+Measures are accumulated chunk by chunk of the dataset, so that it does not
+have to be in memory at once, see AUDIT.py. Accuracy, absolute and squared
+errors are running sums, r2 merges means and sums of squared deviations of
+the target, other classification measures are computed from counts of true
+positives, predicted and actual rows of every class and averaged over the
+classes (macro), classes which are never predicted have precision 0.
+
+Confidence intervals are computed with Poisson bootstrap: every row gets a
+weight drawn from Poisson(1) for every replicate, so replicates are weighted
+sums accumulated together with the point estimate, without resampling the
+dataset or predicting it again. Weights of a row do not depend on the size
+of the chunks, so the intervals are the same for any chunking.
+
+Sliced audits keep an accumulator for every value of the group column, rows
+of the chunk are split between them with one group-by of the codes of the
+values. mae and mse of the slices are means of the errors, so that slices
+of different sizes can be compared, audits of whole datasets keep the sums.
+"""
+
+import numpy as np
+import pandas as pd
+
+MEASURES = ('acc', 'mae', 'mse', 'r2', 'precision', 'recall', 'f1')
+
+# measures computed from counts of the classes
+CLASSIFICATION = ('precision', 'recall', 'f1')
+
+# number of weights of rows and replicates drawn at once, bounds memory of the bootstrap
+BLOCK_WEIGHTS = 2 ** 22
+
+
+class Accumulator:
+    """Running state of the measures of one audit, first row of every state is the point estimate, the others are
+    bootstrap replicates.
+
+    Parameters
+    ----------
+    measures : list
+        names of the measures
+    replicates : int
+        number of bootstrap replicates, 0 computes only the point estimate
+    seed : int
+        seed of the bootstrap weights
+    means : bool
+        if mae and mse are means instead of sums of the errors
+    """
+
+    def __init__(self, measures, replicates=0, seed=0, means=False):
+        self.measures = measures
+        self.replicates = replicates
+        self.means = means
+        self.random = np.random.RandomState(seed)
+        size = 1 + replicates
+        self.rows = np.zeros(size)
+        self.correct = np.zeros(size)
+        self.absolute = np.zeros(size)
+        self.squared = np.zeros(size)
+        # mean of the target and sum of squared deviations from it
+        self.mean = np.zeros(size)
+        self.deviations = np.zeros(size)
+        # counts of every class, columns are ordered as the classes
+        self.classes = {}
+        self.tp = np.zeros((size, 0))
+        self.predicted = np.zeros((size, 0))
+        self.actual = np.zeros((size, 0))
+
+    def weights(self, rows):
+        # weights of the rows, point estimate has all of them equal to 1
+        weights = np.ones((1 + self.replicates, rows))
+        if self.replicates:
+            weights[1:] = self.random.poisson(1, size=(rows, self.replicates)).T
+        return weights
+
+    def update(self, y, pred):
+        """Adds a chunk of the dataset, only sums needed by the measures are computed.
+
+        Parameters
+        ----------
+        y : array-like
+            values of the target
+        pred : array-like
+            prediction of the model
+        """
+
+        y = np.asarray(y)
+        pred = np.asarray(pred)
+
+        # rows are weighted in blocks, so that weights of all replicates fit in memory
+        block = max(1, BLOCK_WEIGHTS // (1 + self.replicates))
+        for start in range(0, len(y), block):
+            self.update_block(y[start:start + block], pred[start:start + block])
+
+    def update_block(self, y, pred):
+        weights = self.weights(len(y))
+        rows = weights.sum(axis=1)
+
+        if 'acc' in self.measures:
+            self.correct += weights @ (pred == y)
+        if 'mae' in self.measures:
+            self.absolute += weights @ np.abs(pred - y)
+        if 'mse' in self.measures or 'r2' in self.measures:
+            self.squared += weights @ ((pred - y) ** 2)
+        if 'r2' in self.measures:
+            # merging weighted statistics of the block with the previous ones
+            mean = np.divide(weights @ y, rows, out=np.zeros_like(rows), where=rows > 0)
+            deviations = np.sum(weights * (y[np.newaxis, :] - mean[:, np.newaxis]) ** 2, axis=1)
+            total = self.rows + rows
+            delta = mean - self.mean
+            self.deviations += deviations + np.divide(delta ** 2 * self.rows * rows, total,
+                                                      out=np.zeros_like(rows), where=total > 0)
+            self.mean += np.divide(delta * rows, total, out=np.zeros_like(rows), where=total > 0)
+        if any(measure in self.measures for measure in CLASSIFICATION):
+            self.count_classes(y, pred, weights)
+
+        self.rows += rows
+
+    def count_classes(self, y, pred, weights):
+        # new classes get columns of zeros
+        for value in pd.unique(np.concatenate([y, pred])):
+            if value not in self.classes:
+                self.classes[value] = len(self.classes)
+        missing = len(self.classes) - self.tp.shape[1]
+        if missing:
+            self.tp, self.predicted, self.actual = (np.pad(counts, ((0, 0), (0, missing)))
+                                                    for counts in (self.tp, self.predicted, self.actual))
+
+        # indicators of the classes of the rows
+        classes = np.empty(len(self.classes), dtype=object)
+        for value, column in self.classes.items():
+            classes[column] = value
+        actual = y[:, np.newaxis] == classes[np.newaxis, :]
+        predicted = pred[:, np.newaxis] == classes[np.newaxis, :]
+
+        self.tp += weights @ (actual & predicted)
+        self.predicted += weights @ predicted
+        self.actual += weights @ actual
+
+    def values(self):
+        # measures of the point estimate and of every replicate
+        values = {}
+        # measures of replicates without rows are undefined
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if 'acc' in self.measures:
+                values['acc'] = self.correct / self.rows
+            if 'mae' in self.measures:
+                values['mae'] = self.absolute / self.rows if self.means else self.absolute
+            if 'mse' in self.measures:
+                values['mse'] = self.squared / self.rows if self.means else self.squared
+            if 'r2' in self.measures:
+                values['r2'] = 1 - self.squared / self.deviations
+        if any(measure in self.measures for measure in CLASSIFICATION):
+            values.update(classification(self.tp, self.predicted, self.actual))
+        return values
+
+    def result(self, confidence=0.95):
+        """Computes the measures from the accumulated sums.
+
+        Parameters
+        ----------
+        confidence : float
+            confidence level of the percentile bootstrap intervals
+
+        Returns
+        -------
+        dict
+            value, lower and upper bound of the interval of every measure, bounds are None without replicates
+        """
+
+        result = {}
+        for measure, values in self.values().items():
+            lower = upper = None
+            if self.replicates:
+                # replicates where the measure is undefined are left out
+                lower, upper = (float(bound) for bound in np.nanpercentile(
+                    values[1:], [50 * (1 - confidence), 50 * (1 + confidence)]))
+            result[measure] = [float(values[0]), lower, upper]
+
+        return {measure: result[measure] for measure in self.measures}
+
+
+class Slices:
+    """Accumulators of the measures of every value of the group column, missing values form one slice.
+
+    Parameters
+    ----------
+    measures : list
+        names of the measures
+    replicates : int
+        number of bootstrap replicates, 0 computes only the point estimates
+    """
+
+    def __init__(self, measures, replicates=0):
+        self.measures = measures
+        self.replicates = replicates
+        self.slices = {}
+
+    def update(self, groups, y, pred):
+        """Adds a chunk of the dataset to the slices of its rows.
+
+        Parameters
+        ----------
+        groups : array-like
+            values of the group column
+        y : array-like
+            values of the target
+        pred : array-like
+            prediction of the model
+        """
+
+        y = np.asarray(y)
+        pred = np.asarray(pred)
+
+        # rows of every value of the chunk, missing values have code -1
+        codes, values = pd.factorize(np.asarray(groups))
+        for code, rows in pd.Series(codes).groupby(codes).indices.items():
+            value = None if code == -1 else values[code]
+            if value not in self.slices:
+                self.slices[value] = Accumulator(self.measures, self.replicates, seed=len(self.slices), means=True)
+            self.slices[value].update(y[rows], pred[rows])
+
+    def result(self, confidence=0.95):
+        """Computes the measures of every slice.
+
+        Parameters
+        ----------
+        confidence : float
+            confidence level of the percentile bootstrap intervals
+
+        Returns
+        -------
+        dict
+            number of rows and measures (see Accumulator.result) of every slice, missing values are under ''
+        """
+
+        return {'' if value is None else str(value): {'rows': int(accumulator.rows[0]),
+                                                       'measures': accumulator.result(confidence)}
+                for value, accumulator in self.slices.items()}
+
+
+def classification(tp, predicted, actual):
+    """Macro averaged measures of the counts of the classes, every row is averaged separately.
+
+    Parameters
+    ----------
+    tp : numpy.ndarray
+        counts of rows of the class predicted correctly
+    predicted : numpy.ndarray
+        counts of rows predicted as the class
+    actual : numpy.ndarray
+        counts of rows of the class
+
+    Returns
+    -------
+    dict
+        precision, recall and f1
+    """
+
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, actual, out=np.zeros_like(tp), where=actual > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=precision + recall > 0)
+
+    # classes missing in a bootstrap replicate are not averaged
+    present = (predicted + actual) > 0
+    classes = present.sum(axis=1)
+
+    def average(values):
+        return np.divide((values * present).sum(axis=1), classes, out=np.full(len(classes), np.nan),
+                         where=classes > 0)
+
+    return {'precision': average(precision), 'recall': average(recall), 'f1': average(f1)}
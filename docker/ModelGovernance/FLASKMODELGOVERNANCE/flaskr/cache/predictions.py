@@ -0,0 +1,144 @@
+import os
+import threading
+
+# disk budget of the cached predictions of the uploaded datasets in megabytes, 0 turns the cache off
+CACHE_MB = int(os.environ.get('WELES_PREDICTION_CACHE_MB', '1024'))
+
+# directory of the cached predictions, shared by the server and celery workers
+PATH = "flaskr/V/Predictions/"
+
+# counters of the cache in this process
+counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+counters_lock = threading.Lock()
+
+
+def enabled():
+    return CACHE_MB > 0
+
+
+def path_of(model_hash, dataset_hash, type):
+    # models and uploaded datasets never change, so their hashes identify the prediction
+    return PATH + model_hash + '-' + dataset_hash + '-' + type
+
+
+def get(model_hash, dataset_hash, type):
+    """Returns cached prediction.
+
+    Parameters
+    ----------
+    model_hash : str
+        hash of the model
+    dataset_hash : str
+        hash of the uploaded dataset
+    type : str
+        type of the prediction
+
+    Returns
+    -------
+    bytes
+        prediction in csv format, None if it is not cached
+    """
+
+    path = path_of(model_hash, dataset_hash, type)
+    try:
+        with open(path, 'rb') as fd:
+            result = fd.read()
+        if not result:
+            # stored by a failed run before empty results were refused
+            os.remove(path)
+            raise FileNotFoundError(path)
+        # modification time orders the predictions for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        with counters_lock:
+            counters['misses'] += 1
+        return None
+
+    with counters_lock:
+        counters['hits'] += 1
+    return result
+
+
+def put(model_hash, dataset_hash, type, result):
+    """Stores prediction and evicts least recently used ones exceeding the budget.
+
+    Parameters
+    ----------
+    model_hash : str
+        hash of the model
+    dataset_hash : str
+        hash of the uploaded dataset
+    type : str
+        type of the prediction
+    result : bytes
+        prediction in csv format, only results of runs which succeeded are stored
+    """
+
+    if not result:
+        # empty output is not a prediction of the dataset, it would be served for every later request
+        return
+
+    if len(result) > CACHE_MB * 2 ** 20:
+        # prediction would evict everything else
+        return
+
+    path = path_of(model_hash, dataset_hash, type)
+    # readers never see partially written file, hidden files are not counted as cached
+    temporary = PATH + '.' + os.path.basename(path) + '.' + str(os.getpid()) + '.' + str(threading.get_ident())
+    with open(temporary, 'wb') as fd:
+        fd.write(result)
+    os.replace(temporary, path)
+
+    evict()
+
+
+def entries():
+    # cached predictions from the oldest used
+    result = []
+    for entry in os.scandir(PATH):
+        if entry.name.startswith('.'):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            # removed by another process
+            continue
+        result.append((stat.st_mtime, stat.st_size, entry.path))
+
+    return sorted(result)
+
+
+def evict():
+    cached = entries()
+
+    used = sum(size for _, size, _ in cached)
+    for _, size, path in cached:
+        if used <= CACHE_MB * 2 ** 20:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        used -= size
+        with counters_lock:
+            counters['evictions'] += 1
+
+
+def stats():
+    """Returns counters of the cache.
+
+    Returns
+    -------
+    dict
+        hits, misses and evictions in this process, number and size of the cached predictions
+    """
+
+    with counters_lock:
+        result = dict(counters)
+
+    cached = entries()
+    result['predictions'] = len(cached)
+    result['used'] = sum(size for _, size, _ in cached)
+    result['budget'] = CACHE_MB * 2 ** 20
+
+    return result
@@ -0,0 +1,171 @@
+from io import BytesIO
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # binary formats are optional, csv is always supported
+    pa = None
+    pq = None
+
+# media types of the supported formats
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def supported():
+    """List of formats supported by the server.
+
+    Returns
+    -------
+    list
+        names of the formats
+    """
+
+    if pa is None:
+        return ['csv']
+    return ['csv', 'arrow', 'parquet']
+
+
+def from_media_type(media_type):
+    """Name of the format of given media type, csv for unknown ones.
+
+    Parameters
+    ----------
+    media_type : string
+        media type, eg. 'text/csv'
+
+    Returns
+    -------
+    string
+        name of the format
+    """
+
+    for name, value in MEDIA_TYPES.items():
+        if value == media_type and name in supported():
+            return name
+    return 'csv'
+
+
+def read_frame(payload, format, header=True):
+    """Parses data frame.
+
+    Parameters
+    ----------
+    payload : bytes
+        encoded data frame
+    format : string
+        format of the payload
+    header : bool
+        if csv has a header row
+
+    Returns
+    -------
+    pandas.DataFrame
+        decoded data frame
+    """
+
+    if format == 'arrow':
+        return pa.ipc.open_stream(payload).read_pandas()
+    elif format == 'parquet':
+        return pq.read_table(BytesIO(payload)).to_pandas()
+
+    return pd.read_csv(BytesIO(payload), header=0 if header else None)
+
+
+def write_frame(frame, format, header=True):
+    """Encodes data frame.
+
+    Parameters
+    ----------
+    frame : pandas.DataFrame
+        data frame to encode
+    format : string
+        format of the result
+    header : bool
+        if csv should have a header row
+
+    Returns
+    -------
+    bytes
+        encoded data frame
+    """
+
+    if format in ('arrow', 'parquet'):
+        # arrow requires string column names
+        frame = frame.rename(columns=str)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = BytesIO()
+        if format == 'arrow':
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pq.write_table(table, sink)
+        return sink.getvalue()
+
+    return frame.to_csv(index=False, header=header).encode('utf-8')
+
+
+def convert(payload, source, target, header=True):
+    """Converts encoded data frame between formats.
+
+    Parameters
+    ----------
+    payload : bytes
+        encoded data frame
+    source : string
+        format of the payload
+    target : string
+        requested format
+    header : bool
+        if csv has a header row, results of the predictions do not have it
+
+    Returns
+    -------
+    bytes
+        data frame in the requested format
+    """
+
+    if source == target:
+        return payload
+
+    return write_frame(read_frame(payload, source, header), target, header)
+
+
+def negotiate(header, payload, formats):
+    """Adjusts the job to the formats understood by the worker.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job, fields 'format' and 'result_format' describe the payload and requested result
+    payload : bytes
+        body of the job
+    formats : list
+        formats supported by the worker
+
+    Returns
+    -------
+    dict
+        header of the job
+    bytes
+        body of the job
+    """
+
+    header = dict(header)
+
+    if header.get('format', 'csv') not in formats:
+        # arrow is preferred as it keeps the types of the columns
+        target = 'arrow' if 'arrow' in formats else 'csv'
+        payload = convert(payload, header['format'], target)
+        header['format'] = target
+
+    if header.get('result_format', 'csv') not in formats:
+        header['result_format'] = 'csv'
+
+    return header, payload
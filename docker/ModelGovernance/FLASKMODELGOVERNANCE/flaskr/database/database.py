@@ -287,7 +287,8 @@ def model_info(model_name):
         columns = cur.fetchall()
 
         # query for selecting audits
-        query = """select dataset_id, measure, value, user_name from audits where model_name = %s"""
+        query = """select dataset_id, measure, value, user_name, ci_lower, ci_upper, confidence from audits
+				where model_name = %s"""
 
         # execution of the query
         cur.execute(query, (model_name,))
@@ -295,6 +296,16 @@ def model_info(model_name):
         # fetching result
         audits = cur.fetchall()
 
+        # query for selecting audits of the slices
+        query = """select dataset_id, group_column, slice, number_of_rows, measure, value, user_name, ci_lower, ci_upper,
+				confidence from audit_slices where model_name = %s"""
+
+        # execution of the query
+        cur.execute(query, (model_name,))
+
+        # fetching result
+        slices = cur.fetchall()
+
         # query for selecting aliases
         query = """select d.name, d.description, d.timestamp, d.owner from datasets_aliases d join models m on m.train_data_id = d.dataset_id
 				where m.model_name = %s"""
@@ -306,7 +317,8 @@ def model_info(model_name):
         aliases = cur.fetchall()
 
         # constructing result
-        result = {'model': model, 'data': data, 'columns': columns, 'audits': audits, 'aliases': aliases}
+        result = {'model': model, 'data': data, 'columns': columns, 'audits': audits, 'slices': slices,
+                  'aliases': aliases}
 
     except (Exception, psycopg2.Error) as error:
         print("Error while connecting to PostgreSQL", error)
@@ -643,24 +655,113 @@ def get_target(model):
     return target
 
 
-def check_audit(model, dataset_id, measure):
-    """Check if audit already exists
+def get_model_hash(model):
+    """Get hash of the model
+
+    Parameters
+    ----------
+    model : string
+        model name
+
+    Returns
+    -------
+    string
+        hash of the model
+    """
+
+    try:
+        conn = psycopg2.connect(user='basic',
+                                password=os.environ['database_password'],
+                                host='127.0.0.1',
+                                port='5432',
+                                database='modelmetadata')
+
+        cur = conn.cursor()
+
+        # query for selecting hash
+        query = """select hash from models where model_name = %s"""
+
+        # execution of the query
+        cur.execute(query, (model,))
+
+        # fetching the result
+        hash = cur.fetchone()[0]
+
+
+    except (Exception, psycopg2.Error) as error:
+        print("Error while connecting to PostgreSQL", error)
+    finally:
+        # closing database connection.
+        if (conn):
+            cur.close()
+            conn.close()
+
+    return hash
+
+
+def get_features(model):
+    """Get columns of the training dataset of the model
+
+    Parameters
+    ----------
+    model : string
+        model name
+
+    Returns
+    -------
+    list
+        list of tuples with name of the column and number of its missing values, in the order of the columns
+    """
+
+    try:
+        conn = psycopg2.connect(user='basic',
+                                password=os.environ['database_password'],
+                                host='127.0.0.1',
+                                port='5432',
+                                database='modelmetadata')
+
+        cur = conn.cursor()
+
+        # query for selecting features
+        query = """select f.name, f.missing from features f join models m on m.train_data_id = f.dataset_id where m.model_name = %s order by f.id"""
+
+        # execution of the query
+        cur.execute(query, (model,))
+
+        # fetching the result
+        features = cur.fetchall()
+
+
+    except (Exception, psycopg2.Error) as error:
+        print("Error while connecting to PostgreSQL", error)
+    finally:
+        # closing database connection.
+        if (conn):
+            cur.close()
+            conn.close()
+
+    return features
+
+
+def existing_audits(model, dataset_id, measures):
+    """Check which of the audits already exist
 
     Parameters
     ----------
     model : string
         name of the model
     dataset_id : string
-        hash of the datasets
-    measure : string
-        name of the measure
+        hash of the dataset
+    measures : list
+        names of the measures
 
     Returns
     -------
-    bool
-        True if audit does not exists, False otherwise
+    list
+        names of the measures which were already audited
     """
 
+    result = []
     try:
         conn = psycopg2.connect(user='basic',
                                 password=os.environ['database_password'],
@@ -670,19 +771,14 @@ def check_audit(model, dataset_id, measure):
 
         cur = conn.cursor()
 
-        # query for selecting audits
-        query = """select count(*) from audits where model_name = %s and dataset_id = %s and measure = %s"""
+        # query for selecting audits of all measures at once
+        query = """select distinct measure from audits where model_name = %s and dataset_id = %s and
+				measure = any(%s)"""
 
         # execution of the query
-        cur.execute(query, (model, dataset_id, measure))
-
-        # count of the audits
-        count = cur.fetchone()[0]
+        cur.execute(query, (model, dataset_id, list(measures)))
 
-        if count != 0:
-            result = False
-        else:
-            result = True
+        result = [row[0] for row in cur.fetchall()]
 
     except (Exception, psycopg2.Error) as error:
         print("Error while connecting to PostgreSQL", error)
@@ -694,8 +790,8 @@ def check_audit(model, dataset_id, measure):
         return result
 
 
-def insert_audit(model, dataset_id, measure, value, user_name):
-    """Insert audit of the model
+def insert_audits(model, dataset_id, values, user_name, confidence=None):
+    """Insert audits of many measures of the model in one transaction
 
     Parameters
     ----------
@@ -703,17 +799,116 @@ def insert_audit(model, dataset_id, measure, value, user_name):
         name of the model
     dataset_id : string
         hash of the dataset
-    measure : string
-        name of the measure
-    value : string
-        value of the measure
+    values : dict
+        value, lower and upper bound of the confidence interval of every measure, bounds are None without interval
     user_name : string
-        name of the model
+        name of the user
+    confidence : float
+        confidence level of the intervals, None without them
+
+    Returns
+    -------
+    bool
+        True if insertion of the audits was successful, False otherwise
+    """
+
+    try:
+        conn = psycopg2.connect(user='basic',
+                                password=os.environ['database_password'],
+                                host='127.0.0.1',
+                                port='5432',
+                                database='modelmetadata')
+
+        cur = conn.cursor()
+
+        # query for audit insertion
+        query = """insert into audits (model_name, dataset_id, measure, value, user_name, ci_lower, ci_upper,
+				confidence) values (%s, %s, %s, %s, %s, %s, %s, %s)"""
+
+        # execution of the query for all measures
+        cur.executemany(query, [(model, dataset_id, measure, float(value), user_name, lower, upper,
+                                 confidence if lower is not None else None)
+                                for measure, (value, lower, upper) in values.items()])
+
+        # commit
+        conn.commit()
+
+        result = True
+
+    except (Exception, psycopg2.Error) as error:
+        print("Error while connecting to PostgreSQL", error)
+        result = False
+    finally:
+        # closing database connection.
+        if (conn):
+            cur.close()
+            conn.close()
+        return result
+
+
+def existing_audits_of_many(models, dataset_ids, measures):
+    """Check which audits of many models and datasets already exist
+
+    Parameters
+    ----------
+    models : list
+        names of the models
+    dataset_ids : list
+        hashes of the datasets
+    measures : list
+        names of the measures
+
+    Returns
+    -------
+    set
+        tuples of model, dataset hash and measure which were already audited
+    """
+
+    result = set()
+    try:
+        conn = psycopg2.connect(user='basic',
+                                password=os.environ['database_password'],
+                                host='127.0.0.1',
+                                port='5432',
+                                database='modelmetadata')
+
+        cur = conn.cursor()
+
+        # query for selecting audits of all pairs at once
+        query = """select distinct model_name, dataset_id, measure from audits where model_name = any(%s) and
+				dataset_id = any(%s) and measure = any(%s)"""
+
+        # execution of the query
+        cur.execute(query, (list(models), list(dataset_ids), list(measures)))
+
+        result = set(cur.fetchall())
+
+    except (Exception, psycopg2.Error) as error:
+        print("Error while connecting to PostgreSQL", error)
+    finally:
+        # closing database connection.
+        if (conn):
+            cur.close()
+            conn.close()
+        return result
+
+
+def insert_audits_of_many(audits, user_name, confidence=None):
+    """Insert audits of many models and datasets in one transaction
+
+    Parameters
+    ----------
+    audits : list
+        tuples of model name, dataset hash, measure, its value, lower and upper bound of the confidence interval
+    user_name : string
+        name of the user
+    confidence : float
+        confidence level of the intervals, None without them
 
     Returns
     -------
     bool
-        True if insertion of the audit was successful, False otherwise
+        True if insertion of the audits was successful, False otherwise
     """
 
     try:
@@ -726,11 +921,121 @@ def insert_audit(model, dataset_id, measure, value, user_name):
         cur = conn.cursor()
 
         # query for audit insertion
-        query = """insert into audits (model_name, dataset_id, measure, value, user_name) values
-				(%s, %s, %s, %s, %s)"""
+        query = """insert into audits (model_name, dataset_id, measure, value, user_name, ci_lower, ci_upper,
+				confidence) values (%s, %s, %s, %s, %s, %s, %s, %s)"""
+
+        # execution of the query for all audits
+        cur.executemany(query, [(model, dataset_id, measure, float(value), user_name, lower, upper,
+                                 confidence if lower is not None else None)
+                                for model, dataset_id, measure, value, lower, upper in audits])
+
+        # commit
+        conn.commit()
+
+        result = True
+
+    except (Exception, psycopg2.Error) as error:
+        print("Error while connecting to PostgreSQL", error)
+        result = False
+    finally:
+        # closing database connection.
+        if (conn):
+            cur.close()
+            conn.close()
+        return result
+
+
+def existing_slice_audits(model, dataset_id, group_column, measures):
+    """Check which audits of the slices of the dataset already exist
+
+    Parameters
+    ----------
+    model : string
+        name of the model
+    dataset_id : string
+        hash of the dataset
+    group_column : string
+        name of the column whose values slice the dataset
+    measures : list
+        names of the measures
+
+    Returns
+    -------
+    list
+        names of the measures which were already audited on the slices
+    """
+
+    result = []
+    try:
+        conn = psycopg2.connect(user='basic',
+                                password=os.environ['database_password'],
+                                host='127.0.0.1',
+                                port='5432',
+                                database='modelmetadata')
+
+        cur = conn.cursor()
+
+        # query for selecting audits of the slices of all measures at once
+        query = """select distinct measure from audit_slices where model_name = %s and dataset_id = %s and
+				group_column = %s and measure = any(%s)"""
 
         # execution of the query
-        cur.execute(query, (model, dataset_id, measure, float(value), user_name))
+        cur.execute(query, (model, dataset_id, group_column, list(measures)))
+
+        result = [row[0] for row in cur.fetchall()]
+
+    except (Exception, psycopg2.Error) as error:
+        print("Error while connecting to PostgreSQL", error)
+    finally:
+        # closing database connection.
+        if (conn):
+            cur.close()
+            conn.close()
+        return result
+
+
+def insert_slice_audits(model, dataset_id, group_column, slices, user_name, confidence=None):
+    """Insert audits of the slices of the dataset in one transaction
+
+    Parameters
+    ----------
+    model : string
+        name of the model
+    dataset_id : string
+        hash of the dataset
+    group_column : string
+        name of the column whose values slice the dataset
+    slices : dict
+        number of rows and measures of every value of the column, see insert_audits
+    user_name : string
+        name of the user
+    confidence : float
+        confidence level of the intervals, None without them
+
+    Returns
+    -------
+    bool
+        True if insertion of the audits was successful, False otherwise
+    """
+
+    try:
+        conn = psycopg2.connect(user='basic',
+                                password=os.environ['database_password'],
+                                host='127.0.0.1',
+                                port='5432',
+                                database='modelmetadata')
+
+        cur = conn.cursor()
+
+        # query for audit insertion
+        query = """insert into audit_slices (model_name, dataset_id, measure, group_column, slice, number_of_rows,
+				value, user_name, ci_lower, ci_upper, confidence) values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+        # execution of the query for all slices and measures
+        cur.executemany(query, [(model, dataset_id, measure, group_column, group_value, audit['rows'], float(value),
+                                 user_name, lower, upper, confidence if lower is not None else None)
+                                for group_value, audit in slices.items()
+                                for measure, (value, lower, upper) in audit['measures'].items()])
 
         # commit
         conn.commit()
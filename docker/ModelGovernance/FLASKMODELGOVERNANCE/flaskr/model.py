@@ -1,6 +1,6 @@
 #! /usr/bin/python3
 
-from flask import Blueprint, flash, g, redirect, render_template, request, url_for, current_app, request
+from flask import Blueprint, flash, g, redirect, render_template, request, url_for, current_app, request, Response
 
 from datetime import datetime
 import pickle
@@ -9,7 +9,8 @@ import os
 
 from io import StringIO
 
-import subprocess
+
+import time
 
 import hashlib
 
@@ -19,13 +20,55 @@ import pandas as pd
 from flaskr.requirement import requirement
 from flaskr.environment import environment
 from flaskr.database import database
+from flaskr.data import formats, schema
 from flaskr.models import models, model_python, model_r
 from flaskr.user import user
+from flaskr.workers import worker, zygote, batcher, admission, scheduler, limits
+from flaskr.workers.latency import Latency
+from flaskr.cache import predictions
+from flaskr.cache import rows as row_cache
 from . import celery
 
 bp = Blueprint('models', __name__, url_prefix='/models')
 
 
+@bp.errorhandler(admission.Overloaded)
+def overloaded(error):
+    """Answer for requests rejected by the admission control.
+
+    Returns
+    -------
+    tuple
+        reason of the rejection, status 503 and Retry-After header
+    """
+
+    return {'error': str(error)}, 503, {'Retry-After': str(error.retry_after)}
+
+
+@bp.errorhandler(schema.SchemaError)
+def schema_error(error):
+    # data does not match the features of the model
+    return {'error': str(error)}, 400
+
+
+@bp.errorhandler(limits.ExecutionTimeout)
+def execution_timeout(error):
+    # model process was killed after the timeout of the operation
+    return {'error': 'timeout', 'message': str(error)}, 504
+
+
+@bp.errorhandler(limits.MemoryLimitExceeded)
+def memory_limit_exceeded(error):
+    # model process ran out of its memory limit
+    return {'error': 'memory_limit', 'message': str(error)}, 507
+
+
+@bp.errorhandler(limits.ProcessFailed)
+def process_failed(error):
+    # model process exited with an error, its output was discarded
+    return {'error': 'process_failed', 'message': str(error)}, 500
+
+
 @bp.route('/<model>', methods=('GET',))
 def print_model(model):
     """Allows printing model in its environment.
@@ -208,7 +251,8 @@ def status(task_id):
                 'model_existed': task.info.get('model_existed'),
                 'training_data_hash': task.info.get('training_data_hash'),
                 'training_data_existed': task.info.get('training_data_existed'),
-                'added_alias_for_data': task.info.get('added_alias_for_data')
+                'added_alias_for_data': task.info.get('added_alias_for_data'),
+                'warmup': task.info.get('warmup')
             }
         }
     else:
@@ -222,6 +266,31 @@ def status(task_id):
     return response
 
 
+@bp.route('/workers/stats', methods=('GET',))
+def workers_stats():
+    """Endpoint for statistics of the resident workers
+
+    Returns
+    -------
+    dict
+        hits, misses and evictions of the model cache of every running worker and zygote, grouped by environment,
+        counters of the batcher and of the prediction cache, latencies of the records endpoint, state of the admission
+        control, of the thread scheduler, processes stopped by the limits and counters of the row caches
+    """
+
+    result = worker.stats()
+    result.update(zygote.stats())
+    result['batcher'] = batcher.stats()
+    result['predictions'] = predictions.stats()
+    result['records'] = records_latency.stats()
+    result['admission'] = admission.stats()
+    result['scheduler'] = scheduler.stats()
+    result['limits'] = limits.stats()
+    result['rows'] = row_cache.stats()
+
+    return result
+
+
 @bp.route('/<model>/explain', methods=('GET',))
 def explain(model):
     """
@@ -233,14 +302,13 @@ def explain(model):
         m = requirement.create_hash_of_requirements(fd.read())
 
     # model path
-    model = "flaskr/V/Models/" + model + "/model"
-
-    # running script "explain.r" in virtual environment
-    x = subprocess.run(
-        ["Rscript", "flaskr/explain.r", model, "flaskr/VENV/python/ENV-" + m.hexdigest(), "flaskr/X", "flaskr/Y"],
-        stdout=subprocess.PIPE)
+    path = "flaskr/V/Models/" + model + "/model"
 
-    return x.stdout
+    # running script "explain.r" in virtual environment, counted toward the limit of the model
+    with admission.admitted(model):
+        return limits.run(
+            ["Rscript", "flaskr/explain.r", path, "flaskr/VENV/python/ENV-" + m.hexdigest(), "flaskr/X", "flaskr/Y"],
+            'explain')
 
 
 @bp.route('/<model>/explain/<func>', methods=('GET',))
@@ -254,44 +322,41 @@ def explain_func(model, func):
         m = requirement.create_hash_of_requirements(fd.read())
 
     # path to model
-    model = "flaskr/V/Models/" + model + "/model"
+    path = "flaskr/V/Models/" + model + "/model"
 
-    # running script "explain.r" in virtual environment
-    x = subprocess.run(
-        ["Rscript", "flaskr/explain.r", model, "flaskr/VENV/python/ENV-" + m.hexdigest(), "flaskr/X", "flaskr/Y", func],
-        stdout=subprocess.PIPE)
+    # running script "explain.r" in virtual environment, counted toward the limit of the model
+    with admission.admitted(model):
+        return limits.run(
+            ["Rscript", "flaskr/explain.r", path, "flaskr/VENV/python/ENV-" + m.hexdigest(), "flaskr/X", "flaskr/Y",
+             func], 'explain')
 
-    return x.stdout
 
-
-@bp.route('/<model>/predict/<type>', methods=('GET', 'POST'))
-def predict_model(model, type):
-    """Endpoint for function runs model with given data in its virtual environment. Returns prediction.
+def prediction_input(model, align=True):
+    """Reads data of the prediction request.
 
     Parameters
     ----------
     model : string
         name of the model to make a prediction with
-    type : string
-        type of the prediction
-    data : string
-        data for prediction in csv format
-    is_hash : string
-        '0', if there is not hash of the already uploaded dataset, '1' otherwise
-    hash : string, optional
-        hash of the already uploaded dataset
+    align : bool
+        if columns of the data are named as the features of the model when the request asks for it
 
     Returns
     -------
+    dict
+        fields of the form
+    int
+        1 if hash of the uploaded dataset was given, 0 otherwise
+    string
+        hash of the dataset or None
     string
-        result as a csv
+        name of the target column or None
+    bytes
+        data sent in the request or None
+    string
+        format of the data
     """
 
-    # date in timestamp to use for the names of temporary files
-    date = str(datetime.now().timestamp())
-
-    # received data
-
     # flag describing if hash was given
     info = dict(request.form)
 
@@ -303,39 +368,247 @@ def predict_model(model, type):
         # reading hash
         hash = info['hash']
         target = database.get_target(model)
+        data = None
+        format = 'csv'
     else:
         # case when hash was not provided
 
-        data = info['data']
+        # data is passed to the model in memory
+        if 'data' in request.files:
+            # binary formats are sent as a file
+            data = request.files['data'].read()
+            format = formats.from_media_type(request.files['data'].mimetype)
+        else:
+            data = info['data'].encode('utf-8')
+            format = 'csv'
 
-        # saving data to temporary file
-        with open('flaskr/tmp/' + date + '.csv', 'w') as fd:
-            fd.write(data)
+        if align and info.get('prepare_columns') == '1':
+            # columns are named on the server from the cached schema, client does not have to ask for them
+            data = schema.align(model, data, format)
 
         hash = None
         target = None
 
+    return info, is_hash, hash, target, data, format
+
+
+def requested_format():
+    # format of the result chosen by the Accept header, csv by default
+    return formats.from_media_type(request.accept_mimetypes.best_match(
+        [formats.MEDIA_TYPES[f] for f in formats.supported()], formats.MEDIA_TYPES['csv']))
+
+
+@bp.route('/<model>/predict/<type>', methods=('GET', 'POST'))
+def predict_model(model, type):
+    """Endpoint for function runs model with given data in its virtual environment. Returns prediction.
+
+    Parameters
+    ----------
+    model : string
+        name of the model to make a prediction with
+    type : string
+        type of the prediction
+    data : string or file
+        data for prediction in csv format, or file in Arrow IPC stream or Parquet format with matching mimetype
+    is_hash : string
+        '0', if there is not hash of the already uploaded dataset, '1' otherwise
+    hash : string, optional
+        hash of the already uploaded dataset
+    prepare_columns : string, optional
+        '1' if columns of the data are in the order of the training dataset without the target, they are named by the
+        server
+    stream : string, optional
+        '1' to predict the already uploaded dataset chunk by chunk, result is sent as chunked csv
+
+    Returns
+    -------
+    bytes
+        result in the format chosen by the Accept header, csv by default
+    """
+
+    # received data
+    info, is_hash, hash, target, data, format = prediction_input(model)
+
     # getting model's language
     lang, lang_version = database.get_lang(model)
 
+    if is_hash == 1 and info.get('stream') == '1':
+        # result is sent as it is made, so that the dataset never has to fit into memory
+        return Response(models.predict_stream(model, lang, lang_version, type, hash, target),
+                        mimetype=formats.MEDIA_TYPES['csv'])
+
+    # format of the result requested by the client
+    result_format = requested_format()
+
     # calling function for making prediction
-    models.predict(model, lang, lang_version, date, type, is_hash, hash, target)
+    result = models.predict(model, lang, lang_version, data, type, is_hash, hash, target, format, result_format)
 
-    if not is_hash == 1:
-        # case when hash was not provided
-        # removing temporary data file
-        os.remove("flaskr/tmp/" + date + ".csv")
+    return Response(result, mimetype=formats.MEDIA_TYPES[result_format])
+
+
+@bp.route('/predict_many/<type>', methods=('GET', 'POST'))
+def predict_many(type):
+    """Endpoint making predictions of several models on the same data, sent only once.
+
+    Parameters
+    ----------
+    type : string
+        type of the prediction
+    models : list
+        names of the models, field repeated for every model
+    data : string or file
+        data for prediction in csv format, or file in Arrow IPC stream or Parquet format with matching mimetype
+    is_hash : string
+        '0', if there is not hash of the already uploaded dataset, '1' otherwise
+    hash : string, optional
+        hash of the already uploaded dataset
+    prepare_columns : string, optional
+        '1' if columns of the data are in the order of the features, they are named by the server for every model
+
+    Returns
+    -------
+    dict
+        prediction in csv format for each model
+    """
+
+    names = request.form.getlist('models')
+
+    # received data, target columns and names of the columns are set for every model separately
+    info, is_hash, hash, _, data, format = prediction_input(names[0], align=False)
+
+    result = models.predict_many(names, data, type, is_hash, hash, format,
+                                 prepare_columns=info.get('prepare_columns') == '1')
+
+    return {model: prediction.decode('utf-8') for model, prediction in result.items()}
+
+
+# latencies of the records endpoint
+records_latency = Latency()
+
+# languages of the models, they do not change once the model is uploaded
+model_languages = {}
 
-    # reading result
-    with open("flaskr/tmp/" + date + ".txt", 'r') as fd:
-        result = fd.read()
 
-    # removing temporary result file
-    os.remove("flaskr/tmp/" + date + ".txt")
+@bp.route('/<model>/predict/<type>/records', methods=('POST',))
+def predict_records(model, type):
+    """Endpoint for low-latency predictions of few records sent as JSON.
+
+    Parameters
+    ----------
+    model : string
+        name of the model to make a prediction with
+    type : string
+        type of the prediction
+    records : list
+        JSON list of objects mapping names of the features to their values, or object with such list in 'records'
+
+    Returns
+    -------
+    dict
+        prediction of every record, or error if records do not match features of the model
+    """
+
+    start = time.perf_counter()
+
+    records = request.get_json(force=True)
+    if isinstance(records, dict):
+        records = records.get('records')
+
+    # records not matching the features are answered with 400 by the error handler
+    columns, rows = schema.validate(model, records)
+
+    if model not in model_languages:
+        model_languages[model] = database.get_lang(model)
+    lang, lang_version = model_languages[model]
+
+    result = {'predictions': models.predict_records(model, lang, lang_version, columns, rows, type)}
+
+    records_latency.record(time.perf_counter() - start)
 
     return result
 
 
+@bp.route('/<model>/predict/<type>/async', methods=('GET', 'POST'))
+def predict_model_async(model, type):
+    """Endpoint starting prediction as an asynchronous task, parameters are the same as of the predict endpoint.
+
+    Returns
+    -------
+    dict
+        id of the task, its progress is available at /models/predict/status/<task_id>
+    """
+
+    # received data
+    _, is_hash, hash, target, data, format = prediction_input(model)
+
+    # getting model's language
+    lang, lang_version = database.get_lang(model)
+
+    return models.predict_async(model, lang, lang_version, data, type, is_hash, hash, target, format)
+
+
+@bp.route('/predict/status/<task_id>', methods=('GET',))
+def predict_status(task_id):
+    """Endpoint for status of the asynchronous prediction
+
+    Parameters
+    ----------
+    task_id : string
+        id of the task
+
+    Returns
+    -------
+    dict
+        state of the task, number of predicted and all rows
+    """
+
+    # get the result
+    task = models.predict_task.AsyncResult(task_id)
+
+    if task.state == 'PENDING':
+        # case when task has not started yet
+        response = {'state': task.state, 'current': 0, 'total': 1, 'status': 'PENDING'}
+    elif task.state in ('PREDICTING', 'SUCCESS'):
+        response = {'state': task.state, 'current': task.info.get('current'), 'total': task.info.get('total'),
+                    'status': task.state}
+    else:
+        # failure of the prediction
+        response = {'state': task.state, 'status': 'PREDICTION FAILED'}
+
+    return response
+
+
+@bp.route('/predict/result/<task_id>', methods=('GET',))
+def predict_result(task_id):
+    """Endpoint for result of the asynchronous prediction, result is removed once it is fetched.
+
+    Parameters
+    ----------
+    task_id : string
+        id of the task
+
+    Returns
+    -------
+    bytes
+        prediction in the format chosen by the Accept header, or status of the task if it has not ended yet
+    """
+
+    # get the result
+    task = models.predict_task.AsyncResult(task_id)
+
+    if task.state != 'SUCCESS':
+        return predict_status(task_id)
+
+    result = models.pop_prediction_result(task_id)
+    if result is None:
+        return {'state': task.state, 'status': 'RESULT ALREADY FETCHED'}
+
+    result_format = requested_format()
+
+    return Response(formats.convert(result, 'csv', result_format, header=False),
+                    mimetype=formats.MEDIA_TYPES[result_format])
+
+
 @bp.route('/<model>/info', methods=('GET',))
 def model_info(model):
     """Endpoint for metadata of the model
@@ -398,7 +671,15 @@ def model_info(model):
     aliases = pd.DataFrame(info['aliases'], columns=['name', 'description', 'timestamp', 'owner']).to_dict()
 
     # constructing field with audits metadata
-    audits_info = pd.DataFrame(audits, columns=['dataset_id', 'measure', 'value', 'user']).to_dict()
+    audits_info = pd.DataFrame(audits, columns=['dataset_id', 'measure', 'value', 'user', 'ci_lower', 'ci_upper',
+                                                'confidence'])
+    # audits without confidence interval have null bounds
+    audits_info = audits_info.astype(object).where(audits_info.notnull(), None).to_dict()
+
+    # constructing field with audits of the slices
+    slices_info = pd.DataFrame(info['slices'], columns=['dataset_id', 'group', 'slice', 'rows', 'measure', 'value',
+                                                        'user', 'ci_lower', 'ci_upper', 'confidence'])
+    slices_info = slices_info.astype(object).where(slices_info.notnull(), None).to_dict()
 
     # combining
     result = {
@@ -406,6 +687,7 @@ def model_info(model):
         'data': data_info,
         'columns': columns_info,
         'audits': audits_info,
+        'slices': slices_info,
         'aliases': aliases
     }
 
@@ -480,6 +762,32 @@ def search():
     return {'models': result}
 
 
+def audit_interval(info):
+    """Reads the number of bootstrap replicates and the confidence level of the audit request.
+
+    Parameters
+    ----------
+    info : dict
+        fields of the form, 'bootstrap' and 'confidence' are optional
+
+    Returns
+    -------
+    tuple
+        number of replicates and confidence level, None if they are not valid
+    """
+
+    try:
+        replicates = int(info.get('bootstrap', '0'))
+        confidence = float(info.get('confidence', '0.95'))
+    except ValueError:
+        return None
+
+    if not 0 <= replicates <= models.MAX_BOOTSTRAP or not 0 < confidence < 1:
+        return None
+
+    return replicates, confidence
+
+
 @bp.route('/audit', methods=('GET', 'POST'))
 def audit():
     """Endpoint for auditing the model
@@ -489,7 +797,8 @@ def audit():
     model_name : string
         name of the model in the weles base to make an audit of
     measure : string
-        name of the measure used on model, must be one of supported
+        name of the measure used on model, must be one of supported: acc, mae, mse, r2, precision, recall, f1,
+        many measures separated with commas are computed from one prediction of the model
     user : string
         your user name
     password : string
@@ -506,24 +815,35 @@ def audit():
         '0', if hash is provided, '1' otherwise
     hash : string, optional
         hash of already uploaded dataset
+    bootstrap : string, optional
+        number of bootstrap replicates of the confidence interval of the result, the prediction of the model is
+        reweighted instead of made again, '0' computes no interval (default)
+    confidence : string, optional
+        confidence level of the interval (default '0.95')
+    group : string, optional
+        name of the column of the dataset whose values slice it, measures are computed also for every slice from
+        the same prediction of the model
 
     Returns
     -------
-    string/float
-        return the result of the audit or information if something went wrong
+    string/float/dict
+        return the result of the audit or information if something went wrong, for many measures results and
+        flags if audits existed are given for every measure, with bootstrap also lower and upper bound of the
+        interval under 'interval', with group number of rows, results and intervals of every slice under 'slices'
+        for the measures which were not audited on the slices yet
     """
 
-    # date in timestamp to use for the names of temporary files
-    date = str(datetime.now().timestamp())
-
     info = dict(request.form)
 
     model_name = info['model_name']
-    measure = info['measure']
+    # repeated measures are audited once
+    measures = list(dict.fromkeys(measure.strip() for measure in info['measure'].split(',')))
     user_name = info['user']
     password = info['password']
     is_hash = info['is_hash']
     target = info['target']
+    interval = audit_interval(info)
+    group = info.get('group') or None
 
     # checking the user
     response = user.login(user_name, password)
@@ -531,6 +851,18 @@ def audit():
     if response == False:
         return 'Wrong user or wrong password'
 
+    unknown = [measure for measure in measures if measure not in models.MEASURES]
+    if unknown:
+        return {'error': 'Unknown measures: ' + ', '.join(unknown)}, 400
+
+    if interval is None:
+        return {'error': 'bootstrap must be an integer between 0 and ' + str(models.MAX_BOOTSTRAP) +
+                         ' and confidence must be a number between 0 and 1'}, 400
+    replicates, confidence = interval
+
+    if group == target:
+        return {'error': 'group must not be the target column'}, 400
+
     if is_hash == '1':
         # case when hash was provided
         data = info['hash']
@@ -546,22 +878,134 @@ def audit():
         data_desc = None
 
     # making an audit
-    check, hash, exists, alias = models.audit(model_name, data, is_hash, target, data_name, data_desc, measure,
-                                              user_name, date)
+    check, hash, exists, alias, result, slices = models.audit(model_name, data, is_hash, target, data_name,
+                                                              data_desc, measures, user_name, replicates, confidence,
+                                                              group)
 
     print(check, hash, exists, alias)
 
-    if check:
-        # case when making an audit was successful
-        result = float(pd.read_csv("flaskr/tmp/" + date + ".txt", header=None).iloc[0, 0])
+    if result:
+        # case when making an audit was successful, all measures are inserted at once
+        database.insert_audits(model_name, hash, result, user_name, confidence)
+
+    if any(slice_audit['measures'] for slice_audit in slices.values()):
+        # all slices are inserted at once
+        database.insert_slice_audits(model_name, hash, group, slices, user_name, confidence)
+
+    # measures of audits which already existed get False
+    existed = {measure: not check[measure] for measure in measures}
+    interval = {measure: result[measure][1:] if measure in result else False for measure in measures}
+    result = {measure: result[measure][0] if measure in result else False for measure in measures}
+
+    if len(measures) == 1:
+        existed, result, interval = existed[measures[0]], result[measures[0]], interval[measures[0]]
+
+    response = {'audit_existed': existed, 'result': result, 'hash': hash, 'dataset_existed': exists, 'alias': alias}
+    if replicates > 0:
+        response['interval'] = interval
+
+    if group is not None:
+        response['slices'] = {}
+        for value, slice_audit in slices.items():
+            response['slices'][value] = {'rows': slice_audit['rows'],
+                                         'result': {measure: values[0]
+                                                    for measure, values in slice_audit['measures'].items()}}
+            if replicates > 0:
+                response['slices'][value]['interval'] = {measure: values[1:] for measure, values in
+                                                         slice_audit['measures'].items()}
+
+    return response
+
+
+@bp.route('/audit/batch', methods=('POST',))
+def audit_batch():
+    """Endpoint starting audits of many models on many uploaded datasets as an asynchronous task
+
+    Parameters
+    ----------
+    model_names : string
+        names of the models in the weles separated with commas
+    hashes : string
+        hashes of already uploaded datasets separated with commas
+    measure : string
+        names of the measures separated with commas, see the audit endpoint
+    user : string
+        your user name
+    password : string
+        your password
+    target : string, optional
+        name of the target column in all datasets, target of every model is used if it is not given
+    bootstrap : string, optional
+        number of bootstrap replicates of the confidence intervals, see the audit endpoint
+    confidence : string, optional
+        confidence level of the intervals (default '0.95')
+
+    Returns
+    -------
+    dict
+        id of the task, its progress is available at /models/audit/status/<task_id>
+    """
+
+    info = dict(request.form)
+
+    model_names = [name.strip() for name in info['model_names'].split(',')]
+    hashes = [hash.strip() for hash in info['hashes'].split(',')]
+    measures = list(dict.fromkeys(measure.strip() for measure in info['measure'].split(',')))
+    user_name = info['user']
+    password = info['password']
+    target = info.get('target') or None
+    interval = audit_interval(info)
+
+    # checking the user
+    response = user.login(user_name, password)
 
-        database.insert_audit(model_name, hash, measure, result, user_name)
-        os.remove("flaskr/tmp/" + date + ".txt")
+    if response == False:
+        return 'Wrong user or wrong password'
+
+    unknown = [measure for measure in measures if measure not in models.MEASURES]
+    if unknown:
+        return {'error': 'Unknown measures: ' + ', '.join(unknown)}, 400
+
+    if interval is None:
+        return {'error': 'bootstrap must be an integer between 0 and ' + str(models.MAX_BOOTSTRAP) +
+                         ' and confidence must be a number between 0 and 1'}, 400
+    replicates, confidence = interval
+
+    return models.audit_batch(model_names, hashes, measures, target, user_name, replicates, confidence)
+
+
+@bp.route('/audit/status/<task_id>', methods=('GET',))
+def audit_status(task_id):
+    """Endpoint for status of the batch audit
+
+    Parameters
+    ----------
+    task_id : string
+        id of the task
+
+    Returns
+    -------
+    dict
+        state of the task, numbers of audited, skipped, failed and all pairs of model and dataset, results of the
+        audits (value, lower and upper bound of the interval of every measure) and failed pairs when the task has
+        ended
+    """
+
+    # get the result
+    task = models.audit_batch_task.AsyncResult(task_id)
+
+    if task.state == 'PENDING':
+        # case when task has not started yet
+        response = {'state': task.state, 'current': 0, 'total': 1, 'status': 'PENDING'}
+    elif task.state == 'AUDITING':
+        response = dict(task.info, state=task.state)
+    elif task.state == 'SUCCESS':
+        response = dict(task.info, state=task.state, status=task.state)
     else:
-        # case when such audit already existed
-        result = False
+        # failure of the task
+        response = {'state': task.state, 'status': 'AUDIT FAILED'}
 
-    return {'audit_existed': not check, 'result': result, 'hash': hash, 'dataset_existed': exists, 'alias': alias}
+    return response
 
 
 @bp.route('/<model>/requirements', methods=("GET",))
@@ -1,15 +1,16 @@
 #! /usr/bin/python3
 
-import subprocess
 from flaskr.requirement import requirement
 import os
 from flaskr.database import database
 from flaskr.environment import environment
-from flaskr.data import data
+from flaskr.data import data, formats
+from flaskr.workers import limits, worker, worker_r
 import hashlib
+import json
 
 
-def predict(model, language_version, date, type, is_hash, hash, target):
+def predict(model, language_version, dataset, type, is_hash, hash, target, format='csv', result_format='csv'):
     """Make a prediction with R model in the base
 
     Parameters
@@ -18,8 +19,8 @@ def predict(model, language_version, date, type, is_hash, hash, target):
         model in binary (RDS) wrapped in FileStorage
     language_version : str
         version of the language
-    date : str
-        timestamp
+    dataset : bytes
+        dataset in the given format, None if hash was provided
     type : str
         type of the prediction
     is_hash : bool
@@ -28,33 +29,126 @@ def predict(model, language_version, date, type, is_hash, hash, target):
         hash of the dataset
     target : str
         name of the target column
+    format : str
+        format of the dataset, eg. 'csv' or 'arrow'
+    result_format : str
+        requested format of the prediction
 
     Returns
     -------
+    bytes
+        prediction in the requested format
     """
     # creating hash of requirements
     with open("flaskr/V/Models/" + model + "/requirements.txt", 'rb') as fd:
         m = requirement.create_hash_of_requirements(fd.read(), 'r', language_version)
     print(m.hexdigest())
-    # running script "PREDICT.py" in the virtual environment
+
+    if worker.WORKERS_PER_ENVIRONMENT > 0:
+        # running prediction in the resident worker of the environment
+        return worker_r.predict(m.hexdigest(), language_version, model, dataset, type, is_hash, hash, target,
+                                format, result_format)
+
+    # running script "PREDICT.r" in the virtual environment
     if is_hash == 1:
-        x = subprocess.run(
-            'cd flaskr/VENV/r/ENV-' + m.hexdigest() + '; ../../../interpreters/r/R-' + language_version + '/bin/Rscript ../../../additional_scripts/PREDICT.r ' + model + ' ' + date + ' ' + type + ' ' + str(
-                is_hash) + ' ' + hash + ' ' + target, stdout=subprocess.PIPE, shell=True)
+        result = run_script(m.hexdigest(), language_version, 'PREDICT.r', [model, type, str(is_hash), hash, target])
     else:
-        x = subprocess.run(
-            'cd flaskr/VENV/r/ENV-' + m.hexdigest() + '; ../../../interpreters/r/R-' + language_version + '/bin/Rscript ../../../additional_scripts/PREDICT.r ' + model + ' ' + date + ' ' + type + ' ' + str(
-                is_hash), stdout=subprocess.PIPE, shell=True)
+        # case when dataset was sent in the request, it is passed on stdin in csv format
+        result = run_script(m.hexdigest(), language_version, 'PREDICT.r', [model, type, str(is_hash)],
+                            formats.convert(dataset, format, 'csv'))
+
+    # script answers in csv format
+    return formats.convert(result, 'csv', result_format, header=False)
+
+
+def predict_stream(model, language_version, type, hash, target, chunk_rows):
+    """Predicts stored dataset for streaming, R models predict the whole dataset at once.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    language_version : str
+        version of the language
+    type : str
+        type of the prediction
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    chunk_rows : int
+        ignored
+
+    Yields
+    ------
+    bytes
+        prediction in csv format
+    """
+
+    yield predict(model, language_version, None, type, 1, hash, target)
+
+
+# hashes of the environments of the models, requirements do not change once the model is uploaded
+environment_hashes = {}
+
+
+def environment_hash(model, language_version):
+    """Returns hash of the environment the model runs in.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    language_version : str
+        version of the language
+
+    Returns
+    -------
+    str
+        hash of the model's requirements
+    """
+
+    if model not in environment_hashes:
+        # creating hash of requirements
+        with open("flaskr/V/Models/" + model + "/requirements.txt", 'rb') as fd:
+            environment_hashes[model] = requirement.create_hash_of_requirements(fd.read(), 'r',
+                                                                                language_version).hexdigest()
+    return environment_hashes[model]
+
+
+def run_script(environment_hash, language_version, script, args, input=b''):
+    """Runs one of the additional scripts in the virtual environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    language_version : str
+        version of the R interpreter
+    script : str
+        name of the script in additional_scripts
+    args : list
+        command line arguments of the script
+    input : bytes
+        standard input of the script
+
+    Returns
+    -------
+    bytes
+        standard output of the script
+    """
+
+    # running with timeout and resource limits of the operation of the script
+    return limits.run(
+        ['../../../interpreters/r/R-' + language_version + '/bin/Rscript', '../../../additional_scripts/' + script] + args,
+        limits.SCRIPT_OPERATIONS.get(script.split('.')[0]), input, cwd='flaskr/VENV/r/ENV-' + environment_hash)
 
 
 def print_model(model, language_version):
     # create hash of requirements
     with open("flaskr/V/Models/" + model + "/requirements.txt", 'rb') as fd:
         m = requirement.create_hash_of_requirements(fd.read(), 'r', language_version)
-    x = subprocess.run(
-        'cd flaskr/VENV/r/ENV-' + m.hexdigest() + '; ../../../interpreters/r/R-' + language_version + '/bin/Rscript ../../../additional_scripts/PRINTMODEL.r ' + model,
-        stdout=subprocess.PIPE, shell=True)
-    return x.stdout
+    return run_script(m.hexdigest(), language_version, 'PRINTMODEL.r', [model])
 
 
 def post_model(model, model_name, requirements, sessionInfo, **kwargs):
@@ -107,11 +201,8 @@ def post_model(model, model_name, requirements, sessionInfo, **kwargs):
     return n, model_exists
 
 
-def audit(model_name, dataset, is_hash, target, data_name, data_desc, measure, user, language_version, date):
-    # creating hash of requirements
-    with open("flaskr/V/Models/" + model_name + "/requirements.txt", 'rb') as fd:
-        m = requirement.create_hash_of_requirements(fd.read(), 'r', language_version)
-
+def audit(model_name, dataset, is_hash, target, data_name, data_desc, measures, user, language_version,
+          chunk_rows=0, replicates=0, confidence=0.95, group=None, drop_group=False):
     if is_hash == '0':
         is_hash = False
     else:
@@ -119,11 +210,39 @@ def audit(model_name, dataset, is_hash, target, data_name, data_desc, measure, u
 
     hash, exists, alias = data.save_data(dataset, data_name, data_desc, user, is_hash)
 
-    check = database.check_audit(model_name, hash, measure)
+    existing = database.existing_audits(model_name, hash, measures)
+    check = {measure: measure not in existing for measure in measures}
+
+    # measures not audited on the slices yet
+    sliced = []
+    if group is not None:
+        existing = database.existing_slice_audits(model_name, hash, group, measures)
+        sliced = [measure for measure in measures if measure not in existing]
+
+    result, slices = {}, {}
+    missing = [measure for measure in measures if check[measure] or measure in sliced]
+    if missing:
+        # all measures which have not existed yet are computed from one prediction
+        result, slices = run_audit(model_name, hash, target, missing, language_version, chunk_rows, replicates,
+                                   confidence, group if sliced else None, drop_group)
+        result = {measure: values for measure, values in result.items() if check[measure]}
+        for slice_audit in slices.values():
+            slice_audit['measures'] = {measure: values for measure, values in slice_audit['measures'].items()
+                                       if measure in sliced}
+
+    return check, hash, exists, alias, result, slices
+
+
+def run_audit(model_name, hash, target, measures, language_version, chunk_rows=0, replicates=0, confidence=0.95,
+              group=None, drop_group=False):
+    """Computes the measures of the model on the uploaded dataset from one prediction, see model_python.run_audit,
+    R models predict the whole dataset at once, chunk_rows is ignored
+    """
 
-    if check:
-        x = subprocess.run(
-            'cd flaskr/VENV/r/ENV-' + m.hexdigest() + '; ../../../interpreters/r/R-' + language_version + '/bin/Rscript ../../../additional_scripts/AUDIT.r ' + model_name + ' ' + hash + ' ' + target + ' ' + measure + ' ' + str(
-                date), stdout=subprocess.PIPE, shell=True)
+    result = json.loads(run_script(environment_hash(model_name, language_version), language_version, 'AUDIT.r',
+                                   [model_name, hash, target, ','.join(measures), str(chunk_rows), str(replicates),
+                                    str(confidence), group or '', '1' if drop_group else '0']))
 
-    return check, hash, exists, alias
+    if group is None:
+        return result, {}
+    return result['measures'], result['slices']
@@ -0,0 +1,165 @@
+import contextlib
+import os
+import threading
+import time
+
+from .latency import Latency
+
+# maximal number of executions (predictions, audits, printing and explaining models) running at once, 0 means no limit
+MAX_CONCURRENT = int(os.environ.get('WELES_MAX_CONCURRENT', str(os.cpu_count() or 1)))
+
+# maximal number of executions of one model running at once, 0 means no limit
+MAX_CONCURRENT_PER_MODEL = int(os.environ.get('WELES_MAX_CONCURRENT_PER_MODEL', '0'))
+
+# maximal number of executions waiting for a free slot, others are rejected at once
+MAX_QUEUE = int(os.environ.get('WELES_MAX_QUEUE', '64'))
+
+# maximal time in seconds an execution waits in the queue before it is rejected
+MAX_QUEUE_WAIT = float(os.environ.get('WELES_MAX_QUEUE_WAIT', '30'))
+
+# seconds after which rejected clients are asked to retry
+RETRY_AFTER = int(os.environ.get('WELES_RETRY_AFTER', '1'))
+
+
+class Overloaded(Exception):
+    """Raised when execution can not be admitted, server answers with 503."""
+
+    def __init__(self, message, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+condition = threading.Condition()
+running = 0
+running_per_model = {}
+waiting = 0
+
+# counters of the admission
+counters = {'admitted': 0, 'rejected': 0}
+
+# time spent in the queue by admitted executions
+waits = Latency()
+
+
+def can_run(model):
+    if MAX_CONCURRENT > 0 and running >= MAX_CONCURRENT:
+        return False
+    if model is not None and MAX_CONCURRENT_PER_MODEL > 0 and \
+            running_per_model.get(model, 0) >= MAX_CONCURRENT_PER_MODEL:
+        return False
+    return True
+
+
+def acquire(model=None):
+    """Waits for a free slot for the execution, raises Overloaded if the queue is full or wait is too long.
+
+    Parameters
+    ----------
+    model : str, optional
+        name of the executed model, None if the execution is not limited per model
+    """
+
+    global running, waiting
+
+    start = time.perf_counter()
+    with condition:
+        if not can_run(model):
+            if waiting >= MAX_QUEUE:
+                counters['rejected'] += 1
+                raise Overloaded('too many requests are waiting')
+
+            waiting += 1
+            try:
+                admitted = condition.wait_for(lambda: can_run(model), MAX_QUEUE_WAIT)
+            finally:
+                waiting -= 1
+
+            if not admitted:
+                counters['rejected'] += 1
+                raise Overloaded('request waited too long')
+
+        running += 1
+        if model is not None:
+            running_per_model[model] = running_per_model.get(model, 0) + 1
+        counters['admitted'] += 1
+
+    waits.record(time.perf_counter() - start)
+
+
+def release(model=None):
+    """Frees the slot taken by acquire.
+
+    Parameters
+    ----------
+    model : str, optional
+        name of the executed model, the same as given to acquire
+    """
+
+    global running
+
+    with condition:
+        running -= 1
+        if model is not None:
+            running_per_model[model] -= 1
+            if running_per_model[model] == 0:
+                del running_per_model[model]
+        condition.notify_all()
+
+
+@contextlib.contextmanager
+def admitted(model=None):
+    # execution holds the slot while in the block
+    acquire(model)
+    try:
+        yield
+    finally:
+        release(model)
+
+
+class AdmittedIterator:
+    """Iterator holding the slot of the execution until it is closed, for responses streamed after the view returns.
+
+    Parameters
+    ----------
+    iterator : iterator
+        streamed chunks
+    model : str, optional
+        name of the executed model, the slot has to be already acquired for it
+    """
+
+    def __init__(self, iterator, model=None):
+        self.iterator = iterator
+        self.model = model
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.iterator)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if hasattr(self.iterator, 'close'):
+                self.iterator.close()
+            release(self.model)
+
+
+def stats():
+    """Returns state of the admission.
+
+    Returns
+    -------
+    dict
+        running and waiting executions, limits, number of admitted and rejected ones and time spent in the queue
+    """
+
+    with condition:
+        result = {'running': running, 'waiting': waiting, 'running_per_model': dict(running_per_model),
+                  'max_concurrent': MAX_CONCURRENT, 'max_concurrent_per_model': MAX_CONCURRENT_PER_MODEL,
+                  'max_queue': MAX_QUEUE}
+        result.update(counters)
+
+    result['wait'] = waits.stats()
+    return result
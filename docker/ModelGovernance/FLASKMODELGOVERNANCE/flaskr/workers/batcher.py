@@ -0,0 +1,159 @@
+import os
+import threading
+
+import pandas as pd
+
+from flaskr.data import formats
+
+# time in milliseconds the first request waits for others to join its batch, 0 turns batching off
+BATCH_WAIT_MS = float(os.environ.get('WELES_BATCH_WAIT_MS', '0'))
+
+# batch is sent to the model as soon as it has that many rows
+BATCH_MAX_ROWS = int(os.environ.get('WELES_BATCH_MAX_ROWS', '10000'))
+
+
+class Batch:
+    """Requests predicted together in one call of the model.
+
+    Parameters
+    ----------
+    key : tuple
+        identifier of requests which can be merged
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.frames = []
+        self.rows = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# batches waiting for more requests, keyed by model, type of the prediction and columns of the data
+pending = {}
+pending_lock = threading.Lock()
+
+# counters of the batcher
+counters = {'requests': 0, 'batches': 0, 'rows': 0}
+
+
+def join(key, frame):
+    """Adds data to the open batch of the key, opens a new one if there is none or it would grow too large.
+
+    Parameters
+    ----------
+    key : tuple
+        identifier of requests which can be merged
+    frame : pandas.DataFrame
+        data of the request
+
+    Returns
+    -------
+    Batch
+        batch the data was added to
+    int
+        position of the first row of the data in the batch
+    bool
+        True if the request opened the batch and has to run it
+    """
+
+    with pending_lock:
+        batch = pending.get(key)
+        leader = False
+
+        if batch is not None and batch.rows + len(frame) > BATCH_MAX_ROWS:
+            # batch would be too large, it is sent without waiting any longer
+            batch.full.set()
+            del pending[key]
+            batch = None
+
+        if batch is None:
+            batch = Batch(key)
+            pending[key] = batch
+            leader = True
+
+        start = batch.rows
+        batch.frames.append(frame)
+        batch.rows += len(frame)
+        counters['requests'] += 1
+
+        if batch.rows >= BATCH_MAX_ROWS:
+            batch.full.set()
+            del pending[key]
+
+    return batch, start, leader
+
+
+def predict(model, type, data, format, result_format, run):
+    """Makes a prediction together with concurrent requests for the same model and type.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+    type : str
+        type of the prediction
+    data : bytes
+        data in the given format
+    format : str
+        format of the data
+    result_format : str
+        requested format of the prediction
+    run : function
+        makes the prediction of the whole batch, gets the data and its format, returns prediction in csv format
+
+    Returns
+    -------
+    bytes
+        prediction of the rows of this request in the requested format
+    """
+
+    frame = formats.read_frame(data, format)
+    batch, start, leader = join((model, type, tuple(frame.columns)), frame)
+
+    if leader:
+        # waiting for other requests to join
+        batch.full.wait(BATCH_WAIT_MS / 1000)
+        with pending_lock:
+            if pending.get(batch.key) is batch:
+                del pending[batch.key]
+            counters['batches'] += 1
+            counters['rows'] += batch.rows
+
+        # arrow keeps the types of the columns, csv is used when it is not available
+        batch_format = 'arrow' if 'arrow' in formats.supported() else 'csv'
+        try:
+            result = run(formats.write_frame(pd.concat(batch.frames, ignore_index=True), batch_format),
+                         batch_format)
+            # lines are split as they were written by the model, so that every request gets the same text as it
+            # would get without batching
+            batch.result = [line if line.endswith(b'\n') else line + b'\n' for line in result.splitlines(keepends=True)]
+            if len(batch.result) != batch.rows:
+                raise ValueError('prediction has ' + str(len(batch.result)) + ' rows, ' + str(batch.rows) +
+                                 ' were sent')
+        except Exception as error:
+            batch.error = error
+        batch.done.set()
+    else:
+        batch.done.wait()
+
+    if batch.error is not None:
+        raise batch.error
+
+    # splitting the prediction back
+    return formats.convert(b''.join(batch.result[start:start + len(frame)]), 'csv', result_format, header=False)
+
+
+def stats():
+    """Returns counters of the batcher.
+
+    Returns
+    -------
+    dict
+        number of merged requests, batches sent to the models and their rows
+    """
+
+    with pending_lock:
+        return dict(counters)
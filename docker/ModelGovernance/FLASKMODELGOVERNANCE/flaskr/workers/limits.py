@@ -0,0 +1,283 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from . import scheduler
+
+try:
+    import resource
+except ImportError:
+    # resource limits are available only on unix
+    resource = None
+
+# wall-clock timeouts of the operations in seconds, 0 means no timeout
+TIMEOUTS = {
+    'predict': float(os.environ.get('WELES_TIMEOUT_PREDICT', '300')),
+    'audit': float(os.environ.get('WELES_TIMEOUT_AUDIT', '3600')),
+    'print': float(os.environ.get('WELES_TIMEOUT_PRINT', '60')),
+    'explain': float(os.environ.get('WELES_TIMEOUT_EXPLAIN', '600'))
+}
+
+# address space limit of every model process in megabytes, 0 means no limit
+MEMORY_LIMIT_MB = int(os.environ.get('WELES_MEMORY_LIMIT_MB', '0'))
+
+# CPU time limit of one-shot model processes in seconds, 0 means no limit
+CPU_LIMIT = int(os.environ.get('WELES_CPU_LIMIT', '0'))
+
+# operations of the scripts run in the environments
+SCRIPT_OPERATIONS = {'PREDICT': 'predict', 'AUDIT': 'audit', 'PRINTMODEL': 'print', 'EXTRACT': 'print'}
+
+
+class LimitExceeded(Exception):
+    """Base of the errors of model processes stopped by the server."""
+
+
+class ExecutionTimeout(LimitExceeded):
+    """Raised when model process did not finish within the timeout of the operation and was killed."""
+
+
+class MemoryLimitExceeded(LimitExceeded):
+    """Raised when model process ran out of its memory limit."""
+
+
+class ProcessFailed(Exception):
+    """Raised when model process exited with an error, its output is not a result."""
+
+
+# kinds of stopped or failed processes
+KINDS = ('timeouts', 'memory', 'cancelled', 'failed')
+
+# counters of stopped processes for each operation
+counters = {operation: dict.fromkeys(KINDS, 0) for operation in TIMEOUTS}
+counters_lock = threading.Lock()
+
+
+def count(operation, kind):
+    with counters_lock:
+        counters.setdefault(operation, dict.fromkeys(KINDS, 0))[kind] += 1
+
+
+def check_exit(operation, returncode, stderr=b''):
+    """Raises error when model process did not exit cleanly.
+
+    Parameters
+    ----------
+    operation : str
+        name of the operation, eg. 'predict'
+    returncode : int
+        exit status of the process, negative for signals
+    stderr : bytes
+        error output of the process, if it was captured
+    """
+
+    if returncode == -signal.SIGXCPU or (returncode == -signal.SIGKILL and CPU_LIMIT > 0):
+        count(operation, 'timeouts')
+        raise ExecutionTimeout(operation + ' used more than ' + str(CPU_LIMIT) + ' seconds of CPU time')
+
+    if returncode != 0 and is_memory_error(stderr):
+        count(operation, 'memory')
+        raise MemoryLimitExceeded(operation + ' exceeded memory limit of ' + str(MEMORY_LIMIT_MB) + ' MB')
+
+    if returncode != 0:
+        count(operation, 'failed')
+        # last lines of the error output are usually the traceback of the model
+        message = stderr.decode('utf-8', 'replace').strip().splitlines()[-5:]
+        raise ProcessFailed(operation + ' exited with status ' + str(returncode) +
+                            (': ' + '\n'.join(message) if message else ''))
+
+
+def operation_of(header):
+    """Returns operation of the job sent to the resident worker or zygote.
+
+    Parameters
+    ----------
+    header : dict
+        header of the job
+
+    Returns
+    -------
+    str
+        name of the operation, None for service jobs
+    """
+
+    op = header.get('op')
+    if op == 'run':
+        return SCRIPT_OPERATIONS.get(header['script'].rsplit('.', 1)[0])
+    if op is not None and op.startswith('predict'):
+        return 'predict'
+    return None
+
+
+def timeout_of(operation):
+    # None means no timeout
+    return TIMEOUTS.get(operation) or None
+
+
+def is_memory_error(text):
+    # Python and R report failed allocations differently
+    return b'MemoryError' in text or b'cannot allocate' in text or b'std::bad_alloc' in text
+
+
+def set_limits(cpu=True):
+    # runs in the child process before the interpreter starts
+    if resource is None:
+        return
+    if MEMORY_LIMIT_MB > 0:
+        limit = MEMORY_LIMIT_MB * 2 ** 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu and CPU_LIMIT > 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (CPU_LIMIT, CPU_LIMIT + 5))
+
+
+def preexec(job=None, cpu=True):
+    """Function run in the child process before exec, applies resource limits and affinity of the job.
+
+    Parameters
+    ----------
+    job : Job, optional
+        budget of the job
+    cpu : bool
+        if CPU time limit should be applied, long-lived processes accumulate CPU time of all jobs
+
+    Returns
+    -------
+    function
+        function passed as preexec_fn
+    """
+
+    pin = scheduler.preexec(job) if job is not None else None
+
+    def apply():
+        set_limits(cpu)
+        if pin is not None:
+            pin()
+
+    return apply
+
+
+def header(operation):
+    """Fields of the job sent to the zygote, its forked children apply the limits to themselves.
+
+    Parameters
+    ----------
+    operation : str
+        name of the operation
+
+    Returns
+    -------
+    dict
+        'timeout', 'memory_limit' and 'cpu_limit' fields, None if the limit is off
+    """
+
+    return {'timeout': timeout_of(operation), 'memory_limit': MEMORY_LIMIT_MB or None, 'cpu_limit': CPU_LIMIT or None}
+
+
+def kill_group(pid):
+    # processes run in their own sessions, so the whole group including children of the model is killed
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Watchdog:
+    """Kills process group when it does not report progress within the timeout.
+
+    Parameters
+    ----------
+    pid : int
+        id of the leader of the process group
+    timeout : float
+        seconds, None disables the watchdog
+    """
+
+    def __init__(self, pid, timeout):
+        self.pid = pid
+        self.timeout = timeout
+        self.timer = None
+        self.fired = False
+
+    def fire(self):
+        self.fired = True
+        kill_group(self.pid)
+
+    def reset(self):
+        self.cancel()
+        if self.timeout is not None:
+            self.timer = threading.Timer(self.timeout, self.fire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+def run(command, operation, input=b'', cwd=None):
+    """Runs one-shot model process with timeout and resource limits of the operation.
+
+    Parameters
+    ----------
+    command : list
+        command starting the process
+    operation : str
+        name of the operation, eg. 'predict'
+    input : bytes
+        standard input of the process
+    cwd : str, optional
+        working directory of the process
+
+    Returns
+    -------
+    bytes
+        standard output of the process
+
+    Raises
+    ------
+    ProcessFailed
+        when the process exited with non-zero status
+    """
+
+    # thread pools of the process are sized to its share of the cores
+    with scheduler.job() as job:
+        process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=scheduler.environ(job), preexec_fn=preexec(job),
+                                   start_new_session=True)
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout_of(operation))
+        except subprocess.TimeoutExpired:
+            kill_group(process.pid)
+            process.communicate()
+            count(operation, 'timeouts')
+            raise ExecutionTimeout(operation + ' did not finish in ' + str(timeout_of(operation)) + ' seconds')
+        except BaseException:
+            # leader is not reaped yet, so the id of the group can not belong to another one
+            kill_group(process.pid)
+            process.wait()
+            raise
+
+    # output of the model is passed to the log of the server
+    sys.stderr.buffer.write(stderr)
+    sys.stderr.flush()
+
+    # output of a failed process is not returned, it may be empty or cut
+    check_exit(operation, process.returncode, stderr)
+
+    return stdout
+
+
+def stats():
+    """Returns limits and counters of stopped processes.
+
+    Returns
+    -------
+    dict
+        timeouts, memory limit and counters for each operation
+    """
+
+    with counters_lock:
+        return {'timeouts': dict(TIMEOUTS), 'memory_limit_mb': MEMORY_LIMIT_MB, 'cpu_limit': CPU_LIMIT,
+                'stopped': {operation: dict(c) for operation, c in counters.items()}}
@@ -0,0 +1,345 @@
+import atexit
+import json
+import os
+import queue
+import subprocess
+import threading
+
+from flaskr.additional_scripts import protocol
+from flaskr.data import formats
+from flaskr.database import database
+from . import limits, scheduler
+
+# number of resident workers kept for each environment, 0 turns resident workers off
+WORKERS_PER_ENVIRONMENT = int(os.environ.get('WELES_WORKERS_PER_ENVIRONMENT', '1'))
+
+
+class WorkerError(Exception):
+    """Raised when worker failed to run the job or died."""
+
+
+class Worker:
+    """Long-lived process running jobs sent over its stdin and stdout.
+
+    Parameters
+    ----------
+    command : list or str
+        command starting the worker
+    cwd : str, optional
+        working directory of the worker
+    env : dict, optional
+        environment of the worker
+    """
+
+    def __init__(self, command, cwd=None, env=None):
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.process = None
+        self.info = None
+        self.formats = ['csv']
+        # counters of the model cache reported with the last response
+        self.cache = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, cwd=self.cwd, env=self.env, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, shell=isinstance(self.command, str),
+                                        # worker runs many jobs, so only its memory is limited
+                                        preexec_fn=limits.preexec(cpu=False), start_new_session=True)
+
+        # worker announces that it is ready to take jobs
+        self.info, _ = protocol.read_message(self.process.stdout)
+        if self.info is None or self.info.get('status') != 'ready':
+            self.stop()
+            raise WorkerError('worker ' + str(self.command) + ' failed to start')
+
+        # formats of the data understood by the worker, older workers know only csv
+        self.formats = self.info.get('formats', 'csv').split(',')
+        self.record(self.info)
+
+    def record(self, response):
+        # workers report counters of their model cache with every response
+        if 'cache' in response:
+            self.cache = json.loads(response['cache'])
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, header, payload=b''):
+        """Sends the job and waits for the response.
+
+        Parameters
+        ----------
+        header : dict
+            header of the job
+        payload : bytes
+            body of the job
+
+        Returns
+        -------
+        dict
+            header of the response
+        bytes
+            body of the response
+        """
+
+        if not self.alive():
+            self.start()
+
+        # converting data the worker does not understand
+        header, payload = formats.negotiate(header, payload, self.formats)
+
+        operation = limits.operation_of(header)
+        watchdog = limits.Watchdog(self.process.pid, limits.timeout_of(operation))
+        watchdog.reset()
+        try:
+            protocol.write_message(self.process.stdin, header, payload)
+            response, body = protocol.read_message(self.process.stdout)
+        except (OSError, EOFError) as error:
+            response, body = None, error
+        finally:
+            watchdog.cancel()
+
+        if response is None:
+            self.stop()
+            if watchdog.fired:
+                limits.count(operation, 'timeouts')
+                raise limits.ExecutionTimeout(operation + ' did not finish in ' + str(watchdog.timeout) + ' seconds')
+            raise WorkerError('worker died' if body is None else 'worker died: ' + str(body))
+
+        self.record(response)
+        if response.get('status') == 'error':
+            self.raise_error(operation, body)
+
+        return response, body
+
+    def stream(self, header, payload=b''):
+        """Sends the job and yields the chunks sent back until the worker ends the job.
+
+        Parameters
+        ----------
+        header : dict
+            header of the job
+        payload : bytes
+            body of the job
+
+        Yields
+        ------
+        dict
+            header of the chunk
+        bytes
+            body of the chunk
+        """
+
+        if not self.alive():
+            self.start()
+
+        # converting data the worker does not understand
+        header, payload = formats.negotiate(header, payload, self.formats)
+
+        # timeout applies to every chunk, the whole stream may take long
+        operation = limits.operation_of(header)
+        watchdog = limits.Watchdog(self.process.pid, limits.timeout_of(operation))
+        finished = False
+        died = False
+        try:
+            watchdog.reset()
+            protocol.write_message(self.process.stdin, header, payload)
+            while True:
+                response, body = protocol.read_message(self.process.stdout)
+                watchdog.cancel()
+
+                if response is None:
+                    died = True
+                    break
+                if response.get('status') != 'chunk':
+                    self.record(response)
+                if response.get('status') == 'error':
+                    finished = True
+                    self.raise_error(operation, body)
+                if response.get('status') != 'chunk':
+                    finished = True
+                    return
+
+                yield response, body
+                watchdog.reset()
+        except (OSError, EOFError):
+            died = True
+        finally:
+            watchdog.cancel()
+            if not finished and self.process is not None:
+                # job was abandoned by the reader or worker died, remaining chunks would mix with the next job
+                limits.kill_group(self.process.pid)
+                self.process.wait()
+                self.process = None
+                if not died:
+                    limits.count(operation, 'cancelled')
+
+        if watchdog.fired:
+            limits.count(operation, 'timeouts')
+            raise limits.ExecutionTimeout('chunk of ' + operation + ' was not made in ' + str(watchdog.timeout) +
+                                          ' seconds')
+        raise WorkerError('worker died')
+
+    @staticmethod
+    def raise_error(operation, body):
+        # failed allocations are reported as exceeded memory limit
+        if limits.is_memory_error(body):
+            operation = operation or 'job'
+            limits.count(operation, 'memory')
+            raise limits.MemoryLimitExceeded(operation + ' exceeded memory limit of ' + str(limits.MEMORY_LIMIT_MB) +
+                                             ' MB')
+        raise WorkerError(body.decode('utf-8', 'replace'))
+
+    def stop(self):
+        if self.process is None:
+            return
+
+        # closing stdin ends the loop of the worker
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+class Pool:
+    """Fixed-size set of workers started with the same command.
+
+    Parameters
+    ----------
+    command : list or str
+        command starting the worker
+    cwd : str, optional
+        working directory of the workers
+    size : int
+        maximal number of workers
+    """
+
+    def __init__(self, command, cwd=None, size=1):
+        self.idle = queue.Queue()
+        # thread pools of the workers are sized at startup, jobs are limited further if the worker can do it
+        env = scheduler.environ(scheduler.static_job(size))
+        self.workers = [Worker(command, cwd, env) for _ in range(size)]
+        for w in self.workers:
+            self.idle.put(w)
+
+    def request(self, header, payload=b''):
+        # waiting for free worker
+        w = self.idle.get()
+        try:
+            with scheduler.job() as job:
+                return w.request(dict(header, **scheduler.header(job)), payload)
+        finally:
+            self.idle.put(w)
+
+    def stream(self, header, payload=b''):
+        # worker is kept until the whole stream is read
+        w = self.idle.get()
+        try:
+            with scheduler.job() as job:
+                yield from w.stream(dict(header, **scheduler.header(job)), payload)
+        finally:
+            self.idle.put(w)
+
+    def start(self):
+        # taking all workers, so that none of them is busy
+        taken = [self.idle.get() for _ in self.workers]
+        try:
+            for w in taken:
+                if not w.alive():
+                    w.start()
+        finally:
+            for w in taken:
+                self.idle.put(w)
+
+    def stats(self):
+        """Returns statistics of the model cache of every running worker, as reported with their last responses, so
+        that busy workers are not waited for.
+
+        Returns
+        -------
+        list
+            list of dictionaries with counters of the workers
+        """
+
+        return [w.cache for w in self.workers if w.alive() and w.cache is not None]
+
+    def stop(self):
+        for w in self.workers:
+            w.stop()
+
+
+# pools of the workers, key identifies the environment
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(key, command, cwd=None):
+    """Returns pool for given environment, creates it if does not exist yet.
+
+    Parameters
+    ----------
+    key : str
+        identifier of the environment
+    command : list or str
+        command starting the worker
+    cwd : str, optional
+        working directory of the workers
+
+    Returns
+    -------
+    Pool
+        pool of the workers
+    """
+
+    with pools_lock:
+        if key not in pools:
+            pools[key] = Pool(command, cwd, WORKERS_PER_ENVIRONMENT)
+        return pools[key]
+
+
+def stats():
+    """Returns statistics of the model caches of all pools.
+
+    Returns
+    -------
+    dict
+        statistics of the workers for each pool
+    """
+
+    with pools_lock:
+        items = list(pools.items())
+
+    return {key: pool.stats() for key, pool in items}
+
+
+# hashes of the models, they do not change once the model is uploaded
+model_hashes = {}
+
+
+def get_model_hash(model):
+    """Returns hash of the model, used by workers as the key of their model cache.
+
+    Parameters
+    ----------
+    model : str
+        name of the model
+
+    Returns
+    -------
+    str
+        hash of the model
+    """
+
+    if model not in model_hashes:
+        model_hashes[model] = database.get_model_hash(model)
+    return model_hashes[model]
+
+
+@atexit.register
+def stop_all():
+    with pools_lock:
+        for pool in pools.values():
+            pool.stop()
@@ -0,0 +1,229 @@
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+
+from flaskr.additional_scripts import protocol
+from flaskr.data import formats
+from . import admission, limits, scheduler, worker
+from .worker import WorkerError
+
+# one-shot Python scripts are forked from pre-imported zygote of the environment, '0' runs them as new processes
+USE_ZYGOTE = os.environ.get('WELES_ZYGOTE', '1') == '1'
+
+# predictions are forked from the zygote holding the model, so that children share one copy of it
+SHARE_MODELS = os.environ.get('WELES_SHARE_MODELS', '0') == '1'
+
+
+class Zygote:
+    """Fork server of one Python environment, see ZYGOTE.py.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    """
+
+    def __init__(self, environment_hash):
+        self.environment_hash = environment_hash
+        self.path = "flaskr/tmp/ZYGOTE-" + environment_hash + ".sock"
+        self.process = None
+        self.lock = threading.Lock()
+        self.formats = None
+
+    def start(self):
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                if os.path.exists(self.path):
+                    return
+                # socket of the running zygote was removed, it can not be reached anymore
+                self.process.stdin.close()
+
+            self.process = subprocess.Popen(["flaskr/VENV/python/ENV-" + self.environment_hash + "/bin/python",
+                                             "flaskr/additional_scripts/ZYGOTE.py", self.path],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True,
+                                            # children share the thread pools initialized by the zygote
+                                            env=scheduler.environ(scheduler.static_job(admission.MAX_CONCURRENT)))
+
+            # zygote announces that its socket is listening
+            info, _ = protocol.read_message(self.process.stdout)
+            if info is not None and info.get('status') == 'running':
+                # zygote started by another server process (eg. celery worker) listens on the socket
+                self.process.wait()
+                self.process = None
+                return
+            if info is None or info.get('status') != 'ready':
+                self.process.kill()
+                self.process = None
+                raise WorkerError('zygote of ENV-' + self.environment_hash + ' failed to start')
+
+    def connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.path)
+        except OSError:
+            # zygote is not running yet or died
+            connection.close()
+            self.start()
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(self.path)
+        return connection
+
+    def request(self, header, payload=b''):
+        """Sends the job to the forked child and waits for the response.
+
+        Parameters
+        ----------
+        header : dict
+            header of the job
+        payload : bytes
+            body of the job
+
+        Returns
+        -------
+        dict
+            header of the response
+        bytes
+            body of the response
+        """
+
+        if 'format' in header or 'result_format' in header:
+            # converting data the environment does not understand
+            header, payload = formats.negotiate(header, payload, self.get_formats())
+
+        # child kills itself after the timeout, waiting a bit longer in case it can not
+        operation = limits.operation_of(header)
+        timeout = limits.timeout_of(operation)
+        start = time.monotonic()
+        try:
+            with scheduler.job() as job, self.connect() as connection:
+                connection.settimeout(None if timeout is None else timeout + 5)
+                with connection.makefile('rwb') as stream:
+                    protocol.write_message(stream, dict(header, **scheduler.header(job), **limits.header(operation)),
+                                           payload)
+                    response, body = protocol.read_message(stream)
+        except socket.timeout:
+            response, body = None, None
+
+        if response is None:
+            if timeout is not None and time.monotonic() - start >= timeout:
+                limits.count(operation, 'timeouts')
+                raise limits.ExecutionTimeout(operation + ' did not finish in ' + str(timeout) + ' seconds')
+            raise WorkerError('child of the zygote died')
+
+        if response.get('status') == 'error':
+            worker.Worker.raise_error(operation, body)
+
+        return response, body
+
+    def get_formats(self):
+        # zygote may have been started by another server process, so it is asked for them
+        if self.formats is None:
+            self.formats = self.request({'op': 'ping'})[0].get('formats', 'csv').split(',')
+        return self.formats
+
+    def stop(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process = None
+
+
+# zygotes of the environments
+zygotes = {}
+zygotes_lock = threading.Lock()
+
+
+def get_zygote(environment_hash):
+    with zygotes_lock:
+        if environment_hash not in zygotes:
+            zygotes[environment_hash] = Zygote(environment_hash)
+        return zygotes[environment_hash]
+
+
+def run(environment_hash, script, args, input=b''):
+    """Runs the script from additional_scripts in a child forked from the zygote of the environment.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    script : str
+        name of the script, eg. 'PREDICT.py'
+    args : list
+        command line arguments of the script
+    input : bytes
+        standard input of the script
+
+    Returns
+    -------
+    bytes
+        standard output of the script
+    """
+
+    header = {'op': 'run', 'script': script}
+    for i, arg in enumerate(args):
+        header['arg' + str(i)] = arg
+
+    return get_zygote(environment_hash).request(header, input)[1]
+
+
+def predict(environment_hash, model, data, type, is_hash, hash, target, format='csv', result_format='csv'):
+    """Makes a prediction in a child forked from the zygote, which keeps the model loaded.
+
+    Parameters
+    ----------
+    environment_hash : str
+        hash of the environment's requirements
+    model : str
+        name of the model
+    data : bytes
+        data in the given format, None if hash was provided
+    type : str
+        type of the prediction
+    is_hash : int
+        flag if dataset provided previously was hash
+    hash : str
+        hash of the dataset
+    target : str
+        name of the target column
+    format : str
+        format of the data, eg. 'csv' or 'arrow'
+    result_format : str
+        requested format of the prediction
+
+    Returns
+    -------
+    bytes
+        prediction in the requested format
+    """
+
+    response, body = get_zygote(environment_hash).request({'op': 'predict', 'model': model,
+                                                           'model_hash': worker.get_model_hash(model), 'type': type,
+                                                           'is_hash': is_hash, 'hash': hash, 'target': target,
+                                                           'format': format, 'result_format': result_format},
+                                                          data or b'')
+
+    # environment without the requested format answers in csv
+    return formats.convert(body, response.get('format', 'csv'), result_format, header=False)
+
+
+def stats():
+    """Returns statistics of the models shared by the running zygotes.
+
+    Returns
+    -------
+    dict
+        counters of the model cache for each zygote
+    """
+
+    with zygotes_lock:
+        items = list(zygotes.items())
+
+    result = {}
+    for environment_hash, z in items:
+        if z.process is not None and z.process.poll() is None:
+            result['zygote-' + environment_hash] = json.loads(z.request({'op': 'stats'})[1])
+
+    return result
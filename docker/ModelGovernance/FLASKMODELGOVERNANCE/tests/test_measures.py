@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+import measures
+
+ALL = list(measures.MEASURES)
+
+
+def dataset(rows=1000, seed=1):
+    random = np.random.RandomState(seed)
+    y = random.randint(0, 3, rows)
+    pred = np.where(random.rand(rows) < 0.7, y, random.randint(0, 3, rows))
+    return y, pred
+
+
+def accumulate(y, pred, chunk, replicates=0):
+    accumulator = measures.Accumulator(ALL, replicates)
+    for start in range(0, len(y), chunk):
+        accumulator.update(y[start:start + chunk], pred[start:start + chunk])
+    return accumulator.result()
+
+
+def test_point_estimate():
+    y, pred = dataset()
+    result = accumulate(y, pred, len(y))
+
+    assert result['acc'][0] == pytest.approx(np.mean(y == pred))
+    # audits of whole datasets report sums of the errors
+    assert result['mae'][0] == pytest.approx(np.sum(np.abs(pred - y)))
+    assert result['mse'][0] == pytest.approx(np.sum((pred - y) ** 2))
+    assert result['r2'][0] == pytest.approx(1 - np.sum((pred - y) ** 2) / np.sum((y - y.mean()) ** 2))
+    assert result['acc'][1:] == [None, None]
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 100, 999])
+def test_chunks_do_not_change_point_estimate(chunk):
+    y, pred = dataset()
+    whole = accumulate(y, pred, len(y))
+    chunked = accumulate(y, pred, chunk)
+
+    for measure in ALL:
+        assert chunked[measure][0] == pytest.approx(whole[measure][0], rel=1e-12)
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 100, 999])
+def test_chunks_do_not_change_bootstrap(chunk):
+    y, pred = dataset()
+    whole = accumulate(y, pred, len(y), replicates=50)
+    chunked = accumulate(y, pred, chunk, replicates=50)
+
+    for measure in ALL:
+        assert chunked[measure] == pytest.approx(whole[measure], rel=1e-12)
+
+
+def test_blocks_do_not_change_bootstrap(monkeypatch):
+    y, pred = dataset()
+    whole = accumulate(y, pred, len(y), replicates=20)
+    # weights of few rows are drawn at once
+    monkeypatch.setattr(measures, 'BLOCK_WEIGHTS', 21 * 3)
+
+    blocks = accumulate(y, pred, len(y), replicates=20)
+
+    for measure in ALL:
+        assert blocks[measure] == pytest.approx(whole[measure], rel=1e-12)
+
+
+def test_bootstrap_interval_contains_estimate():
+    y, pred = dataset()
+    result = accumulate(y, pred, len(y), replicates=200)
+
+    for measure in ALL:
+        value, lower, upper = result[measure]
+        assert lower <= value <= upper
+
+
+def test_slices_with_missing_group():
+    y, pred = dataset(rows=300)
+    groups = np.array(['a', 'b', np.nan] * 100, dtype=object)
+
+    slices = measures.Slices(['acc', 'mae', 'mse'])
+    for start in range(0, len(y), 64):
+        slices.update(groups[start:start + 64], y[start:start + 64], pred[start:start + 64])
+    result = slices.result()
+
+    # missing values form one slice under ''
+    assert sorted(result) == ['', 'a', 'b']
+    for name, rows in (('a', slice(0, None, 3)), ('b', slice(1, None, 3)), ('', slice(2, None, 3))):
+        assert result[name]['rows'] == 100
+        assert result[name]['measures']['acc'][0] == pytest.approx(np.mean(y[rows] == pred[rows]))
+        # slices report means of the errors
+        assert result[name]['measures']['mae'][0] == pytest.approx(np.mean(np.abs(pred[rows] - y[rows])))
+        assert result[name]['measures']['mse'][0] == pytest.approx(np.mean((pred[rows] - y[rows]) ** 2))
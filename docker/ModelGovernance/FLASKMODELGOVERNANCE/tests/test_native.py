@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+sklearn = pytest.importorskip('sklearn')
+
+from sklearn.datasets import make_classification, make_regression
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+import EXTRACT
+from flaskr.models import native
+
+
+def native_prediction(model, X, type):
+    # predictions of both layouts of the probabilities of the trees, as native.extract checks them
+    parameters = EXTRACT.extract(model)
+    assert parameters is not None
+    return [native.predict_array(dict(parameters, normalize=np.array(normalize)), X, type)
+            for normalize in (False, True)]
+
+
+@pytest.mark.parametrize('model', [DecisionTreeClassifier(random_state=0),
+                                   RandomForestClassifier(n_estimators=10, random_state=0),
+                                   LogisticRegression(max_iter=1000)])
+def test_classifiers(model):
+    X, y = make_classification(n_samples=300, n_features=6, n_informative=4, n_classes=3, random_state=0)
+    model.fit(X, y)
+
+    assert any(np.array_equal(result, model.predict(X)) for result in native_prediction(model, X, 'exact'))
+    assert any(np.array_equal(result, model.predict_proba(X)) for result in native_prediction(model, X, 'prob'))
+
+
+@pytest.mark.parametrize('model', [DecisionTreeRegressor(random_state=0),
+                                   RandomForestRegressor(n_estimators=10, random_state=0),
+                                   LinearRegression()])
+def test_regressors(model):
+    X, y = make_regression(n_samples=300, n_features=6, random_state=0)
+    model.fit(X, y)
+
+    assert any(np.array_equal(result, model.predict(X)) for result in native_prediction(model, X, 'exact'))
+    # regressors have no probabilities
+    assert native_prediction(model, X, 'prob') == [None, None]
+
+
+def test_names_of_the_features():
+    X, y = make_regression(n_samples=100, n_features=3, random_state=0)
+    frame = pd.DataFrame(X, columns=['a', 'b', 'c'])
+    parameters = EXTRACT.extract(LinearRegression().fit(frame, y))
+
+    assert parameters['features'].tolist() == ['a', 'b', 'c']
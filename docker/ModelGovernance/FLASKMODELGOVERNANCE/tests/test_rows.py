@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flaskr.cache import rows
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    monkeypatch.setattr(rows, 'ROW_CACHE_ROWS', 100)
+    monkeypatch.setattr(rows, 'caches', {})
+
+
+def test_duplicate_rows_are_predicted_once():
+    frame = pd.DataFrame({'a': [1, 2, 1, 3, 2, 1], 'b': [0.5, 0.5, 0.5, 0.5, 0.5, 0.5]})
+    sent = []
+
+    def run(missing):
+        sent.append(missing.copy())
+        return list(missing['a'] * 10)
+
+    assert rows.predict_frame('m', 'exact', frame, run) == [10, 20, 10, 30, 20, 10]
+    assert len(sent) == 1
+    assert sent[0]['a'].tolist() == [1, 2, 3]
+
+    # rows predicted before are taken from the cache
+    assert rows.predict_frame('m', 'exact', frame.iloc[::-1], run) == [10, 20, 30, 10, 20, 10]
+    assert len(sent) == 1
+    assert rows.get_cache('m').stats() == {'hits': 6, 'misses': 6, 'evictions': 0, 'rows': 3}
+
+
+def test_only_new_rows_are_predicted():
+    run = lambda missing: list(missing['a'] * 10)
+    rows.predict_frame('m', 'exact', pd.DataFrame({'a': [1, 2]}), run)
+
+    sent = []
+
+    def run_new(missing):
+        sent.append(missing['a'].tolist())
+        return run(missing)
+
+    assert rows.predict_frame('m', 'exact', pd.DataFrame({'a': [2, 4, 1, 4]}), run_new) == [20, 40, 10, 40]
+    assert sent == [[4]]
+
+
+def test_types_and_columns_are_cached_separately():
+    calls = []
+
+    def run(missing):
+        calls.append(len(missing))
+        return [0] * len(missing)
+
+    rows.predict_frame('m', 'exact', pd.DataFrame({'a': [1]}), run)
+    rows.predict_frame('m', 'prob', pd.DataFrame({'a': [1]}), run)
+    rows.predict_frame('m', 'exact', pd.DataFrame({'b': [1]}), run)
+    rows.predict_frame('m', 'exact', pd.DataFrame({'a': [1]}), run, kind='csv')
+
+    assert calls == [1, 1, 1, 1]
+
+
+def test_wrong_number_of_predicted_rows():
+    with pytest.raises(ValueError):
+        rows.predict_frame('m', 'exact', pd.DataFrame({'a': [1, 2, 2]}), lambda missing: [1, 2, 3])
+
+
+def test_text_of_the_model_is_kept(monkeypatch):
+    values = np.array([1 / 3, 2.5, 1e-20])
+
+    def run(data, format):
+        frame = rows.formats.read_frame(data, format)
+        # the same output as PREDICT.py writes
+        return ''.join('%.18e\n' % values[int(i)] for i in frame['a']).encode('utf-8')
+
+    data = b'a\n0\n1\n0\n2\n'
+    expected = b''.join(b'%.18e\n' % values[i] for i in (0, 1, 0, 2))
+
+    assert rows.predict('m', 'exact', data, 'csv', 'csv', run) == expected
+    # second prediction is made from the cache only
+    assert rows.predict('m', 'exact', data, 'csv', 'csv', None) == expected
@@ -10,12 +10,15 @@ import os
 import pandas as pd
 import platform
 import re
-from io import StringIO
+from io import StringIO, BytesIO
 from datetime import datetime
 from getpass import getpass
 from tqdm import tqdm
 import time
 
+# media types of the formats of the data exchanged with the server
+_MEDIA_TYPES = {'csv': 'text/csv', 'arrow': 'application/vnd.apache.arrow.stream', 'parquet': 'application/vnd.apache.parquet'}
+
 def upload(model, model_name, model_desc, target, tags, train_dataset, train_dataset_name=None, dataset_desc=None, requirements_file=None):
 	"""Function uploads scikit-learn or keras model, the training set and all needed metadata to the **weles** base.
 
@@ -232,7 +235,7 @@ def status(task_id, interactive = True):
 
 	return r
 
-def predict(model_name, X, pred_type = 'exact', prepare_columns = True):
+def predict(model_name, X, pred_type = 'exact', prepare_columns = True, data_format = 'csv', stream = False, asynchronous = False):
 	"""
 	Function uses model in the database to make a prediction on X.
 
@@ -245,18 +248,28 @@ def predict(model_name, X, pred_type = 'exact', prepare_columns = True):
 	pred_type : string
 		type of the prediction: exact/prob
 	prepare_columns : boolean
-		if true and if X is an object then take column names from model in the database
+		if true and if X is an object then its columns are matched by position with the columns of the model, the server names them
+	data_format : string
+		format of the data sent to and received from the server: csv/arrow/parquet, binary formats require pyarrow
+	stream : boolean
+		if true and X is a hash then the server predicts the dataset chunk by chunk and the result is read as it comes, data_format is ignored
+	asynchronous : boolean
+		if true then the prediction is made in the background and dictionary with task id is returned, see prediction_status and prediction_result
 
 	Returns
 	-------
 	pandas.DataFrame
-		Returns a pandas data frame with made predictions.
+		Returns a pandas data frame with made predictions, or dictionary with task id if asynchronous is set to True.
 
 	Examples
 	--------
 	models.predict('example_model', iris.drop(column='Species'))
 
 	models.predict('example_model', data, prepare_columns=False)
+
+	models.predict('example_model', data, data_format='arrow')
+
+	models.predict('example_model', 'aaaaaaaaaaaaaaaaaaaaaa', asynchronous=True)['task_id']
 	"""
 
 	if not isinstance(model_name, str):
@@ -267,11 +280,22 @@ def predict(model_name, X, pred_type = 'exact', prepare_columns = True):
 		raise ValueError("pred_type must be a string")
 	if not isinstance(prepare_columns, bool):
 		raise ValueError("prepare_columns must be a bool")
+	if data_format not in _MEDIA_TYPES:
+		raise ValueError("data_format must be one of: csv, arrow, parquet")
+	if not isinstance(stream, bool):
+		raise ValueError("stream must be a bool")
+	if not isinstance(asynchronous, bool):
+		raise ValueError("asynchronous must be a bool")
 
 	timestamp = str(datetime.now().timestamp())
 
 	# url
 	url = 'http://192.168.137.64/models/' + model_name + '/predict/' + pred_type
+	if asynchronous:
+		url += '/async'
+
+	# requested format of the result
+	headers = {'Accept': _MEDIA_TYPES[data_format]}
 
 	# regexp to find out if X is a path
 	reg = re.compile("/")
@@ -282,38 +306,211 @@ def predict(model_name, X, pred_type = 'exact', prepare_columns = True):
 		body = {'is_hash': 1}
 		body['hash'] = X
 
+		if stream and not asynchronous:
+			# result is parsed while it is being sent
+			body['stream'] = 1
+			r = requests.get(url, data = body, stream = True)
+			return pd.read_csv(r.raw, header=None)
+
 		# request
-		r = requests.get(url, data = body)
+		r = requests.get(url, data = body, headers = headers)
 	elif type(X) == str:
 		# case when X is a path
 
 		body = {'is_hash': 0}
 		X = pd.read_csv(X)
-		body['data'] = X.to_csv(index=False)
 
 		# request
-		r = requests.get(url, data=body)
+		r = _send_frame(url, body, X, data_format, headers)
 	else:
 		# case when X is an object
 
 		# conversion to pandas data frame
 		X = pd.DataFrame(X)
 
-		if prepare_columns:
-			model_info = info(model_name)
-			columns = model_info['columns']
-			target = model_info['model']['target']
-			columns = columns.sort_values('id')
-			columns = columns.loc[columns['name'] != target, 'name']
-			X.columns = columns
+		body = {'is_hash': 0}
 
-		body = {'is_hash': 0, 'data': X.to_csv(index=False)}
+		if prepare_columns:
+			# columns are named by the server in the order of the training dataset
+			body['prepare_columns'] = 1
 
 		# request
-		r = requests.get(url, data = body)
+		r = _send_frame(url, body, X, data_format, headers)
+
+	if asynchronous:
+		return r.json()
+
+	return _read_prediction(r)
+
+
+def predict_many(model_names, X, pred_type = 'exact'):
+	"""
+	Function makes predictions of several models in the database on the same X, data is sent only once.
+
+	Parameters
+	----------
+	model_names : list
+		names of the models in the base that you want to use
+	X : pandas.DataFrame/string
+		pandas data frame or path to csv file (must containt '/') or hash of already uploaded dataset, must have column names
+	pred_type : string
+		type of the prediction: exact/prob
+
+	Returns
+	-------
+	dict
+		Returns a dictionary with pandas data frame with made predictions for every model.
+
+	Examples
+	--------
+	models.predict_many(['example_model', 'other_model'], iris.drop(column='Species'))
+
+	models.predict_many(['example_model', 'other_model'], 'aaaaaaaaaaaaaaaaaaaaaa')['other_model']
+	"""
+
+	if not isinstance(model_names, list) or not all(isinstance(name, str) for name in model_names):
+		raise ValueError("model_names must be a list of strings")
+	if not isinstance(X, (str, pd.DataFrame)):
+		raise ValueError("X must be a string or pandas.DataFrame")
+	if not isinstance(pred_type, str):
+		raise ValueError("pred_type must be a string")
+
+	# url
+	url = 'http://192.168.137.64/models/predict_many/' + pred_type
+
+	# regexp to find out if X is a path
+	reg = re.compile("/")
+
+	body = {'models': model_names}
+
+	if type(X) == str and reg.search(X) is None:
+		# case when X is a hash
+		body['is_hash'] = 1
+		body['hash'] = X
+	else:
+		# case when X is a path or an object
+		if type(X) == str:
+			X = pd.read_csv(X)
+		body['is_hash'] = 0
+		body['data'] = pd.DataFrame(X).to_csv(index=False)
+
+	# request
+	r = requests.get(url, data = body)
+
+	return {name: pd.read_csv(StringIO(prediction), header=None) for name, prediction in r.json().items()}
+
+
+def prediction_status(task_id, interactive = True):
+	"""Get the information about the progress of the asynchronous prediction
+
+	Parameters
+	----------
+	task_id : string
+		task id, it is returned by the models.predict function with asynchronous set to True
+	interactive : bool, optional
+		display progress bar of predicted rows and wait until the prediction ends if true
+
+	Returns
+	-------
+	dict
+		dictionary with the state of the prediction, number of predicted and all rows
+
+	Examples
+	--------
+	models.prediction_status('aaaaaaaaaaaaaaaaaaaaaa')
+
+	models.prediction_status('aaaaaaaaaaaaaaaaaaaaaa', interactive=False)['current']
+	"""
+
+	# url
+	url = 'http://192.168.137.64/models/predict/status/' + task_id
+
+	# getting metadata
+	r = requests.get(url).json()
+
+	# display progressbar
+	if interactive:
+		with tqdm(total = r['total']) as bar:
+			bar.update(r['current'])
+			bar.set_description(r['status'])
+			prev = r['current']
+			while r['state'] not in ('SUCCESS', 'FAILURE'):
+				time.sleep(3)
+				r = requests.get(url).json()
+				if 'total' in r:
+					bar.total = r['total']
+					bar.update(r['current'] - prev)
+					prev = r['current']
+				bar.set_description(r['status'])
+
+	return r
+
+
+def prediction_result(task_id, data_format = 'csv'):
+	"""Fetch the result of the finished asynchronous prediction, it can be fetched only once
+
+	Parameters
+	----------
+	task_id : string
+		task id, it is returned by the models.predict function with asynchronous set to True
+	data_format : string
+		format of the data received from the server: csv/arrow/parquet, binary formats require pyarrow
+
+	Returns
+	-------
+	pandas.DataFrame
+		Returns a pandas data frame with made predictions.
+
+	Examples
+	--------
+	models.prediction_result('aaaaaaaaaaaaaaaaaaaaaa')
+	"""
+
+	if data_format not in _MEDIA_TYPES:
+		raise ValueError("data_format must be one of: csv, arrow, parquet")
+
+	# url
+	url = 'http://192.168.137.64/models/predict/result/' + task_id
+
+	r = requests.get(url, headers = {'Accept': _MEDIA_TYPES[data_format]})
+
+	if r.headers.get('Content-Type', '').startswith('application/json'):
+		raise ValueError("prediction is not available: " + r.json()['status'])
+
+	return _read_prediction(r)
+
+
+def _read_prediction(r):
+	# server answers in csv if it does not support requested format
+	if r.headers.get('Content-Type', '').startswith(_MEDIA_TYPES['arrow']):
+		import pyarrow as pa
+		return pa.ipc.open_stream(r.content).read_pandas().rename(columns=int)
+	if r.headers.get('Content-Type', '').startswith(_MEDIA_TYPES['parquet']):
+		import pyarrow.parquet as pq
+		return pq.read_table(BytesIO(r.content)).to_pandas().rename(columns=int)
 
 	return pd.read_csv(StringIO(r.text), header=None)
 
+
+def _send_frame(url, body, X, data_format, headers):
+	# csv is sent in the form, binary formats as a file
+	if data_format == 'csv':
+		body['data'] = X.to_csv(index=False)
+		return requests.get(url, data = body, headers = headers)
+
+	import pyarrow as pa
+	table = pa.Table.from_pandas(X.rename(columns=str), preserve_index=False)
+	sink = BytesIO()
+	if data_format == 'arrow':
+		with pa.ipc.new_stream(sink, table.schema) as writer:
+			writer.write_table(table)
+	else:
+		import pyarrow.parquet as pq
+		pq.write_table(table, sink)
+
+	return requests.get(url, data = body, headers = headers,
+		files = {'data': ('data', sink.getvalue(), _MEDIA_TYPES[data_format])})
+
 def info(model_name):
 	"""
 	Get the information about model.
@@ -326,7 +523,7 @@ def info(model_name):
 	Returns
 	-------
 	dict
-		dictionary with fields: model, data, columns and audits containing all metadata about the model
+		dictionary with fields: model, data, columns, audits and slices containing all metadata about the model
 
 	Examples
 	--------
@@ -343,6 +540,7 @@ def info(model_name):
 	r = requests.get('http://192.168.137.64/models/' + model_name + '/info')
 	r = r.json()
 	r['audits'] = pd.DataFrame(r['audits'])
+	r['slices'] = pd.DataFrame(r['slices'])
 	r['columns'] = pd.DataFrame(r['columns'])
 	r['aliases'] = pd.DataFrame(r['aliases'])
 
@@ -419,15 +617,16 @@ def search(language=None, language_version=None, row=None, column=None, missing=
 	r = requests.get('http://192.168.137.64/models/search', data=data)
 	return r.json()['models']
 
-def audit(model_name, measure, data, target, data_name=None, data_desc=None):
+def audit(model_name, measure, data, target, data_name=None, data_desc=None, bootstrap=0, confidence=0.95, group=None):
 	"""Audit the model
 
 	Parameters
 	----------
 	model_name : string
 		name of the model in the **weles** base to make an audit of
-	measure : string
-		name of the measure used on model, must be one of supported
+	measure : string/list
+		name of the measure used on model, must be one of supported: acc, mae, mse, r2, precision, recall, f1,
+		list of measures is computed from one prediction of the model
 	data : array-like/string
 		data frame to make an audit on or hash of already uploaded data in the **weles** or path to the dataset
 	target : string
@@ -436,11 +635,19 @@ def audit(model_name, measure, data, target, data_name=None, data_desc=None):
 		optional, name of the dataset that will be visible in the **weles**, unnecessary if data is a hash
 	data_desc : string
 		optional, description of the dataset, unnecessary if data is a hash
+	bootstrap : int
+		optional, number of bootstrap replicates of the confidence interval of the result, the prediction of the model is reweighted instead of made again, 0 computes no interval
+	confidence : float
+		optional, confidence level of the interval
+	group : string
+		optional, name of the column whose values slice the dataset, measures are computed also for every slice from the same prediction of the model
 
 	Returns
 	-------
-	string/float
-		return the result of the audit or information if something went wrong
+	string/float/dict
+		return the result of the audit or information if something went wrong, results of list of measures are
+		given for every measure, with bootstrap lower and upper bound of the interval are under 'interval', with group
+		results of every slice are under 'slices'
 
 	Examples
 	--------
@@ -448,9 +655,21 @@ def audit(model_name, measure, data, target, data_name=None, data_desc=None):
 		-> user: 'example_user'
 		-> password:
 
+	models.audit('example_model', ['acc', 'precision', 'recall'], iris, 'Species', 'iris', 'example dataset')
+		-> user: 'example_user'
+		-> password:
+
 	models.audit('example_model', 'mae', 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', 'target')
 		-> user: 'example_user'
 		-> password:
+
+	models.audit('example_model', 'acc', 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', 'target', bootstrap=1000)['interval']
+		-> user: 'example_user'
+		-> password:
+
+	models.audit('example_model', ['acc', 'f1'], 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', 'target', group='region')['slices']
+		-> user: 'example_user'
+		-> password:
 	"""
 
 	user = input('user: ')
@@ -458,8 +677,10 @@ def audit(model_name, measure, data, target, data_name=None, data_desc=None):
 
 	if not isinstance(model_name, str):
 		raise ValueError("model_name must be a string")
+	if isinstance(measure, list) and all(isinstance(m, str) for m in measure):
+		measure = ','.join(measure)
 	if not isinstance(measure, str):
-		raise ValueError("measure must be a string")
+		raise ValueError("measure must be a string or list of strings")
 	if not isinstance(user, str):
 		raise ValueError("user must be a string")
 	if not isinstance(password, str):
@@ -472,8 +693,17 @@ def audit(model_name, measure, data, target, data_name=None, data_desc=None):
 		raise ValueError("data_name must be a str")
 	if data_desc is not None and not isinstance(data_desc, str):
 		raise ValueError("data_name must be a str")
-
-	info = {'model_name': model_name, 'measure': measure, 'user': user, 'password': password, 'target': target}
+	if not isinstance(bootstrap, int) or bootstrap < 0:
+		raise ValueError("bootstrap must be a non-negative int")
+	if not isinstance(confidence, float) or not 0 < confidence < 1:
+		raise ValueError("confidence must be a float between 0 and 1")
+	if group is not None and not isinstance(group, str):
+		raise ValueError("group must be a string")
+
+	info = {'model_name': model_name, 'measure': measure, 'user': user, 'password': password, 'target': target,
+			'bootstrap': bootstrap, 'confidence': confidence}
+	if group is not None:
+		info['group'] = group
 
 	timestamp = str(datetime.now().timestamp())
 	del_data = False
@@ -524,6 +754,110 @@ def audit(model_name, measure, data, target, data_name=None, data_desc=None):
 
 	return r.json()
 
+def audit_batch(model_names, measure, hashes, target=None, bootstrap=0, confidence=0.95):
+	"""Audit many models on many uploaded datasets in the background, audits which already exist are skipped
+
+	Parameters
+	----------
+	model_names : list
+		names of the models in the **weles** base to make audits of
+	measure : string/list
+		name of the measure or list of measures, see audit
+	hashes : list
+		hashes of already uploaded datasets
+	target : string
+		optional, name of the target column in all datasets, target of every model is used if it is not given
+	bootstrap : int
+		optional, number of bootstrap replicates of the confidence intervals, see audit
+	confidence : float
+		optional, confidence level of the intervals
+
+	Returns
+	-------
+	dict
+		dictionary with task id, see audit_status
+
+	Examples
+	--------
+	models.audit_batch(['example_model', 'other_model'], ['acc', 'f1'], ['aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', 'bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb'])
+		-> user: 'example_user'
+		-> password:
+	"""
+
+	user = input('user: ')
+	password = getpass('password: ')
+
+	if isinstance(measure, list) and all(isinstance(m, str) for m in measure):
+		measure = ','.join(measure)
+	if not isinstance(measure, str):
+		raise ValueError("measure must be a string or list of strings")
+	if not isinstance(model_names, list) or not all(isinstance(m, str) for m in model_names):
+		raise ValueError("model_names must be a list of strings")
+	if not isinstance(hashes, list) or not all(isinstance(h, str) for h in hashes):
+		raise ValueError("hashes must be a list of strings")
+	if target is not None and not isinstance(target, str):
+		raise ValueError("target must be a string")
+	if not isinstance(bootstrap, int) or bootstrap < 0:
+		raise ValueError("bootstrap must be a non-negative int")
+	if not isinstance(confidence, float) or not 0 < confidence < 1:
+		raise ValueError("confidence must be a float between 0 and 1")
+
+	info = {'model_names': ','.join(model_names), 'hashes': ','.join(hashes), 'measure': measure, 'user': user,
+			'password': password, 'bootstrap': bootstrap, 'confidence': confidence}
+	if target is not None:
+		info['target'] = target
+
+	r = requests.post('http://192.168.137.64/models/audit/batch', data=info)
+
+	return r.json()
+
+
+def audit_status(task_id, interactive = True):
+	"""Get the information about the progress of the batch audit
+
+	Parameters
+	----------
+	task_id : string
+		task id, it is returned by the models.audit_batch function
+	interactive : bool, optional
+		display progress bar of audited pairs of model and dataset and wait until the audits end if true
+
+	Returns
+	-------
+	dict
+		dictionary with the state of the audits, numbers of audited, skipped, failed and all pairs, results of the audits when they ended
+
+	Examples
+	--------
+	models.audit_status('aaaaaaaaaaaaaaaaaaaaaa')
+
+	models.audit_status('aaaaaaaaaaaaaaaaaaaaaa', interactive=False)['results']
+	"""
+
+	# url
+	url = 'http://192.168.137.64/models/audit/status/' + task_id
+
+	# getting metadata
+	r = requests.get(url).json()
+
+	# display progressbar
+	if interactive:
+		with tqdm(total = r['total']) as bar:
+			bar.update(r['current'])
+			bar.set_description(r['status'])
+			prev = r['current']
+			while r['state'] not in ('SUCCESS', 'FAILURE'):
+				time.sleep(3)
+				r = requests.get(url).json()
+				if 'total' in r:
+					bar.total = r['total']
+					bar.update(r['current'] - prev)
+					prev = r['current']
+				bar.set_description(r['status'])
+
+	return r
+
+
 def requirements(model):
 	"""Get the list of package requirements
 
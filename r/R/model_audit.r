@@ -4,13 +4,16 @@
 #' You can use this function to audit in different ways models already uploaded in the weles.
 #'
 #' @param model_name name of the model in the weles, character
-#' @param measure name of the measure used in the audit, character
+#' @param measure name of the measure used in the audit, character, vector of measures is computed from one prediction of the model
 #' @param data data frame to make an audit on or path or hash of already uploaded dataset
 #' @param target name of the target column in the dataset
 #' @param data_name name of the dataset that will be visible in the weles, unnecessary if data is a hash
 #' @param data_desc description of the dataset, unnecessary if data is a hash
+#' @param bootstrap number of bootstrap replicates of the confidence interval of the result, the prediction of the model is reweighted instead of made again, 0 computes no interval
+#' @param confidence confidence level of the interval
+#' @param group name of the column whose values slice the dataset, measures are computed also for every slice from the same prediction of the model
 #'
-#' @return result of the audit or information if somethin went wrong
+#' @return result of the audit or information if somethin went wrong, results of vector of measures are given for every measure, with bootstrap lower and upper bound of the interval are under 'interval', with group results of every slice are under 'slices'
 #'
 #' @references
 #' \href{http://192.168.137.64/models}{\bold{models}}
@@ -22,10 +25,11 @@
 #'
 #' model_audit('example_model', 'mae', 'Example user', 'example password', iris, 'Species', 'iris', 'Flowers')
 #' model_audit('example_model', 'acc', 'Example user', 'example password', 'aaaaaaaaaaaaaaaaaaaaaaaaaa', 'Species')
+#' model_audit('example_model', c('acc', 'precision', 'recall'), 'Example user', 'example password', iris, 'Species', 'iris', 'Flowers')
 #' }
 #'
 #' @export
-model_audit = function(model_name, measure, data, target, data_name=NA, data_desc=NA) {
+model_audit = function(model_name, measure, data, target, data_name=NA, data_desc=NA, bootstrap=0, confidence=0.95, group=NA) {
 
 	user = readline('user: ')
 	password = getPass::getPass('password: ')
@@ -39,9 +43,16 @@ model_audit = function(model_name, measure, data, target, data_name=NA, data_des
 	stopifnot(class(target) == 'character')
 	stopifnot(is.na(data_name) || class(data_name) == 'character')
 	stopifnot(is.na(data_desc) || class(data_desc) == 'character')
+	stopifnot(is.numeric(bootstrap) && bootstrap >= 0)
+	stopifnot(is.numeric(confidence) && confidence > 0 && confidence < 1)
+	stopifnot(is.na(group) || class(group) == 'character')
 
 	# making the body for the request
-	info = list('model_name'= model_name, 'measure'= measure, 'user'= user, 'password'= password, 'target'= target)
+	info = list('model_name'= model_name, 'measure'= paste0(measure, collapse=','), 'user'= user, 'password'= password, 'target'= target,
+		'bootstrap'= bootstrap, 'confidence'= confidence)
+	if(!is.na(group)) {
+		info[['group']] = group
+	}
 
 	# creating hash for the temporary files
 	h = digest::digest(Sys.time())
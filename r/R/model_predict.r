@@ -5,9 +5,9 @@
 #'
 #' @param model_name name of the model in weles
 #' @param X data to make a prediction of, must have named columns, may be path to *.csv* file (must contatin **/** sign) or *hash* of already uploaded data,
-#' if X is an object and prepare_columns is True, columns' names will be fetched automatically
+#' if X is an object and prepare_columns is True, its columns are matched by position with columns of the model
 #' @param pred_type type of prediction, 'exact' or 'prob'
-#' @param prepare_columns if X is an object then columns' names will be fetched automatically
+#' @param prepare_columns if X is an object then its columns are named by the server in the order of the training dataset
 #'
 #' @references
 #' \href{http://192.168.137.64/models}{\bold{models}}
@@ -54,20 +54,15 @@ model_predict <- function(model_name, X, pred_type = 'exact', prepare_columns =
 	} else {
 		# case when X is an object
 
-		# fetching columns
-		if(prepare_columns) {
-			info = models_info(model_name)
-			columns = info$columns
-			target = info$model$target
-			columns = columns[order(columns$id), 'name']
-			columns = columns[columns != target]
-			names(X) = columns
-		}
-
 		data = paste0(c(paste0(colnames(X), collapse=','), paste0(apply(X,1, paste0, collapse=','), collapse='\n')), collapse='\n')
 
 		body[['is_hash']] =  0
 		body[['data']] = data
+
+		# columns are named by the server in the order of the training dataset
+		if(prepare_columns) {
+			body[['prepare_columns']] = 1
+		}
 	}
 
 	# uploading